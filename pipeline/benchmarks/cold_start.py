@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark.
+
+Measures what a fresh pipeline process pays before its first paper: the wall
+time of a new interpreter importing main and building the processing stages,
+repeated --repeat times, and the breakdown from startup.profile() (import time
+of numpy, openai, tiktoken and the other heavy libraries and of the modules
+that create singletons, plus tokenizer, HTTP client and stage initialization).
+
+Usage:
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --repeat 10 --output cold_start.json
+    python benchmarks/cold_start.py --baseline cold_start.json
+    python benchmarks/cold_start.py --tokenizer-cache /app/tiktoken_cache
+
+--tokenizer-cache points tiktoken at a cache directory (TIKTOKEN_CACHE_DIR);
+with an empty directory, the first repeat includes the tokenizer download a
+container without pre-fetched artifacts would pay.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+
+# Everything a run does before the executor starts taking papers
+COLD_START_CODE = "import main; main.build_processing_stages()"
+
+PROFILE_CODE = "import json, startup; print(json.dumps(startup.profile()))"
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Pipeline cold-start benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Cold starts to time (default: 5)')
+    parser.add_argument('--tokenizer-cache', type=str,
+                        help='tiktoken cache directory to use (default: the environment\'s)')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, help='Earlier --output file to compare against')
+    return parser.parse_args()
+
+
+def run_python(code: str, env: Dict[str, str]) -> subprocess.CompletedProcess:
+    """Run code in a fresh interpreter from the pipeline's src directory."""
+    return subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, env=env, capture_output=True, text=True)
+
+
+def time_cold_starts(repeat: int, env: Dict[str, str]) -> List[float]:
+    """Return the wall time of each of repeat fresh cold starts."""
+    times = []
+    for _ in range(repeat):
+        started = time.monotonic()
+        result = run_python(COLD_START_CODE, env)
+        elapsed = time.monotonic() - started
+        if result.returncode != 0:
+            raise RuntimeError(f"Cold start failed:\n{result.stderr}")
+        times.append(round(elapsed, 3))
+    return times
+
+
+def print_results(results: Dict, baseline: Dict) -> None:
+    """Print a readable summary, with changes against the baseline."""
+    def change(value, previous):
+        if value is None or not previous:
+            return ''
+        return f" ({(value / previous - 1) * 100:+.1f}% vs baseline)"
+
+    print()
+    print(f"=== cold start ({len(results['cold_start'])} runs) ===")
+    print(f"  median {results['median']:.3f}s, min {results['min']:.3f}s, max {results['max']:.3f}s"
+          f"{change(results['median'], baseline.get('median'))}")
+    profile = results['profile']
+    print(f"  tokenizer {'downloaded' if profile['tokenizer_downloaded'] else 'cached'} "
+          f"in {profile['tokenizer_cache_dir']}")
+    for section, label in (('imports', 'import'), ('init', 'init')):
+        previous = baseline.get('profile', {}).get(section, {})
+        for name, seconds in profile[section].items():
+            value = 'n/a' if seconds is None else f"{seconds * 1000:8.1f} ms"
+            print(f"  {label:<6} {name:<20} {value:>11}{change(seconds, previous.get(name))}")
+
+
+def main() -> None:
+    args = parse_arguments()
+    env = dict(os.environ)
+    if args.tokenizer_cache:
+        env['TIKTOKEN_CACHE_DIR'] = os.path.abspath(args.tokenizer_cache)
+    # Stages are built but never run, so the API keys only need to be present
+    for env_var in ('OPENAI_API_KEY', 'OPENROUTER_API_KEY', 'SEMANTIC_SCHOLAR_API_KEY'):
+        env.setdefault(env_var, 'benchmark')
+
+    times = time_cold_starts(args.repeat, env)
+
+    result = run_python(PROFILE_CODE, env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup profile failed:\n{result.stderr}")
+    profile = json.loads(result.stdout.strip().splitlines()[-1])
+
+    results = {
+        'cold_start': times,
+        'median': statistics.median(times),
+        'min': min(times),
+        'max': max(times),
+        'profile': profile
+    }
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print_results(results, baseline)
+
+    if args.output:
+        settings = {'repeat': args.repeat, 'tokenizer_cache': args.tokenizer_cache}
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
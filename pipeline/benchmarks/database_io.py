@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Database I/O benchmark.
+
+Measures PaperDatabase on its own, without the stages: for each size, a fresh
+database gets every paper inserted with all its columns (what the scraper's
+first save does), then one stage's columns updated on every paper (what a
+stage's save does), and finally every paper loaded back by ID. Reports the wall
+time and papers per second of each step and the size of the database file.
+
+Usage:
+    python benchmarks/database_io.py
+    python benchmarks/database_io.py --sizes 10000 --output database_io.json
+    python benchmarks/database_io.py --baseline database_io.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), 'src'))
+
+from database import PaperDatabase  # noqa: E402
+from db_connections import db_connections  # noqa: E402
+from paper import AuthorHIndex, Paper  # noqa: E402
+
+STEPS = ('insert', 'update', 'load')
+
+# Text of typical length; shared between papers so only the database holds the copies
+ABSTRACT = 'We study agentic reinforcement learning for reasoning models. ' * 20
+INTRODUCTION = 'Large language models are increasingly deployed as agents. ' * 60
+JUSTIFICATION = 'The paper evaluates reasoning on standard benchmarks. ' * 4
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='PaperDatabase save and load benchmark')
+    parser.add_argument('--sizes', type=str, default='10000,100000',
+                        help='Comma-separated numbers of papers (default: 10000,100000)')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, help='Earlier --output file to compare against')
+    return parser.parse_args()
+
+
+def make_papers(count: int) -> Dict[str, Paper]:
+    """Build count papers with the fields a scraped, extracted and embedded paper has."""
+    published = datetime(2025, 1, 15)
+    papers = {}
+    for index in range(count):
+        paper_id = f"2501.{index:06d}"
+        paper = Paper(
+            id=paper_id,
+            title=f"Benchmark paper {index}",
+            authors=[f"Author {index} {n}" for n in range(5)],
+            categories=['cs.AI', 'cs.LG'],
+            abstract=ABSTRACT,
+            published_date=published + timedelta(seconds=index),
+            arxiv_url=f"https://arxiv.org/abs/{paper_id}",
+            pdf_url=f"https://arxiv.org/pdf/{paper_id}",
+            latex_url=f"https://arxiv.org/e-print/{paper_id}",
+            scraper_status='successfully_scraped',
+            intro_status='intro_successful',
+            introduction_text=INTRODUCTION,
+            intro_extraction_method='latex',
+            embedding_status='completed',
+            agentic_ai_score=0.5,
+            reasoning_models_score=0.4,
+        )
+        papers[paper_id] = paper
+    return papers
+
+
+def score_papers(papers: Dict[str, Paper]) -> None:
+    """Change the columns the LLM scoring and H-index stages write on every paper."""
+    for paper in papers.values():
+        paper.llm_score_status = 'completed'
+        paper.summary = JUSTIFICATION
+        paper.novelty_score = 'Significant'
+        paper.novelty_justification = JUSTIFICATION
+        paper.impact_score = 'Moderate'
+        paper.impact_justification = JUSTIFICATION
+        paper.author_h_indexes = [AuthorHIndex(name=author, h_index=10) for author in paper.authors]
+        paper.updated_at = datetime.now()
+
+
+def run_size(size: int) -> Dict:
+    """Insert, update and load size papers in a fresh database and time each step."""
+    workdir = tempfile.mkdtemp(prefix='database-io-')
+    try:
+        db_path = os.path.join(workdir, 'database.sqlite')
+        db = PaperDatabase(db_path)
+        papers = make_papers(size)
+        seconds = {}
+
+        started = time.perf_counter()
+        db.save_papers(papers)
+        seconds['insert'] = time.perf_counter() - started
+
+        score_papers(papers)
+        started = time.perf_counter()
+        db.save_papers(papers)
+        seconds['update'] = time.perf_counter() - started
+
+        paper_ids: List[str] = list(papers)
+        del papers
+        started = time.perf_counter()
+        loaded = db.load_papers(paper_ids)
+        seconds['load'] = time.perf_counter() - started
+        if len(loaded) != size:
+            raise RuntimeError(f"Loaded {len(loaded)} of {size} papers")
+
+        db.checkpoint()
+        return {
+            'papers': size,
+            'seconds': {step: round(value, 3) for step, value in seconds.items()},
+            'papers_per_second': {step: round(size / value) for step, value in seconds.items()},
+            'database_mb': round(os.path.getsize(db_path) / 2 ** 20, 1)
+        }
+    finally:
+        db_connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_results(results: List[Dict], baseline: List[Dict]) -> None:
+    """Print a readable summary, with changes against the baseline."""
+    previous_by_size = {result['papers']: result for result in baseline}
+    for result in results:
+        previous = previous_by_size.get(result['papers'], {}).get('seconds', {})
+        print()
+        print(f"=== {result['papers']} papers ({result['database_mb']} MB) ===")
+        for step in STEPS:
+            seconds = result['seconds'][step]
+            change = f" ({(seconds / previous[step] - 1) * 100:+.1f}% vs baseline)" if previous.get(step) else ''
+            print(f"  {step:<7} {seconds:8.3f}s {result['papers_per_second'][step]:>10} papers/s{change}")
+
+
+def main() -> None:
+    args = parse_arguments()
+    # save_papers and load_papers log a line per call; only the results matter here
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = [run_size(size) for size in sizes]
+
+    baseline = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': {'sizes': sizes}, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""
+Fake Upstream Services
+
+Local stand-ins for every service the pipeline calls, served from one threaded
+HTTP server so benchmarks run offline and repeatably:
+
+    GET  /arxiv/api/query          arXiv Atom API (papers_per_day entries per date)
+    GET  /arxiv/src/<id>           arXiv LaTeX source tarballs
+    POST /openai/embeddings        OpenAI-compatible embeddings
+    POST /openrouter/chat/completions  OpenRouter-compatible chat completions
+    GET  /s2/paper/...             Semantic Scholar paper lookup and search
+
+Each service has its own latency distribution, 429 rate and malformed-response
+rate. Responses are deterministic for a given paper, so runs are comparable.
+"""
+
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import tarfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Dimension of the fake embedding vectors
+EMBEDDING_DIMENSIONS = 64
+
+
+@dataclass
+class ServiceProfile:
+    """
+    Behaviour of one fake service.
+
+    Attributes:
+        latency_median: Median response latency in seconds
+        latency_sigma: Shape of the log-normal latency distribution (0 for constant latency)
+        rate_429: Fraction of requests answered with 429 Too Many Requests
+        malformed_rate: Fraction of requests answered with a corrupt body
+        retry_after: Retry-After header value (seconds) sent with 429 responses
+    """
+    latency_median: float = 0.05
+    latency_sigma: float = 0.5
+    rate_429: float = 0.0
+    malformed_rate: float = 0.0
+    retry_after: int = 1
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Draw one response latency."""
+        if self.latency_median <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_median
+        return rng.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+
+def default_profiles() -> Dict[str, ServiceProfile]:
+    """Latency profiles roughly matching the real services."""
+    return {
+        'arxiv_api': ServiceProfile(latency_median=1.5, latency_sigma=0.3),
+        'arxiv_source': ServiceProfile(latency_median=0.8, latency_sigma=0.6),
+        'embeddings': ServiceProfile(latency_median=0.6, latency_sigma=0.4),
+        'openrouter': ServiceProfile(latency_median=4.0, latency_sigma=0.5),
+        'semantic_scholar': ServiceProfile(latency_median=0.3, latency_sigma=0.5),
+    }
+
+
+@dataclass
+class FakeServiceConfig:
+    """
+    Content generated by the fake services.
+
+    Attributes:
+        papers_per_day: Number of papers the arXiv API returns for any date
+        relevant_rate: Fraction of papers whose embeddings are close to the topics
+        valuable_rate: Fraction of scored papers recommended as Should Read
+        profiles: Per-service behaviour, keyed by service name
+        seed: Seed for latency and failure sampling
+    """
+    papers_per_day: int = 200
+    relevant_rate: float = 0.3
+    valuable_rate: float = 0.3
+    profiles: Dict[str, ServiceProfile] = field(default_factory=default_profiles)
+    seed: int = 0
+
+
+def _fraction(text: str, salt: str) -> float:
+    """Map a string to a stable value in [0, 1)."""
+    digest = hashlib.sha256(f"{salt}:{text}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def _unit_noise(text: str) -> List[float]:
+    """Stable pseudo-random vector derived from a string."""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    return [rng.gauss(0, 1) / math.sqrt(EMBEDDING_DIMENSIONS) for _ in range(EMBEDDING_DIMENSIONS)]
+
+
+def _build_source_tarball() -> bytes:
+    """Build the LaTeX source archive served for every paper."""
+    tex = "\n".join([
+        r"\documentclass{article}",
+        r"\begin{document}",
+        r"\section{Introduction}",
+        " ".join(["Large language model agents plan, act and reflect over long horizons."] * 40),
+        r"\section{Related Work}",
+        "Prior work is discussed here.",
+        r"\end{document}",
+    ]).encode()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        info = tarfile.TarInfo('main.tex')
+        info.size = len(tex)
+        tar.addfile(info, io.BytesIO(tex))
+    return buffer.getvalue()
+
+
+class FakeServices:
+    """
+    Threaded HTTP server hosting every fake upstream service.
+
+    Usage:
+        with FakeServices(FakeServiceConfig(papers_per_day=1000)) as services:
+            services.url('arxiv')  # -> http://127.0.0.1:<port>/arxiv
+    """
+
+    def __init__(self, config: FakeServiceConfig, host: str = '127.0.0.1', port: int = 0):
+        self.config = config
+        self.source_tarball = _build_source_tarball()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 128
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, service: str) -> str:
+        """Return the base URL of one service (arxiv, openai, openrouter, s2)."""
+        return f"{self.base_url}/{service}"
+
+    def start(self) -> 'FakeServices':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeServices':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _decide(self, service: str) -> str:
+        """Sample latency and outcome for one request; sleeps for the latency."""
+        profile = self.config.profiles[service]
+        with self._lock:
+            latency = profile.sample_latency(self._rng)
+            roll = self._rng.random()
+            stats = self.stats.setdefault(service, {'requests': 0, '429': 0, 'malformed': 0})
+            stats['requests'] += 1
+            if roll < profile.rate_429:
+                outcome = '429'
+            elif roll < profile.rate_429 + profile.malformed_rate:
+                outcome = 'malformed'
+            else:
+                outcome = 'ok'
+            if outcome != 'ok':
+                stats[outcome] += 1
+        time.sleep(latency)
+        return outcome
+
+    # Response builders
+
+    def arxiv_feed(self, query: str) -> bytes:
+        """Atom feed with papers_per_day entries for the date in the search query."""
+        match = re.search(r'submittedDate:\[(\d{8})', query)
+        day = datetime.strptime(match.group(1), '%Y%m%d') if match else datetime(2025, 1, 15)
+        prefix = day.strftime('%y%m')
+        entries = []
+        for n in range(self.config.papers_per_day):
+            arxiv_id = f"{prefix}.{day.day:02d}{n:04d}"
+            entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/{arxiv_id}v1</id>
+    <published>{day.strftime('%Y-%m-%d')}T12:00:00Z</published>
+    <title>Benchmark paper {arxiv_id} on agentic reasoning</title>
+    <summary>We study how language model agents use tools, plan and reason. Paper {arxiv_id}.</summary>
+    <author><name>Author {n % 97}</name></author>
+    <author><name>Author {(n * 7) % 89}</name></author>
+    <link href="{self.base_url}/arxiv/abs/{arxiv_id}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{self.base_url}/arxiv/pdf/{arxiv_id}v1" rel="related" type="application/pdf"/>
+    <category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""")
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+                f'{"".join(entries)}\n</feed>\n').encode()
+
+    def embeddings(self, body: dict) -> bytes:
+        """OpenAI embeddings response. Topic descriptions arrive as a single string."""
+        inputs = body['input']
+        topic_request = isinstance(inputs, str)
+        if topic_request:
+            inputs = [inputs]
+
+        data = []
+        for index, text in enumerate(inputs):
+            noise = _unit_noise(text)
+            if topic_request or _fraction(text, 'relevant') < self.config.relevant_rate:
+                # Shared direction plus a little noise: cosine ~0.9 with every topic
+                weight = 0.2 if topic_request else 0.5
+                vector = [(1.0 / math.sqrt(EMBEDDING_DIMENSIONS)) + weight * x for x in noise]
+            else:
+                vector = noise
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+
+        return json.dumps({
+            'object': 'list',
+            'data': data,
+            'model': body.get('model', 'fake-embedding'),
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+        }).encode()
+
+    def chat_completion(self, body: dict) -> bytes:
+        """OpenRouter chat completion answering the validation or scoring prompt."""
+        prompt = body['messages'][0]['content']
+        if '<validation_response>' in prompt:
+            topics_section = prompt.split('Topics to evaluate:', 1)[1].split('Step-by-step instructions:', 1)[0]
+            topics = re.findall(r'^- ([^:\n]+):', topics_section, re.MULTILINE)
+            parts = []
+            for i, topic in enumerate(topics):
+                conclusion = 'Highly Relevant' if i == 0 else 'Not Relevant'
+                parts.append(f'<topic name="{topic}"><conclusion>{conclusion}</conclusion>'
+                             f'<justification><![CDATA[Benchmark justification.]]></justification></topic>')
+            content = f"<validation_response>{''.join(parts)}</validation_response>"
+        else:
+            recommendation = 'Should Read' if _fraction(prompt, 'valuable') < self.config.valuable_rate else 'Can Skip'
+            content = ("<paper_evaluation>"
+                       "<summary><![CDATA[Benchmark summary.]]></summary>"
+                       "<novelty><score>Significant</score><justification><![CDATA[Novel.]]></justification></novelty>"
+                       "<impact><score>Moderate</score><justification><![CDATA[Useful.]]></justification></impact>"
+                       f"<recommendation><score>{recommendation}</score>"
+                       "<justification><![CDATA[Benchmark.]]></justification></recommendation>"
+                       "</paper_evaluation>")
+        # Roughly four characters per token, plus hidden reasoning tokens
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4 + 500
+        return json.dumps({
+            'id': 'fake-completion',
+            'object': 'chat.completion',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        }).encode()
+
+    def semantic_scholar_paper(self, key: str) -> bytes:
+        """Semantic Scholar paper record with a few authors."""
+        authors = [{
+            'authorId': f"{int(_fraction(key, 'author') * 100000) + i}",
+            'name': f"Author {i}",
+            'url': f"https://www.semanticscholar.org/author/{i}",
+            'hIndex': int(_fraction(f"{key}:{i}", 'h') * 60)
+        } for i in range(3)]
+        return json.dumps({
+            'paperId': hashlib.sha1(key.encode()).hexdigest(),
+            'title': f"Benchmark paper {key}",
+            'url': f"https://www.semanticscholar.org/paper/{key}",
+            'authors': authors
+        }).encode()
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json',
+                      headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _serve(self, service: str, build, content_type: str = 'application/json') -> None:
+                outcome = services._decide(service)
+                if outcome == '429':
+                    retry_after = services.config.profiles[service].retry_after
+                    self._send(429, b'{"error": "rate limited"}', headers={'Retry-After': str(retry_after)})
+                elif outcome == 'malformed':
+                    self._send(200, b'\x00<<malformed', content_type)
+                else:
+                    self._send(200, build(), content_type)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = parsed.path
+                if path == '/arxiv/api/query':
+                    query = unquote(parse_qs(parsed.query, keep_blank_values=True).get('search_query', [''])[0])
+                    self._serve('arxiv_api', lambda: services.arxiv_feed(query), 'application/atom+xml; charset=utf-8')
+                elif path.startswith('/arxiv/src/'):
+                    self._serve('arxiv_source', lambda: services.source_tarball, 'application/gzip')
+                elif path.startswith('/s2/paper/search'):
+                    query = parse_qs(parsed.query).get('query', [''])[0]
+                    self._serve('semantic_scholar', lambda: json.dumps(
+                        {'total': 1, 'data': [json.loads(services.semantic_scholar_paper(query))]}).encode())
+                elif path.startswith('/s2/paper/'):
+                    key = unquote(path[len('/s2/paper/'):])
+                    self._serve('semantic_scholar', lambda: services.semantic_scholar_paper(key))
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                path = urlparse(self.path).path
+                if path == '/openai/embeddings':
+                    self._serve('embeddings', lambda: services.embeddings(body))
+                elif path == '/openrouter/chat/completions':
+                    self._serve('openrouter', lambda: services.chat_completion(body))
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+        return Handler
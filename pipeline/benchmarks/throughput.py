@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark.
+
+Starts the fake upstream services, then drives main.main() once per daily paper
+volume (200, 1,000 and 5,000 papers by default) against a fresh database. Each
+run happens in its own subprocess so peak RSS is measured per volume. Reports
+papers/minute, per-stage wall time, p50/p95 per-paper stage latency and peak
+RSS, overall peak RSS, and the request mix seen by the fake services.
+
+Usage:
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --sizes 200 --delay-scale 0.1 --rate-429 0.05
+    python benchmarks/throughput.py --output results.json --baseline previous.json
+
+The pipeline's own rate limits and retry delays are used unchanged unless
+--delay-scale is given; keep it fixed when comparing against a baseline.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from urllib.parse import urlparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import FakeServiceConfig, FakeServices, default_profiles
+
+# Date driven through the pipeline; its papers are generated by the fake arXiv API
+BENCHMARK_DATE = '2025-01-15'
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='End-to-end pipeline throughput benchmark')
+    parser.add_argument('--sizes', type=str, default='200,1000,5000',
+                        help='Comma-separated papers-per-day volumes to run (default: 200,1000,5000)')
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='Multiplier applied to every fake service latency (default: 1.0)')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='Fraction of requests each fake service answers with 429 (default: 0)')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='Fraction of requests each fake service answers with a corrupt body (default: 0)')
+    parser.add_argument('--relevant-rate', type=float, default=0.3,
+                        help='Fraction of papers above the embedding similarity threshold (default: 0.3)')
+    parser.add_argument('--delay-scale', type=float, default=1.0,
+                        help='Multiplier applied to the pipeline\'s request spacing and retry delays (default: 1.0)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for latency and failure sampling')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, help='Earlier --output file to compare papers/minute against')
+    parser.add_argument('--keep', action='store_true', help='Keep the per-run working directories')
+
+    # Internal: run one volume inside a subprocess
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--services-url', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', type=str, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def scaled_limit(limit: Dict, scale: float) -> Dict:
+    """Return a rate limit whose request spacing is multiplied by scale (0 removes the limit)."""
+    return {**limit, 'rate': limit['rate'] / scale if scale > 0 else None}
+
+
+def configure_pipeline(args: argparse.Namespace) -> None:
+    """Point the pipeline configuration at the fake services and the working directory."""
+    import config
+
+    config.DATABASE_PATHS['main_database'] = os.path.join(args.workdir, 'database.sqlite')
+    config.DATABASE_PATHS['topic_embeddings_cache'] = os.path.join(args.workdir, 'cache.sqlite')
+    config.DATABASE_PATHS['stage_cache'] = os.path.join(args.workdir, 'stage_cache.sqlite')
+    config.RUN_REPORT['report_dir'] = os.path.join(args.workdir, 'reports')
+    config.METRICS['textfile_path'] = os.path.join(args.workdir, 'metrics.prom')
+    config.TRACING['trace_dir'] = os.path.join(args.workdir, 'traces')
+
+    config.ARXIV['api_base_url'] = f"{args.services_url}/arxiv/api/query"
+    config.ARXIV['max_paper_limit'] = max(config.ARXIV['max_paper_limit'], args.size)
+    config.EMBEDDING['api_base_url'] = f"{args.services_url}/openai"
+    config.LLM_VALIDATION['api_base_url'] = f"{args.services_url}/openrouter"
+    config.LLM_SCORING['api_base_url'] = f"{args.services_url}/openrouter"
+    config.H_INDEX_FETCHING['api_base_url'] = f"{args.services_url}/s2"
+
+    # Every fake service shares one host, so give each the rate limit of the real
+    # host it stands in for through a path-prefixed key
+    scale = args.delay_scale
+    host = urlparse(args.services_url).netloc
+    real_limits = config.RATE_LIMITS['hosts']
+    config.RATE_LIMITS['hosts'] = {
+        f"{host}/arxiv/api": scaled_limit(real_limits['export.arxiv.org'], scale),
+        f"{host}/arxiv/src": scaled_limit(real_limits['arxiv.org'], scale),
+        f"{host}/s2": scaled_limit(real_limits['api.semanticscholar.org'], scale)
+    }
+    config.RATE_LIMITS['default_retry_after'] *= scale
+    config.ARXIV['rate_limiting']['wait_time'] *= scale
+    config.LATEX_EXTRACTION['retry_delays'] = [delay * scale for delay in config.LATEX_EXTRACTION['retry_delays']]
+
+    for env_var in ('OPENAI_API_KEY', 'OPENROUTER_API_KEY', 'SEMANTIC_SCHOLAR_API_KEY'):
+        os.environ[env_var] = 'benchmark'
+    for env_var in ('SLACK_BOT_TOKEN', 'SLACK_CHANNEL_ID'):
+        os.environ.pop(env_var, None)
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Run the pipeline once in this process and write the measurements to the workdir."""
+    sys.path.insert(0, SRC_DIR)
+    configure_pipeline(args)
+
+    # Log to the working directory only, through the pipeline's own queued
+    # logging; main's own logging setup then becomes a no-op
+    from structured_logging import configure_logging
+    configure_logging(os.path.join(args.workdir, 'pipeline.log'), console=False)
+
+    import main
+
+    sys.argv = ['main.py', '--date', BENCHMARK_DATE]
+    exit_code = 0
+    started = time.monotonic()
+    try:
+        main.main()
+    except SystemExit as e:
+        exit_code = e.code or 0
+    wall_time = time.monotonic() - started
+
+    report_dir = os.path.join(args.workdir, 'reports')
+    reports = sorted(os.listdir(report_dir)) if os.path.isdir(report_dir) else []
+    report = {}
+    if reports:
+        with open(os.path.join(report_dir, reports[-1])) as f:
+            report = json.load(f)
+
+    result = {
+        'size': args.size,
+        'exit_code': exit_code,
+        'wall_time': round(wall_time, 2),
+        'papers_per_minute': round(args.size / wall_time * 60, 1) if wall_time > 0 else None,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stages': {
+            name: {key: stage.get(key) for key in ('wall_time', 'processed', 'p50_paper_latency', 'p95_paper_latency',
+                                                   'peak_rss_mb')}
+            for name, stage in report.get('stages', {}).items()
+        },
+        'services': report.get('services', {}),
+        'retries': report.get('retries'),
+        'rate_limit_sleep': report.get('rate_limit_sleep'),
+        'backoff_sleep': report.get('backoff_sleep')
+    }
+    with open(os.path.join(args.workdir, 'result.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+
+
+def run_size(args: argparse.Namespace, size: int, workdir: str) -> Dict:
+    """Start fake services for one volume and run the pipeline against them in a subprocess."""
+    profiles = default_profiles()
+    for profile in profiles.values():
+        profile.latency_median *= args.latency_scale
+        profile.rate_429 = args.rate_429
+        profile.malformed_rate = args.malformed_rate
+
+    service_config = FakeServiceConfig(papers_per_day=size, relevant_rate=args.relevant_rate,
+                                       profiles=profiles, seed=args.seed)
+    with FakeServices(service_config) as services:
+        command = [
+            sys.executable, os.path.abspath(__file__), '--worker',
+            '--size', str(size),
+            '--services-url', services.base_url,
+            '--workdir', workdir,
+            '--delay-scale', str(args.delay_scale)
+        ]
+        subprocess.run(command, check=False)
+        service_stats = services.stats
+
+    result_path = os.path.join(workdir, 'result.json')
+    if not os.path.exists(result_path):
+        return {'size': size, 'exit_code': 'crashed', 'fake_services': service_stats}
+    with open(result_path) as f:
+        result = json.load(f)
+    result['fake_services'] = service_stats
+    return result
+
+
+def print_results(results: List[Dict], baseline: Dict[int, Dict]) -> None:
+    """Print a readable summary of every run."""
+    for result in results:
+        print()
+        print(f"=== {result['size']} papers/day ===")
+        if result.get('exit_code') not in (0, None):
+            print(f"  pipeline exited with {result['exit_code']}")
+        if 'wall_time' not in result:
+            continue
+        line = f"  wall {result['wall_time']:.1f}s, {result['papers_per_minute']} papers/min, peak RSS {result['peak_rss_mb']} MB"
+        previous = baseline.get(result['size'])
+        if previous and previous.get('papers_per_minute'):
+            change = (result['papers_per_minute'] / previous['papers_per_minute'] - 1) * 100
+            line += f" ({change:+.1f}% vs baseline)"
+        print(line)
+        print(f"  retries {result['retries']}, rate-limit sleep {result['rate_limit_sleep']}s, "
+              f"backoff sleep {result['backoff_sleep']}s")
+        print(f"  {'stage':<22} {'wall s':>9} {'papers':>7} {'p50 s':>8} {'p95 s':>8} {'RSS MB':>8}")
+        for name, stage in result['stages'].items():
+            p50 = stage.get('p50_paper_latency')
+            p95 = stage.get('p95_paper_latency')
+            rss = stage.get('peak_rss_mb')
+            print(f"  {name:<22} {stage['wall_time']:>9.1f} {stage.get('processed') or '':>7} "
+                  f"{'' if p50 is None else f'{p50:.2f}':>8} {'' if p95 is None else f'{p95:.2f}':>8} "
+                  f"{'' if rss is None else f'{rss:.0f}':>8}")
+        for service, stats in result['fake_services'].items():
+            print(f"  fake {service}: {stats['requests']} requests, {stats['429']} x 429, {stats['malformed']} malformed")
+
+
+def main() -> None:
+    args = parse_arguments()
+    if args.worker:
+        run_worker(args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result['size']: result for result in json.load(f)['results']}
+
+    results = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"throughput-{size}-")
+        print(f"Running {size} papers/day (workdir {workdir})", flush=True)
+        results.append(run_size(args, size, workdir))
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results, baseline)
+
+    if args.output:
+        settings = {key: value for key, value in vars(args).items()
+                    if key not in ('worker', 'size', 'services_url', 'workdir', 'output', 'baseline', 'keep')}
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
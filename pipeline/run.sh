@@ -3,27 +3,27 @@ set -e
 
 echo "=== Pipeline Starting at $(date) ==="
 
+# Continuous ingestion: poll arXiv and publish straight to the serving database
+if [ "$1" = "--daemon" ]; then
+    echo "Running in daemon mode"
+    cd /app/src
+    exec python main.py --daemon
+fi
+
 # Automatically calculate date from 14 days ago
 TARGET_DATE=$(date -d "14 days ago" +%Y-%m-%d)  # Linux compatible (for Docker)
 echo "Processing papers from (auto): $TARGET_DATE"
 
-# Step 1: Copy existing database to working copy
-if [ -f /data/database.sqlite ]; then
-    cp /data/database.sqlite /data/database.new.sqlite
-    echo "✓ Created working copy: database.new.sqlite"
-else
-    echo "⚠ No existing database found, creating new one"
-    touch /data/database.new.sqlite
+# Working copies from the old copy-and-swap publishing are no longer used
+if [ -f /data/database.new.sqlite ]; then
+    rm -f /data/database.new.sqlite
+    echo "✓ Removed stale working copy: database.new.sqlite"
 fi
 
-# Step 2: Run the pipeline (works on database.new.sqlite)
+# Run the pipeline. It publishes to /data/database.sqlite in place in short
+# WAL-mode transactions; the server reads committed papers without a reload
 echo "=== Starting pipeline processing ==="
 cd /app/src
 python main.py --date "$TARGET_DATE"
 
-# Step 3: Atomic swap
-echo "=== Performing atomic database swap ==="
-mv /data/database.new.sqlite /data/database.sqlite
-echo "✓ Atomic swap complete"
-
 echo "=== Pipeline Completed at $(date) ==="
\ No newline at end of file
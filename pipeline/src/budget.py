@@ -0,0 +1,413 @@
+"""
+LLM Budget
+
+This module keeps the LLM stages within a token and cost budget. Every
+OpenRouter response reports its token usage (and, with usage accounting, its
+cost); the budget adds it up for the current run and for the current UTC day
+and compares it against the caps in the BUDGET config section.
+
+Instead of stopping dead at the cap, the LLM stages degrade in steps as the
+tightest cap fills up:
+
+    1. reduced effort   - requests ask for a lower reasoning effort
+    2. skip tangential  - scoring skips papers that are only Tangentially Relevant
+    3. exhausted        - no further LLM calls; remaining papers are deferred
+
+Deferred and skipped papers keep their pending status and are queued in the
+retry queue (see retry_queue.py), due when the budget that refused them opens
+again: the next UTC day for a daily cap, BUDGET['run_cap_retry_delay'] seconds
+later for a per-run cap. The end of a later run, or of a daemon poll, submits
+them again once due.
+
+Usage is added to the llm_usage table of the main database as it accrues, at
+most BUDGET['sync_interval'] seconds after the call, and every check re-reads
+the day's total across all processes at the same interval. Concurrent workers
+and daemon polls therefore share the daily caps, a crash loses at most one
+interval of usage, and long-lived processes move on to a fresh daily total at
+UTC midnight.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import config
+import metrics
+from db_connections import db_connections
+from paper import Paper
+from queue_service import QueueServiceClient, ServiceError
+from retry_queue import retry_queue
+
+logger = logging.getLogger('BUDGET')
+
+# Degradation levels, in order
+LEVEL_NORMAL = 0
+LEVEL_REDUCED_EFFORT = 1
+LEVEL_SKIP_TANGENTIAL = 2
+LEVEL_EXHAUSTED = 3
+
+LEVEL_NAMES = {
+    LEVEL_NORMAL: 'normal',
+    LEVEL_REDUCED_EFFORT: 'reduced_effort',
+    LEVEL_SKIP_TANGENTIAL: 'skip_tangential',
+    LEVEL_EXHAUSTED: 'exhausted'
+}
+
+
+def create_usage_table(conn: sqlite3.Connection) -> None:
+    """Create the LLM usage table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            run_id TEXT,
+            day TEXT,  -- UTC date the usage counts against (YYYY-MM-DD)
+            stage TEXT,
+            model TEXT,
+            calls INTEGER,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            cost REAL,  -- USD
+            PRIMARY KEY (run_id, day, stage, model)
+        )
+    """)
+
+
+def store_usage(db_path: str, rows: List[tuple], day: str) -> Tuple[int, float]:
+    """
+    Add usage to the llm_usage table and read the day's total, in one transaction.
+
+    Args:
+        db_path: Database holding the llm_usage table
+        rows: (run_id, day, stage, model, calls, prompt_tokens, completion_tokens, cost) to add
+        day: UTC date (YYYY-MM-DD) to total
+
+    Returns:
+        (tokens, cost) used that day by every run
+    """
+    db_connections.initialize(db_path, 'llm_usage', create_usage_table)
+    conn = db_connections.get(db_path)
+    with conn:
+        conn.executemany("""
+            INSERT INTO llm_usage (
+                run_id, day, stage, model, calls, prompt_tokens, completion_tokens, cost
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(run_id, day, stage, model) DO UPDATE SET
+                calls = calls + excluded.calls,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                cost = cost + excluded.cost
+        """, rows)
+        tokens, cost = conn.execute(
+            "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0), COALESCE(SUM(cost), 0) "
+            "FROM llm_usage WHERE day = ?", (day,)
+        ).fetchone()
+    return tokens, cost
+
+
+def _today() -> str:
+    """Return the current UTC date (YYYY-MM-DD)."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _empty_usage() -> Dict[str, float]:
+    """Return a zeroed usage entry."""
+    return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0}
+
+
+class BudgetController:
+    """Thread-safe token and cost accounting for the LLM stages of one run."""
+
+    def __init__(self, budget_config: dict):
+        """
+        Initialize the controller.
+
+        Args:
+            budget_config: The BUDGET configuration dictionary
+        """
+        self.config = budget_config
+        self._lock = threading.Lock()
+        # Held by the thread writing usage, so concurrent checks do not write it twice
+        self._sync_lock = threading.Lock()
+        self._db_path: Optional[str] = None
+        self._run_id: Optional[str] = None
+        # (day, stage, model) -> usage not yet written to llm_usage
+        self._unsaved: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        # Queue service usage is stored through, on hosts without the database
+        self._service: Optional[QueueServiceClient] = None
+        self.start_run()
+
+    def start_run(self, db_path: Optional[str] = None, run_id: Optional[str] = None) -> None:
+        """
+        Reset the run counters and load today's usage from earlier runs.
+
+        Usage of the previous run not written yet is written first.
+
+        Args:
+            db_path: Database holding the llm_usage table (None to keep usage in memory only,
+                unless it is stored through a queue service, see use_service)
+            run_id: ID of the run the usage is recorded under
+        """
+        self.sync(wait=True)
+
+        with self._lock:
+            self._db_path = db_path
+            self._run_id = run_id
+            self._unsaved = {}
+            self.day = _today()
+            # Today's usage as last read from llm_usage, by every process
+            self._daily_tokens, self._daily_cost = 0, 0.0
+            self._synced_at = float('-inf')
+            # (stage, model) -> {'calls', 'prompt_tokens', 'completion_tokens', 'cost'}
+            self._usage: Dict[tuple, Dict[str, float]] = {}
+            self._deferred: Dict[str, int] = {}
+            self._skipped_tangential = 0
+            self._reduced_effort_calls = 0
+            self._level = LEVEL_NORMAL
+
+        self.sync(wait=True)
+        if self._daily_tokens:
+            logger.info(f"LLM usage earlier today: {self._daily_tokens:,} tokens, ${self._daily_cost:.2f}")
+
+    def use_service(self, service: QueueServiceClient) -> None:
+        """
+        Store usage in the database behind a queue service instead of a local file.
+
+        Used by workers on hosts other than the database's (see queue_service.py),
+        so their usage counts against the same daily caps.
+        """
+        self._service = service
+
+    def sync(self, wait: bool = False) -> None:
+        """
+        Write the usage not saved yet to llm_usage and re-read today's total across all processes.
+
+        Failures are logged and never fail the run; unwritten usage is kept for the next sync.
+
+        Args:
+            wait: Wait for a sync running on another thread instead of leaving the work to it
+        """
+        if not self._sync_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._lock:
+                db_path, run_id = self._db_path, self._run_id
+                if not db_path and self._service is None:
+                    return
+                unsaved, self._unsaved = self._unsaved, {}
+            day = _today()
+            rows = [(run_id, entry_day, stage, model, int(entry['calls']), int(entry['prompt_tokens']),
+                     int(entry['completion_tokens']), entry['cost'])
+                    for (entry_day, stage, model), entry in unsaved.items()]
+            try:
+                if self._service is not None:
+                    daily_tokens, daily_cost = self._service.call('store_usage', rows=rows, day=day)
+                else:
+                    daily_tokens, daily_cost = store_usage(db_path, rows, day)
+            except (sqlite3.Error, ServiceError) as e:
+                logger.warning(f"Failed to save LLM usage, keeping it for the next attempt: {e}")
+                with self._lock:
+                    for key, entry in unsaved.items():
+                        kept = self._unsaved.setdefault(key, _empty_usage())
+                        for field, value in entry.items():
+                            kept[field] += value
+                return
+
+            with self._lock:
+                self.day = day
+                self._daily_tokens, self._daily_cost = daily_tokens, daily_cost
+                self._synced_at = time.monotonic()
+                self._level = self._compute_level()
+        finally:
+            self._sync_lock.release()
+
+    def _run_totals(self) -> tuple:
+        """Return (tokens, cost) used by this run. Caller holds the lock."""
+        tokens = sum(u['prompt_tokens'] + u['completion_tokens'] for u in self._usage.values())
+        cost = sum(u['cost'] for u in self._usage.values())
+        return tokens, cost
+
+    def _daily_totals(self) -> tuple:
+        """Return (tokens, cost) used today by every process. Caller holds the lock."""
+        day = _today()
+        if day != self.day:
+            # The day rolled over since the last sync: nothing read so far counts against it
+            self.day = day
+            self._daily_tokens, self._daily_cost = 0, 0.0
+        unsaved = [entry for (entry_day, _, _), entry in self._unsaved.items() if entry_day == day]
+        tokens = self._daily_tokens + sum(u['prompt_tokens'] + u['completion_tokens'] for u in unsaved)
+        cost = self._daily_cost + sum(u['cost'] for u in unsaved)
+        return tokens, cost
+
+    def _cap_fractions(self) -> Dict[str, float]:
+        """Return the fraction used of each configured cap. Caller holds the lock."""
+        tokens, cost = self._run_totals()
+        daily_tokens, daily_cost = self._daily_totals()
+        used = {
+            'run_token_limit': tokens,
+            'daily_token_limit': daily_tokens,
+            'run_cost_limit': cost,
+            'daily_cost_limit': daily_cost
+        }
+        return {cap: value / self.config[cap] for cap, value in used.items() if self.config.get(cap)}
+
+    def _fraction_used(self) -> float:
+        """Return the fraction used of the tightest configured cap. Caller holds the lock."""
+        return max(self._cap_fractions().values(), default=0.0)
+
+    def _next_window(self) -> float:
+        """
+        Return the Unix time the tightest cap opens again. Caller holds the lock.
+
+        A daily cap opens at the next UTC midnight, a per-run cap in a later run.
+        """
+        fractions = self._cap_fractions()
+        if not fractions:
+            return time.time()
+        tightest = max(fractions, key=fractions.get)
+        if tightest.startswith('daily_'):
+            midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            return (midnight + timedelta(days=1)).timestamp()
+        return time.time() + self.config['run_cap_retry_delay']
+
+    def _compute_level(self) -> int:
+        """Return the degradation level for the current usage. Caller holds the lock."""
+        used = self._fraction_used()
+        if used >= 1.0:
+            level = LEVEL_EXHAUSTED
+        elif used >= self.config['skip_tangential_at']:
+            level = LEVEL_SKIP_TANGENTIAL
+        elif used >= self.config['reduce_effort_at']:
+            level = LEVEL_REDUCED_EFFORT
+        else:
+            level = LEVEL_NORMAL
+        if level > self._level:
+            logger.warning(f"LLM budget {used:.0%} used - degrading to {LEVEL_NAMES[level]}")
+        elif level < self._level:
+            logger.info(f"LLM budget {used:.0%} used - back to {LEVEL_NAMES[level]}")
+        return level
+
+    def _price(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimate the USD cost of a call from the configured model prices."""
+        prices = self.config['model_prices'].get(model)
+        if not prices:
+            return 0.0
+        return (prompt_tokens * prices['prompt'] + completion_tokens * prices['completion']) / 1_000_000
+
+    def record_usage(self, stage: str, model: str, usage: Optional[dict]) -> None:
+        """
+        Add the usage reported by one API response.
+
+        Args:
+            stage: Stage that made the call
+            model: Model the call was made to
+            usage: The response's usage object (prompt_tokens, completion_tokens
+                and, with OpenRouter usage accounting, cost)
+        """
+        if not usage:
+            return
+        prompt_tokens = int(usage.get('prompt_tokens') or 0)
+        completion_tokens = int(usage.get('completion_tokens') or 0)
+        cost = usage.get('cost')
+        cost = float(cost) if cost is not None else self._price(model, prompt_tokens, completion_tokens)
+
+        with self._lock:
+            # Written to llm_usage by the next sync()
+            for entry in (self._usage.setdefault((stage, model), _empty_usage()),
+                          self._unsaved.setdefault((_today(), stage, model), _empty_usage())):
+                entry['calls'] += 1
+                entry['prompt_tokens'] += prompt_tokens
+                entry['completion_tokens'] += completion_tokens
+                entry['cost'] += cost
+            self._level = self._compute_level()
+        metrics.LLM_TOKENS.labels(stage, model, 'prompt').inc(prompt_tokens)
+        metrics.LLM_TOKENS.labels(stage, model, 'completion').inc(completion_tokens)
+        metrics.LLM_COST.labels(stage, model).inc(cost)
+
+    def level(self) -> int:
+        """Return the current degradation level."""
+        with self._lock:
+            return self._level
+
+    def reasoning_effort(self, default: str) -> str:
+        """Return the reasoning effort to request, lowered once the budget is filling up."""
+        with self._lock:
+            if self._level >= LEVEL_REDUCED_EFFORT:
+                self._reduced_effort_calls += 1
+                return self.config['reduced_reasoning_effort']
+        return default
+
+    async def allow(self, stage: str, paper: Paper) -> bool:
+        """
+        Decide whether a stage may spend an LLM call on a paper.
+
+        The day's usage across all processes is synced first if the last sync
+        is more than BUDGET['sync_interval'] seconds old. Papers that are
+        refused keep their pending status, are queued in the retry queue for
+        the time the budget opens again and are counted as deferred (or
+        skipped, for Tangentially Relevant papers in scoring).
+
+        Args:
+            stage: Stage about to make the call
+            paper: Paper the call is for
+
+        Returns:
+            True if the call may go ahead
+        """
+        if time.monotonic() - self._synced_at >= self.config['sync_interval']:
+            await asyncio.to_thread(self.sync)
+
+        with self._lock:
+            # Usage of other processes and the day rolling over both move the level
+            self._level = self._compute_level()
+            if self._level >= LEVEL_EXHAUSTED:
+                self._deferred[stage] = self._deferred.get(stage, 0) + 1
+                reason = 'LLM budget exhausted'
+            elif (self._level >= LEVEL_SKIP_TANGENTIAL and stage == 'llm_scoring'
+                    and paper.has_only_tangential_relevance()):
+                self._skipped_tangential += 1
+                reason = 'only Tangentially Relevant, skipped to save LLM budget'
+            else:
+                return True
+            due_at = self._next_window()
+
+        await retry_queue.apostpone(stage, paper.id, due_at, reason)
+        logger.info(f"{paper.id} - {stage} deferred until "
+                    f"{datetime.fromtimestamp(due_at, timezone.utc):%Y-%m-%d %H:%M} UTC: {reason}")
+        return False
+
+    def summary(self) -> dict:
+        """Return the run's budget consumption for the run report."""
+        with self._lock:
+            tokens, cost = self._run_totals()
+            daily_tokens, daily_cost = self._daily_totals()
+            return {
+                'level': LEVEL_NAMES[self._level],
+                'fraction_used': round(self._fraction_used(), 3),
+                'run_tokens': tokens,
+                'run_cost': round(cost, 4),
+                'daily_tokens': daily_tokens,
+                'daily_cost': round(daily_cost, 4),
+                'reduced_effort_calls': self._reduced_effort_calls,
+                'skipped_tangential': self._skipped_tangential,
+                'deferred': dict(self._deferred),
+                'stages': {
+                    f"{stage}:{model}": {key: round(value, 4) if key == 'cost' else value
+                                         for key, value in entry.items()}
+                    for (stage, model), entry in sorted(self._usage.items())
+                }
+            }
+
+    def save(self) -> None:
+        """Write the run's remaining usage to the llm_usage table at the end of the run."""
+        self.sync(wait=True)
+        with self._lock:
+            unsaved = bool(self._unsaved)
+        if unsaved:
+            logger.warning("Some LLM usage of this run could not be saved")
+
+
+# Process-wide budget shared by the LLM stages
+budget = BudgetController(config.BUDGET)
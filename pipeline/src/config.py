@@ -6,6 +6,9 @@ ARXIV = {
         'cs.CV'
     ],
     
+    # arXiv export API endpoint
+    'api_base_url': 'https://export.arxiv.org/api/query',
+    
     # The number of results to fetch in a single API call for pagination.
     'batch_size': 100,
     
@@ -13,9 +16,9 @@ ARXIV = {
     # The pipeline will raise an error and exit if this limit is exceeded.
     'max_paper_limit': 1000,
     
-    # Rate Limiting and Retry Strategy
+    # Retry Strategy (request pacing is set in RATE_LIMITS)
     'rate_limiting': {
-        # Initial time to wait (in seconds) between API requests.
+        # Initial time to wait (in seconds) before retrying a failed API request.
         'wait_time': 10.0,
         # Maximum number of times to retry a failed API call.
         'max_retries': 3,
@@ -26,16 +29,98 @@ ARXIV = {
     }
 }
 
+# Date-Range Backfill Parameters
+BACKFILL = {
+    # Number of dates processed concurrently by --date-range. All dates share the
+    # same stage worker pools, so this bounds how many dates are in flight at once
+    # (memory and per-date completion) without raising per-host request rates.
+    'date_parallelism': 3,
+    
+    # Send a Slack notification for each backfilled date
+    'slack_notifications': False
+}
+
+# Stage Reprocessing (--reprocess) Parameters
+REPROCESS = {
+    # Papers read from the database per page. Pages are streamed through the
+    # stages, so memory is bounded by the pages in flight, not the selection.
+    'page_size': 500,
+    
+    # Pages submitted to the stages before waiting for the oldest to finish
+    'pages_in_flight': 2
+}
+
+# Shared Work Queue (--worker, --distribute) Parameters
+WORK_QUEUE = {
+    # Seconds a claimed paper stays leased to a worker. Live workers renew their
+    # leases; a crashed worker's papers become claimable again once they expire.
+    'lease_seconds': 300,
+    
+    # Seconds between lease renewals by a live worker (well below lease_seconds)
+    'renew_interval': 60,
+    
+    # Claims of a paper for a stage before it is marked failed, so a paper that
+    # keeps failing or keeps taking its worker down is not retried forever
+    'max_attempts': 3,
+    
+    # Seconds an idle worker waits before checking the queue again
+    'poll_interval': 5,
+    
+    # Seconds between checks of a --distribute run for its papers being finished
+    'wait_interval': 10,
+    
+    # Seconds a --worker records as one run. A worker runs until stopped, so its
+    # report, trace and per-run LLM budget caps start afresh after each interval.
+    'report_interval': 3600,
+    
+    # Queue service (--serve-queue) for workers on other hosts (--worker --queue-url)
+    'service_address': '0.0.0.0',
+    'service_port': 8765,
+    
+    # Seconds a remote worker's request to the queue service may take
+    'service_timeout': 60
+}
+
+# Deferred Retry Parameters
+RETRY_QUEUE = {
+    # Seconds the end of a run waits for the next deferred retry to fall due.
+    # Retries due later stay in the retry_queue table for the next run.
+    'drain_wait': 120,
+    
+    # Seconds a run holds the retries it is running; retries claimed by a run
+    # that died are claimed again once this expires
+    'claim_seconds': 3600,
+    
+    # Retries of papers in a batch whose stage raised a retryable error as a
+    # whole (see executor.py); other errors fail the papers' stage right away
+    'batch_failure_retries': 3,
+    
+    # Seconds before the first retry of such a batch, doubled for each further retry
+    'batch_failure_backoff': 30
+}
+
+# Continuous Ingestion (--daemon) Parameters
+DAEMON = {
+    # Seconds between the starts of consecutive polls of the arXiv listing
+    'poll_interval': 1800,
+    
+    # Number of most recent submission dates (UTC) queried on every poll. arXiv
+    # announces papers up to a few days after submission (longer over weekends);
+    # papers already processed are cache hits, so re-querying them is cheap.
+    'lookback_days': 4
+}
+
 # LaTeX Introduction Extraction Parameters
 LATEX_EXTRACTION = {
-    # Rate limiting for arXiv downloads (sequential processing)
-    'rate_limit_delay': 1.0,  # Seconds to wait between each download request
-    
-    # Retry settings
+    # Retry settings. Retries are deferred through the retry queue (RETRY_QUEUE)
     'max_retries': 3,
-    'retry_delays': [1, 5, 10],  # Retry backoff delays in seconds: 1s, 5s, 10s
+    'retry_delays': [1, 5, 10],  # Seconds until each deferred retry is due: 1s, 5s, 10s
     'timeout': 90,
     
+    # Streaming executor workers. Download pacing comes from RATE_LIMITS; extra
+    # workers only overlap slow downloads with the next one's slot.
+    'max_workers': 4,
+    
     # Content limits
     'max_introduction_length': 15000
 }
@@ -43,11 +128,16 @@ LATEX_EXTRACTION = {
 # Embedding Similarity Parameters
 EMBEDDING = {
     # Model configuration
+    'api_base_url': 'https://api.openai.com/v1',
     'model': 'text-embedding-3-large',
     
     # Batch processing
     'batch_size': 100,
     
+    # Streaming executor settings
+    'max_workers': 2,      # Number of embedding batches in flight at once
+    'batch_linger': 5.0,   # Seconds to wait for a batch to fill before sending a partial one
+    
     # Retry settings
     'max_retries': 3,
     'timeout': 60
@@ -65,13 +155,8 @@ LLM_VALIDATION = {
     
     # Parallel processing settings
     'max_workers': 10,  # Number of concurrent API calls
-    'batch_size': 10,   # Papers to process in parallel batches
     'max_retries': 3,
-    'timeout': 120,
-    
-    # Rate limiting (reduced since we're using parallel processing)
-    'rate_limit_delay': 0.5,  # Reduced delay between batches
-    'jitter': 0.2
+    'timeout': 120
 }
 
 # LLM Scoring Parameters
@@ -92,17 +177,119 @@ H_INDEX_FETCHING = {
     'api_base_url': 'https://api.semanticscholar.org/graph/v1',
     'semantic_scholar_api_key_env_var': 'SEMANTIC_SCHOLAR_API_KEY',
 
-    # Sequential processing settings
+    # Request settings (pacing is set in RATE_LIMITS)
     'timeout': 30,
     'max_retries': 6,
-
-    # Rate limiting
-    'rate_limit_delay': 1.0,
+    'max_workers': 4,  # Streaming executor workers
 
     # Processing thresholds
     'notable_h_index_threshold': 5
 }
 
+# Shared HTTP Client Parameters
+HTTP_CLIENT = {
+    # Default seconds for a request that does not pass its own timeout
+    'timeout': 30.0,
+    
+    # Seconds allowed to open a connection, also capping per-request timeouts
+    'connect_timeout': 10.0,
+    
+    # Times a request is retried when no connection could be established.
+    # Requests that reached the server are retried by the modules, which know
+    # whether that is safe and how to back off.
+    'connect_retries': 2,
+    
+    # Connection pool per client, sized so the concurrent LLM workers of two
+    # stages never queue for a connection
+    'max_connections': 100,
+    'max_keepalive_connections': 32,
+    
+    # Seconds an idle keep-alive connection is kept open for reuse
+    'keepalive_expiry': 60.0,
+    
+    # Negotiate HTTP/2 with servers that support it (requires the h2 package;
+    # falls back to HTTP/1.1 with keep-alive without it)
+    'http2': True
+}
+
+# Outbound Request Rate Limits
+RATE_LIMITS = {
+    # Request budget per host, shared by every module, worker and date shard in
+    # the process. A key is a host, optionally followed by a path prefix that
+    # gets its own budget (the longest matching key wins). 'rate' is requests
+    # per second; 'burst' is how many requests may go out back to back after an
+    # idle period. Hosts not listed are not paced, but still pause when they
+    # answer with Retry-After or exhausted rate-limit headers.
+    'hosts': {
+        # arXiv API terms of use: one request every three seconds
+        'export.arxiv.org': {'rate': 1 / 3, 'burst': 1},
+        # arXiv LaTeX source downloads
+        'arxiv.org': {'rate': 1.0, 'burst': 1},
+        # Semantic Scholar API key allowance: one request per second
+        'api.semanticscholar.org': {'rate': 1.0, 'burst': 1}
+    },
+    
+    # Seconds a host is paused after a 429 that does not say how long to wait
+    'default_retry_after': 5.0,
+    
+    # Longest pause accepted from Retry-After or rate-limit reset headers
+    'max_retry_after': 300.0
+}
+
+# LLM Budget Parameters
+BUDGET = {
+    # Token caps (prompt + completion) across the LLM stages, per run and per
+    # UTC day (summed over every run that day). None disables a cap.
+    'run_token_limit': None,
+    'daily_token_limit': 20_000_000,
+    
+    # Cost caps in USD, per run and per UTC day. None disables a cap.
+    'run_cost_limit': None,
+    'daily_cost_limit': 10.0,
+    
+    # USD per million tokens, used when a response does not report its cost
+    'model_prices': {
+        'x-ai/grok-4-fast': {'prompt': 0.20, 'completion': 0.50}
+    },
+    
+    # Degradation steps, as the fraction of the tightest cap already used.
+    # Past 'reduce_effort_at' requests ask for 'reduced_reasoning_effort'; past
+    # 'skip_tangential_at' scoring skips papers that are only Tangentially
+    # Relevant; at 100% the remaining papers are deferred to a later run
+    # through the retry queue.
+    'reduce_effort_at': 0.6,
+    'reduced_reasoning_effort': 'low',
+    'skip_tangential_at': 0.8,
+    
+    # Seconds after which usage is written to the llm_usage table and the day's
+    # total across all processes (workers, daemon polls, other runs) is re-read
+    'sync_interval': 10,
+    
+    # Seconds until papers deferred by a per-run cap are retried. Longer than
+    # RETRY_QUEUE['drain_wait'], so the run that deferred them leaves them to a
+    # later run. Papers deferred by a daily cap are retried the next UTC day.
+    'run_cap_retry_delay': 3600
+}
+
+# Stage Scheduling Parameters
+SCHEDULING = {
+    # Order in which each stage takes papers from its queue:
+    #   'similarity' - highest topic similarity score first
+    #   'relevance'  - best LLM relevance, then best recommendation, first
+    #   'fifo'       - arrival order
+    # Stages not listed here use 'fifo'. Value ordering makes a run that is cut
+    # short still finish the papers most likely to be "Must Read".
+    'stage_policies': {
+        'llm_validation': 'similarity',
+        'llm_scoring': 'similarity',
+        'h_index_fetching': 'relevance'
+    },
+    
+    # Minimum queue capacity of a prioritized stage. Only papers waiting in the
+    # queue can be reordered, so this is how far ahead the scheduler looks.
+    'lookahead': 1000
+}
+
 # Database Cleanup Parameters
 DATABASE_CLEANUP = {
     # Number of days to retain papers in the database
@@ -110,11 +297,119 @@ DATABASE_CLEANUP = {
     'retention_days': 14
 }
 
+# Checkpoint Parameters
+CHECKPOINT = {
+    # Papers finished by a stage are committed by a background writer. It collects
+    # papers for up to this many seconds before committing them in one transaction.
+    'flush_interval': 1.0,
+    
+    # Maximum number of papers written in a single checkpoint transaction
+    'max_batch': 50,
+    
+    # Once a paper has left every stage and is saved, drop its heavy text fields
+    # (introduction, abstract, summary, justifications) from memory; they are
+    # read back from the database on access. Keeps a run's resident memory
+    # bounded by the papers in flight rather than every paper in the run.
+    'release_heavy_fields': True
+}
+
+# Prometheus Metrics Parameters
+METRICS = {
+    # Address and port of the /metrics endpoint served in --daemon mode
+    'address': '0.0.0.0',
+    'port': 9464,
+    
+    # node-exporter textfile written at the end of every one-shot run (cron);
+    # point node-exporter's --collector.textfile.directory at its directory.
+    # None disables it.
+    'textfile_path': '/data/metrics/researchfeed_pipeline.prom'
+}
+
+# Logging Parameters
+LOGGING = {
+    # Format of the daily log file in logs/: 'json' (one object per line, with
+    # structured fields such as paper_id and stage) or 'text'
+    'file_format': 'json',
+    
+    # Format of the console output: 'text' or 'json'
+    'console_format': 'text',
+    
+    # Log the first and then every Nth per-paper success of each stage, with the
+    # stage's running count (1 logs every success). Failures are always logged.
+    'success_sample_every': 25
+}
+
+# Stage Cache Parameters
+STAGE_CACHE = {
+    # Reuse embedding and LLM outputs whose exact inputs were seen before, so
+    # re-runs and reprocessing never pay twice for the same request
+    'enabled': True,
+    
+    # Stage versions, part of every cache key. Bump a stage's version after a
+    # change its cache key does not capture (response parsing, output fields)
+    # to invalidate that stage only; prompt and model changes need no bump.
+    'versions': {
+        'embedding_similarity': 1,
+        'llm_validation': 1,
+        'llm_scoring': 1
+    },
+    
+    # Entries older than this are dropped when the cache is opened (None keeps them)
+    'max_age_days': 30
+}
+
+# Tracing Parameters
+TRACING = {
+    # Record a span per paper per stage, with child spans for external calls,
+    # sleeps and CPU-heavy steps (see tracing.py)
+    'enabled': True,
+    
+    # Directory for the per-run OTLP JSON trace files (trace-<run_id>.json),
+    # loadable into Jaeger or forwardable by an OpenTelemetry Collector
+    'trace_dir': '/data/traces',
+    
+    # service.name resource attribute of the exported spans
+    'service_name': 'researchfeed-pipeline'
+}
+
+# Run Report Parameters
+RUN_REPORT = {
+    # Directory for the per-run JSON timing reports. The same figures are also
+    # appended to the pipeline_runs and stage_timings tables of the main database.
+    'report_dir': '/data/run_reports'
+}
+
+# SQLite Connection Parameters
+SQLITE = {
+    # Seconds a write waits for the database lock held by another writer (the
+    # checkpoint writer, concurrent date shards and workers write to the same file)
+    'busy_timeout': 30.0,
+
+    # With WAL journaling, NORMAL syncs at checkpoints instead of every commit.
+    # The database stays consistent; a power loss can only undo the last commits,
+    # which the next run redoes through the usual status checks.
+    'synchronous': 'NORMAL',
+
+    # Page cache per connection (one connection per thread and database file), in MiB
+    'cache_size_mb': 32,
+
+    # Part of each database file read through memory mapping instead of read() calls, in MiB
+    'mmap_size_mb': 256,
+
+    # Prepared statements kept per connection. The upserts of the checkpoint
+    # writer and save_papers differ per set of changed columns.
+    'cached_statements': 256
+}
+
 # Database Paths
 DATABASE_PATHS = {
-    # Main database containing paper metadata
-    'main_database': '/data/database.new.sqlite',
+    # Main database containing paper metadata. This is the live database the
+    # server reads: runs publish to it in short WAL-mode transactions
+    'main_database': '/data/database.sqlite',
     
     # Cache for topic embeddings to avoid re-computing them
-    'topic_embeddings_cache': '/data/cache.sqlite'
+    'topic_embeddings_cache': '/data/cache.sqlite',
+    
+    # Memoized embedding and LLM outputs, keyed by their exact inputs (see STAGE_CACHE)
+    'stage_cache': '/data/stage_cache.sqlite'
 }
\ No newline at end of file
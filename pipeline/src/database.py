@@ -1,14 +1,262 @@
 import sqlite3
 import json
 import logging
+import queue
+import re
+import threading
+import time
+from dataclasses import fields, is_dataclass
 from datetime import datetime
-from typing import Dict, Optional
+from functools import lru_cache
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union, get_args, get_origin
 from pathlib import Path
-from paper import Paper, AuthorHIndex
+from paper import Paper
 from config import DATABASE_PATHS
+from db_connections import db_connections
+import metrics
 
 logger = logging.getLogger('DATABASE')
 
+# Papers written per transaction. The pipeline publishes to the live database,
+# so write transactions stay short and readers see finished papers promptly.
+DATABASE_WRITE_BATCH = 200
+
+# Paper IDs per SELECT when loading papers, well below SQLite's limit on query parameters
+DATABASE_READ_BATCH = 500
+
+
+def _field_codec(field_type) -> Tuple[Optional[Callable], Optional[Callable]]:
+    """
+    Choose how a Paper field of the given type is stored.
+
+    Lists are stored as JSON arrays (lists of dataclasses such as AuthorHIndex
+    as arrays of objects) and datetimes as ISO strings; every other type is
+    stored as is.
+
+    Returns:
+        (encode, decode) pair, or (None, None) for fields stored as is
+    """
+    if get_origin(field_type) is Union:
+        field_type = next(arg for arg in get_args(field_type) if arg is not type(None))
+    if field_type is datetime:
+        return (lambda value: None if value is None else value.isoformat(),
+                lambda value: None if value is None else datetime.fromisoformat(value))
+    if get_origin(field_type) is list:
+        item_type = get_args(field_type)[0]
+        if is_dataclass(item_type):
+            item_fields = tuple(f.name for f in fields(item_type))
+            return (lambda value: json.dumps([{name: getattr(item, name) for name in item_fields} for item in value]),
+                    lambda value: [item_type(**item) for item in json.loads(value)] if value else [])
+        return json.dumps, lambda value: json.loads(value) if value else []
+    return None, None
+
+
+class PaperCodec:
+    """
+    Converts between Paper objects and rows of the papers table.
+    
+    Generated from the Paper dataclass fields, so a new field only needs its
+    column in the schema. Papers are encoded to parameter tuples for
+    executemany(), and rows selected with select_list are decoded positionally.
+    """
+    
+    def __init__(self):
+        paper_fields = fields(Paper)
+        self.columns = tuple(f.name for f in paper_fields)
+        self.select_list = ', '.join(self.columns)
+        codecs = [_field_codec(f.type) for f in paper_fields]
+        self._encoders = {f.name: encode for f, (encode, _) in zip(paper_fields, codecs)}
+        self._decoders = tuple((index, decode) for index, (_, decode) in enumerate(codecs) if decode is not None)
+        # Changed-field sets and column tuples recur for every paper a stage writes,
+        # so their columns and encoding plans are computed once
+        self._columns: Dict[frozenset, Tuple[str, ...]] = {}
+        self._plans: Dict[Tuple[str, ...], Tuple[Callable, Tuple[Tuple[int, Callable], ...]]] = {}
+    
+    def columns_for(self, changed_fields: Set[str]) -> Tuple[str, ...]:
+        """Return the columns an upsert of the given changed fields writes: the ID and the changed fields."""
+        key = frozenset(changed_fields)
+        columns = self._columns.get(key)
+        if columns is None:
+            columns = tuple(column for column in self.columns if column == 'id' or column in key)
+            self._columns[key] = columns
+        return columns
+    
+    def encode(self, paper: Paper, columns: Tuple[str, ...]) -> tuple:
+        """Return the values of the given columns of a paper, in column order."""
+        plan = self._plans.get(columns)
+        if plan is None:
+            encoders = tuple((index, self._encoders[column]) for index, column in enumerate(columns)
+                             if self._encoders[column] is not None)
+            plan = (attrgetter(*columns), encoders)
+            self._plans[columns] = plan
+        getter, encoders = plan
+        values = getter(paper)
+        if len(columns) == 1:
+            values = (values,)
+        if not encoders:
+            return values
+        values = list(values)
+        for index, encode in encoders:
+            values[index] = encode(values[index])
+        return tuple(values)
+    
+    def decode(self, row: Sequence) -> Paper:
+        """Build a clean Paper from a row selected with select_list."""
+        values = list(row)
+        for index, decode in self._decoders:
+            values[index] = decode(values[index])
+        # Loaded papers start clean, so the fields are set without recording them as dirty
+        paper = object.__new__(Paper)
+        paper.__dict__.update(zip(self.columns, values))
+        return paper
+
+
+PAPER_CODEC = PaperCodec()
+
+# Columns of the papers table, in Paper field order
+PAPER_COLUMNS = PAPER_CODEC.columns
+
+
+@lru_cache(maxsize=None)
+def _upsert_statement(columns: Tuple[str, ...]) -> str:
+    """Build an upsert statement that writes only the given columns of a paper row."""
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != 'id')
+    conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    return (f"INSERT INTO papers ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(id) {conflict_action}")
+
+
+# Tokens of a selection predicate (see compile_predicate)
+_PREDICATE_TOKEN = re.compile(
+    r"\s*(?:(?P<number>-?\d+(?:\.\d+)?)|(?P<string>'(?:[^']|'')*')"
+    r"|(?P<symbol><=|>=|!=|<>|=|<|>|\(|\)|,)|(?P<word>[A-Za-z_]\w*))"
+)
+
+# Comparison operators allowed between a column and a value
+_PREDICATE_OPERATORS = ('=', '!=', '<>', '<', '<=', '>', '>=')
+
+
+class _PredicateParser:
+    """Recursive descent parser of the selection predicate grammar (see compile_predicate)."""
+    
+    def __init__(self, predicate: str):
+        self.tokens = []
+        position = 0
+        while predicate[position:].strip():
+            match = _PREDICATE_TOKEN.match(predicate, position)
+            if not match:
+                raise ValueError(f"Invalid predicate near: {predicate[position:].strip()[:20]}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            self.tokens.append((kind, value.upper() if kind == 'word' and value.upper() in
+                                ('AND', 'OR', 'NOT', 'IS', 'NULL', 'LIKE', 'IN') else value))
+            position = match.end()
+        self.position = 0
+        self.params: list = []
+    
+    def parse(self) -> str:
+        sql = self._disjunction()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.position][1]!r} in predicate")
+        return sql
+    
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+    
+    def _take(self, expected: Optional[str] = None) -> Tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise ValueError("Predicate ends unexpectedly")
+        token = self.tokens[self.position]
+        if expected is not None and token[1] != expected:
+            raise ValueError(f"Expected {expected!r} in predicate, got {token[1]!r}")
+        self.position += 1
+        return token
+    
+    def _disjunction(self) -> str:
+        sql = self._conjunction()
+        while self._peek() == 'OR':
+            self._take()
+            sql = f"{sql} OR {self._conjunction()}"
+        return sql
+    
+    def _conjunction(self) -> str:
+        sql = self._condition()
+        while self._peek() == 'AND':
+            self._take()
+            sql = f"{sql} AND {self._condition()}"
+        return sql
+    
+    def _condition(self) -> str:
+        if self._peek() == 'NOT':
+            self._take()
+            return f"NOT {self._condition()}"
+        if self._peek() == '(':
+            self._take()
+            sql = self._disjunction()
+            self._take(')')
+            return f"({sql})"
+        
+        kind, column = self._take()
+        if kind != 'word' or column not in PAPER_COLUMNS:
+            raise ValueError(f"Unknown paper column in predicate: {column}")
+        operator = self._take()[1]
+        if operator == 'IS':
+            negated = self._peek() == 'NOT'
+            if negated:
+                self._take()
+            self._take('NULL')
+            return f"{column} IS {'NOT ' if negated else ''}NULL"
+        negated = operator == 'NOT'
+        if negated:
+            operator = self._take()[1]
+        if operator == 'LIKE':
+            return f"{column} {'NOT ' if negated else ''}LIKE {self._value()}"
+        if operator == 'IN':
+            self._take('(')
+            values = [self._value()]
+            while self._peek() == ',':
+                self._take()
+                values.append(self._value())
+            self._take(')')
+            return f"{column} {'NOT ' if negated else ''}IN ({', '.join(values)})"
+        if negated or operator not in _PREDICATE_OPERATORS:
+            raise ValueError(f"Unsupported operator in predicate: {operator}")
+        return f"{column} {operator} {self._value()}"
+    
+    def _value(self) -> str:
+        kind, value = self._take()
+        if kind == 'number':
+            self.params.append(float(value) if '.' in value else int(value))
+        elif kind == 'string':
+            self.params.append(value[1:-1].replace("''", "'"))
+        else:
+            raise ValueError(f"Expected a number or quoted string in predicate, got {value!r}")
+        return '?'
+
+
+def compile_predicate(predicate: str) -> Tuple[str, list]:
+    """
+    Compile a paper selection predicate into parameterized SQL.
+    
+    Predicates compare papers columns with literal values: =, !=, <>, <, <=,
+    >, >=, [NOT] LIKE, [NOT] IN (...) and IS [NOT] NULL, combined with AND,
+    OR, NOT and parentheses. Numbers and single-quoted strings are passed as
+    query parameters, and anything else (functions, subqueries, other tables)
+    is rejected.
+    
+    Args:
+        predicate: Condition such as "llm_score_status = 'failed'"
+        
+    Returns:
+        Tuple of (SQL condition, parameters)
+        
+    Raises:
+        ValueError: If the predicate is outside this grammar
+    """
+    parser = _PredicateParser(predicate)
+    return parser.parse(), parser.params
+
 
 class PaperDatabase:
     """
@@ -19,391 +267,398 @@ class PaperDatabase:
     """
     
     def __init__(self, db_path: str = DATABASE_PATHS['main_database']):
-        """Initialize the database connection and create tables if needed."""
+        """
+        Initialize the database handle and create tables if needed.
+        
+        Handles are cheap: queries run on the thread's shared connection (see
+        db_connections.py), and the tables are created once per process.
+        """
         self.db_path = db_path
-        self._create_tables()
-    
-    def _create_tables(self) -> None:
-        """Create the papers table if it doesn't exist."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS papers (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    authors TEXT,  -- JSON array
-                    categories TEXT,  -- JSON array
-                    abstract TEXT,
-                    published_date TEXT,  -- ISO format
-                    arxiv_url TEXT,  -- Main arXiv abstract page URL
-                    pdf_url TEXT,    -- Direct PDF download URL
-                    latex_url TEXT,   -- LaTeX source files URL
-                    scraper_status TEXT,
-                    intro_status TEXT DEFAULT 'not_extracted',
-                    category_enhancement TEXT DEFAULT 'not_enhanced',
-                    introduction_text TEXT,
-                    intro_extraction_method TEXT,
-                    tex_file_name TEXT,
-                    embedding_status TEXT DEFAULT 'not_embedded',
-                    agentic_ai_score REAL,
-                    proximal_policy_optimization_score REAL,
-                    reinforcement_learning_score REAL,
-                    reasoning_models_score REAL,
-                    inference_time_scaling_score REAL,
-                    llm_validation_status TEXT DEFAULT 'not_validated',
-                    agentic_ai_relevance TEXT DEFAULT 'not_validated',
-                    proximal_policy_optimization_relevance TEXT DEFAULT 'not_validated',
-                    reinforcement_learning_relevance TEXT DEFAULT 'not_validated',
-                    reasoning_models_relevance TEXT DEFAULT 'not_validated',
-                    inference_time_scaling_relevance TEXT DEFAULT 'not_validated',
-                    agentic_ai_justification TEXT DEFAULT 'no_justification',
-                    proximal_policy_optimization_justification TEXT DEFAULT 'no_justification',
-                    reinforcement_learning_justification TEXT DEFAULT 'no_justification',
-                    reasoning_models_justification TEXT DEFAULT 'no_justification',
-                    inference_time_scaling_justification TEXT DEFAULT 'no_justification',
-                    llm_score_status TEXT DEFAULT 'not_scored',
-                    summary TEXT,
-                    novelty_score TEXT,
-                    novelty_justification TEXT,
-                    impact_score TEXT,
-                    impact_justification TEXT,
-                    recommendation_score TEXT,
-                    recommendation_justification TEXT,
-                    h_index_status TEXT DEFAULT 'not_fetched',
-                    semantic_scholar_url TEXT,
-                    h_index_fetch_method TEXT,
-                    total_authors INTEGER,
-                    authors_found INTEGER,
-                    highest_h_index INTEGER,
-                    average_h_index REAL,
-                    notable_authors_count INTEGER,
-                    author_h_indexes TEXT,  -- JSON array of AuthorHIndex objects
-                    errors TEXT,  -- JSON array
-                    created_at TEXT,  -- ISO format
-                    updated_at TEXT,  -- ISO format
-                    last_generated TEXT  -- YYYY-MM-DD format for cache cleanup
-                )
-            """)
-            
-            # Create topic_embeddings table if it doesn't exist
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS topic_embeddings (
-                    topic_name TEXT PRIMARY KEY,
-                    description TEXT,
-                    embedding_vector TEXT,  -- JSON array of floats
-                    model TEXT,
-                    created_at TEXT
-                )
-            """)
+        db_connections.initialize(db_path, 'papers', self._create_tables)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the database."""
+        return db_connections.get(self.db_path)
+    
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection) -> None:
+        """Create the papers and topic_embeddings tables if they don't exist."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                authors TEXT,  -- JSON array
+                categories TEXT,  -- JSON array
+                abstract TEXT,
+                published_date TEXT,  -- ISO format
+                arxiv_url TEXT,  -- Main arXiv abstract page URL
+                pdf_url TEXT,    -- Direct PDF download URL
+                latex_url TEXT,   -- LaTeX source files URL
+                scraper_status TEXT,
+                intro_status TEXT DEFAULT 'not_extracted',
+                category_enhancement TEXT DEFAULT 'not_enhanced',
+                introduction_text TEXT,
+                intro_extraction_method TEXT,
+                tex_file_name TEXT,
+                embedding_status TEXT DEFAULT 'not_embedded',
+                agentic_ai_score REAL,
+                proximal_policy_optimization_score REAL,
+                reinforcement_learning_score REAL,
+                reasoning_models_score REAL,
+                inference_time_scaling_score REAL,
+                llm_validation_status TEXT DEFAULT 'not_validated',
+                agentic_ai_relevance TEXT DEFAULT 'not_validated',
+                proximal_policy_optimization_relevance TEXT DEFAULT 'not_validated',
+                reinforcement_learning_relevance TEXT DEFAULT 'not_validated',
+                reasoning_models_relevance TEXT DEFAULT 'not_validated',
+                inference_time_scaling_relevance TEXT DEFAULT 'not_validated',
+                agentic_ai_justification TEXT DEFAULT 'no_justification',
+                proximal_policy_optimization_justification TEXT DEFAULT 'no_justification',
+                reinforcement_learning_justification TEXT DEFAULT 'no_justification',
+                reasoning_models_justification TEXT DEFAULT 'no_justification',
+                inference_time_scaling_justification TEXT DEFAULT 'no_justification',
+                llm_score_status TEXT DEFAULT 'not_scored',
+                summary TEXT,
+                novelty_score TEXT,
+                novelty_justification TEXT,
+                impact_score TEXT,
+                impact_justification TEXT,
+                recommendation_score TEXT,
+                recommendation_justification TEXT,
+                h_index_status TEXT DEFAULT 'not_fetched',
+                semantic_scholar_url TEXT,
+                h_index_fetch_method TEXT,
+                total_authors INTEGER,
+                authors_found INTEGER,
+                highest_h_index INTEGER,
+                average_h_index REAL,
+                notable_authors_count INTEGER,
+                author_h_indexes TEXT,  -- JSON array of AuthorHIndex objects
+                errors TEXT,  -- JSON array
+                created_at TEXT,  -- ISO format
+                updated_at TEXT,  -- ISO format
+                last_generated TEXT  -- YYYY-MM-DD format for cache cleanup
+            )
+        """)
+        
+        # Create topic_embeddings table if it doesn't exist
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS topic_embeddings (
+                topic_name TEXT PRIMARY KEY,
+                description TEXT,
+                embedding_vector TEXT,  -- JSON array of floats
+                model TEXT,
+                created_at TEXT
+            )
+        """)
     
     def save_paper(self, paper: Paper) -> None:
         """Save or update a paper in the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO papers (
-                    id, title, authors, categories, abstract, published_date,
-                    arxiv_url, pdf_url, latex_url, scraper_status, intro_status, category_enhancement, introduction_text,
-                    intro_extraction_method, tex_file_name, embedding_status, agentic_ai_score,
-                    proximal_policy_optimization_score, reinforcement_learning_score, reasoning_models_score,
-                    inference_time_scaling_score, llm_validation_status, agentic_ai_relevance,
-                    proximal_policy_optimization_relevance, reinforcement_learning_relevance, reasoning_models_relevance,
-                    inference_time_scaling_relevance, agentic_ai_justification, proximal_policy_optimization_justification, reinforcement_learning_justification,
-                    reasoning_models_justification, inference_time_scaling_justification, llm_score_status, summary, novelty_score,
-                    novelty_justification, impact_score, impact_justification, recommendation_score,
-                    recommendation_justification, h_index_status, semantic_scholar_url, h_index_fetch_method,
-                    total_authors, authors_found, highest_h_index, average_h_index, notable_authors_count,
-                    author_h_indexes, errors, created_at, updated_at, last_generated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                paper.id,
-                paper.title,
-                json.dumps(paper.authors),
-                json.dumps(paper.categories),
-                paper.abstract,
-                paper.published_date.isoformat(),
-                paper.arxiv_url,
-                paper.pdf_url,
-                paper.latex_url,
-                paper.scraper_status,
-                paper.intro_status,
-                paper.category_enhancement,
-                paper.introduction_text,
-                paper.intro_extraction_method,
-                paper.tex_file_name,
-                paper.embedding_status,
-                paper.agentic_ai_score,
-                paper.proximal_policy_optimization_score,
-                paper.reinforcement_learning_score,
-                paper.reasoning_models_score,
-                paper.inference_time_scaling_score,
-                paper.llm_validation_status,
-                paper.agentic_ai_relevance,
-                paper.proximal_policy_optimization_relevance,
-                paper.reinforcement_learning_relevance,
-                paper.reasoning_models_relevance,
-                paper.inference_time_scaling_relevance,
-                paper.agentic_ai_justification,
-                paper.proximal_policy_optimization_justification,
-                paper.reinforcement_learning_justification,
-                paper.reasoning_models_justification,
-                paper.inference_time_scaling_justification,
-                paper.llm_score_status,
-                paper.summary,
-                paper.novelty_score,
-                paper.novelty_justification,
-                paper.impact_score,
-                paper.impact_justification,
-                paper.recommendation_score,
-                paper.recommendation_justification,
-                paper.h_index_status,
-                paper.semantic_scholar_url,
-                paper.h_index_fetch_method,
-                paper.total_authors,
-                paper.authors_found,
-                paper.highest_h_index,
-                paper.average_h_index,
-                paper.notable_authors_count,
-                json.dumps([{
-                    'name': auth.name,
-                    'profile_url': auth.profile_url,
-                    'h_index': auth.h_index
-                } for auth in paper.author_h_indexes]),
-                json.dumps(paper.errors),
-                paper.created_at.isoformat(),
-                paper.updated_at.isoformat(),
-                paper.last_generated
-            ))
+        self.save_papers({paper.id: paper})
     
     def load_paper(self, paper_id: str) -> Optional[Paper]:
         """Load a paper from the database by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT * FROM papers WHERE id = ?", (paper_id,))
-            row = cursor.fetchone()
-            
-            if row is None:
-                return None
-            
-            return Paper(
-                id=row['id'],
-                title=row['title'],
-                authors=json.loads(row['authors']),
-                categories=json.loads(row['categories']),
-                abstract=row['abstract'],
-                published_date=datetime.fromisoformat(row['published_date']),
-                arxiv_url=row['arxiv_url'],
-                pdf_url=row['pdf_url'],
-                latex_url=row['latex_url'],
-                scraper_status=row['scraper_status'],
-                intro_status=row['intro_status'],
-                category_enhancement=row['category_enhancement'],
-                introduction_text=row['introduction_text'],
-                intro_extraction_method=row['intro_extraction_method'],
-                tex_file_name=row['tex_file_name'],
-                embedding_status=row['embedding_status'],
-                agentic_ai_score=row['agentic_ai_score'],
-                proximal_policy_optimization_score=row['proximal_policy_optimization_score'],
-                reinforcement_learning_score=row['reinforcement_learning_score'],
-                reasoning_models_score=row['reasoning_models_score'],
-                inference_time_scaling_score=row['inference_time_scaling_score'],
-                llm_validation_status=row['llm_validation_status'],
-                agentic_ai_relevance=row['agentic_ai_relevance'],
-                proximal_policy_optimization_relevance=row['proximal_policy_optimization_relevance'],
-                reinforcement_learning_relevance=row['reinforcement_learning_relevance'],
-                reasoning_models_relevance=row['reasoning_models_relevance'],
-                inference_time_scaling_relevance=row['inference_time_scaling_relevance'],
-                agentic_ai_justification=row['agentic_ai_justification'],
-                proximal_policy_optimization_justification=row['proximal_policy_optimization_justification'],
-                reinforcement_learning_justification=row['reinforcement_learning_justification'],
-                reasoning_models_justification=row['reasoning_models_justification'],
-                inference_time_scaling_justification=row['inference_time_scaling_justification'],
-                llm_score_status=row['llm_score_status'],
-                summary=row['summary'],
-                novelty_score=row['novelty_score'],
-                novelty_justification=row['novelty_justification'],
-                impact_score=row['impact_score'],
-                impact_justification=row['impact_justification'],
-                recommendation_score=row['recommendation_score'],
-                recommendation_justification=row['recommendation_justification'],
-                h_index_status=row['h_index_status'],
-                semantic_scholar_url=row['semantic_scholar_url'],
-                h_index_fetch_method=row['h_index_fetch_method'],
-                total_authors=row['total_authors'],
-                authors_found=row['authors_found'],
-                highest_h_index=row['highest_h_index'],
-                average_h_index=row['average_h_index'],
-                notable_authors_count=row['notable_authors_count'],
-                author_h_indexes=[
-                    AuthorHIndex(
-                        name=auth['name'],
-                        profile_url=auth['profile_url'],
-                        h_index=auth['h_index']
-                    ) for auth in json.loads(row['author_h_indexes'])
-                ] if row['author_h_indexes'] else [],
-                errors=json.loads(row['errors']),
-                created_at=datetime.fromisoformat(row['created_at']),
-                updated_at=datetime.fromisoformat(row['updated_at']),
-                last_generated=row['last_generated']
-            )
+        row = self._connection().execute(
+            f"SELECT {PAPER_CODEC.select_list} FROM papers WHERE id = ?", (paper_id,)
+        ).fetchone()
+        return PAPER_CODEC.decode(row) if row else None
     
     def save_papers(self, papers: Dict[str, Paper]) -> None:
-        """Save multiple papers to the database efficiently."""
-        logger.info(f"Saving {len(papers)} papers to database")
+        """
+        Save the changed fields of multiple papers to the database.
         
-        with sqlite3.connect(self.db_path) as conn:
-            for paper in papers.values():
-                conn.execute("""
-                    INSERT OR REPLACE INTO papers (
-                        id, title, authors, categories, abstract, published_date,
-                        arxiv_url, pdf_url, latex_url, scraper_status, intro_status, category_enhancement, introduction_text,
-                        intro_extraction_method, tex_file_name, embedding_status, agentic_ai_score,
-                        proximal_policy_optimization_score, reinforcement_learning_score, reasoning_models_score,
-                        inference_time_scaling_score, llm_validation_status, agentic_ai_relevance,
-                        proximal_policy_optimization_relevance, reinforcement_learning_relevance, reasoning_models_relevance,
-                        inference_time_scaling_relevance, agentic_ai_justification, proximal_policy_optimization_justification, reinforcement_learning_justification,
-                        reasoning_models_justification, inference_time_scaling_justification, llm_score_status, summary, novelty_score,
-                        novelty_justification, impact_score, impact_justification, recommendation_score,
-                        recommendation_justification, h_index_status, semantic_scholar_url, h_index_fetch_method,
-                        total_authors, authors_found, highest_h_index, average_h_index, notable_authors_count,
-                        author_h_indexes, errors, created_at, updated_at, last_generated
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    paper.id,
-                    paper.title,
-                    json.dumps(paper.authors),
-                    json.dumps(paper.categories),
-                    paper.abstract,
-                    paper.published_date.isoformat(),
-                    paper.arxiv_url,
-                    paper.pdf_url,
-                    paper.latex_url,
-                    paper.scraper_status,
-                    paper.intro_status,
-                    paper.category_enhancement,
-                    paper.introduction_text,
-                    paper.intro_extraction_method,
-                    paper.tex_file_name,
-                    paper.embedding_status,
-                    paper.agentic_ai_score,
-                    paper.proximal_policy_optimization_score,
-                    paper.reinforcement_learning_score,
-                    paper.reasoning_models_score,
-                    paper.inference_time_scaling_score,
-                    paper.llm_validation_status,
-                    paper.agentic_ai_relevance,
-                    paper.proximal_policy_optimization_relevance,
-                    paper.reinforcement_learning_relevance,
-                    paper.reasoning_models_relevance,
-                    paper.inference_time_scaling_relevance,
-                    paper.agentic_ai_justification,
-                    paper.proximal_policy_optimization_justification,
-                    paper.reinforcement_learning_justification,
-                    paper.reasoning_models_justification,
-                    paper.inference_time_scaling_justification,
-                    paper.llm_score_status,
-                    paper.summary,
-                    paper.novelty_score,
-                    paper.novelty_justification,
-                    paper.impact_score,
-                    paper.impact_justification,
-                    paper.recommendation_score,
-                    paper.recommendation_justification,
-                    paper.h_index_status,
-                    paper.semantic_scholar_url,
-                    paper.h_index_fetch_method,
-                    paper.total_authors,
-                    paper.authors_found,
-                    paper.highest_h_index,
-                    paper.average_h_index,
-                    paper.notable_authors_count,
-                    json.dumps([{
-                        'name': auth.name,
-                        'profile_url': auth.profile_url,
-                        'h_index': auth.h_index
-                    } for auth in paper.author_h_indexes]),
-                    json.dumps(paper.errors),
-                    paper.created_at.isoformat(),
-                    paper.updated_at.isoformat(),
-                    paper.last_generated
-                ))
+        Only papers with unsaved changes are written, and only their changed
+        columns are sent, using INSERT ... ON CONFLICT DO UPDATE so existing rows
+        are updated in place rather than deleted and reinserted. Changes are
+        committed in transactions of at most DATABASE_WRITE_BATCH papers, with
+        one executemany() per set of changed columns.
+        """
+        changes = self._take_changes(papers.values())
         
-        logger.info(f"Successfully saved {len(papers)} papers to database")
+        if not changes:
+            logger.info(f"No changes to save for {len(papers)} papers")
+            return
+        
+        logger.info(f"Saving changes for {len(changes)}/{len(papers)} papers to database")
+        for start in range(0, len(changes), DATABASE_WRITE_BATCH):
+            try:
+                self._write_changes(changes[start:start + DATABASE_WRITE_BATCH])
+            except Exception:
+                # Keep the papers not yet written pending for the next save as well
+                for paper, changed_fields in changes[start + DATABASE_WRITE_BATCH:]:
+                    paper.mark_dirty(changed_fields)
+                raise
+        
+        column_count = sum(len(changed_fields) for _, changed_fields in changes)
+        logger.info(f"Successfully saved {column_count} changed fields across {len(changes)} papers")
     
-    def load_papers(self, paper_ids: list[str]) -> Dict[str, Paper]:
-        """Load multiple papers from the database."""
-        papers = {}
+    def _take_changes(self, papers: Iterable[Paper]) -> List[Tuple[Paper, Set[str]]]:
+        """Collect the dirty fields of each paper, marking the papers clean."""
+        changes = []
+        for paper in papers:
+            changed_fields = paper.take_dirty_fields()
+            if changed_fields:
+                changes.append((paper, changed_fields))
+        return changes
+    
+    def _write_changes(self, changes: List[Tuple[Paper, Set[str]]]) -> None:
+        """
+        Upsert the given changed columns in a single transaction.
+        
+        The rows are encoded before the transaction starts, so the write lock is
+        held only for the inserts.
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        If the write fails nothing is committed and the fields are marked dirty
+        again, so the next save retries them.
+        """
+        try:
+            # Papers changed by the same stage share their columns, so each group is one executemany()
+            rows: Dict[Tuple[str, ...], List[tuple]] = {}
+            for paper, changed_fields in changes:
+                columns = PAPER_CODEC.columns_for(changed_fields)
+                rows.setdefault(columns, []).append(PAPER_CODEC.encode(paper, columns))
+            self.write_rows(rows)
+        except Exception:
+            # Nothing was committed, so keep the changes pending for the next save
+            for paper, changed_fields in changes:
+                paper.mark_dirty(changed_fields)
+            raise
+    
+    def write_rows(self, rows: Dict[Tuple[str, ...], List[tuple]]) -> None:
+        """
+        Upsert encoded paper rows in a single transaction.
+        
+        Args:
+            rows: Column tuple (starting with 'id') -> rows encoded with PAPER_CODEC.encode
             
-            # Use parameterized query with IN clause
-            placeholders = ','.join('?' * len(paper_ids))
-            cursor = conn.execute(
-                f"SELECT * FROM papers WHERE id IN ({placeholders})",
-                paper_ids
-            )
+        Raises:
+            ValueError: If a column tuple names a column the papers table does not have
+        """
+        for columns in rows:
+            if not columns or columns[0] != 'id' or not set(columns) <= set(PAPER_COLUMNS):
+                raise ValueError(f"Invalid paper columns: {', '.join(columns)}")
+        started = time.monotonic()
+        conn = self._connection()
+        with conn:
+            for columns, values in rows.items():
+                conn.executemany(_upsert_statement(columns), values)
+        metrics.DB_WRITE_DURATION.observe(time.monotonic() - started)
+        metrics.DB_PAPERS_WRITTEN.inc(sum(len(values) for values in rows.values()))
+    
+    def checkpoint(self) -> None:
+        """
+        Copy the write-ahead log into the database file and truncate it.
+        
+        SQLite checkpoints on its own as the log grows; this keeps the log from
+        staying at its high-water mark between runs. Failures are logged and
+        never fail the run itself.
+        """
+        try:
+            busy, log_pages, copied_pages = self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if busy:
+                logger.info(f"WAL checkpoint incomplete ({copied_pages}/{log_pages} pages): readers still active")
+            else:
+                logger.info("WAL checkpoint complete")
+        except sqlite3.Error as e:
+            logger.warning(f"WAL checkpoint failed: {e}")
+    
+    def load_columns(self, paper_id: str, columns: Tuple[str, ...]) -> Dict[str, object]:
+        """
+        Load selected text columns of one paper (used to read released heavy fields back).
+        
+        Args:
+            paper_id: ID of the paper
+            columns: Names of columns stored as plain values (see paper.HEAVY_FIELDS)
+            
+        Returns:
+            Dictionary of column -> value (empty if the paper is not in the database)
+        """
+        unknown = set(columns) - set(PAPER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown paper columns: {', '.join(sorted(unknown))}")
+        row = self._connection().execute(
+            f"SELECT {', '.join(columns)} FROM papers WHERE id = ?", (paper_id,)
+        ).fetchone()
+        return dict(zip(columns, row)) if row else {}
+    
+    def select_paper_ids(self, start_date: str, end_date: str, predicate: Optional[str] = None,
+                         after_id: Optional[str] = None, limit: int = 500) -> List[str]:
+        """
+        Select one page of paper IDs by publication date and an optional SQL predicate.
+
+        Pages are keyed on the paper ID rather than an offset, so walking them
+        stays cheap on large tables and is unaffected by rows changing between pages.
+
+        Args:
+            start_date: First publication date (YYYY-MM-DD), inclusive
+            end_date: Last publication date (YYYY-MM-DD), inclusive
+            predicate: Condition on the papers table (e.g. "llm_score_status = 'failed'", see compile_predicate)
+            after_id: Return only IDs after this one (the last ID of the previous page)
+            limit: Maximum number of IDs returned
+
+        Returns:
+            Paper IDs in ascending order
             
-            for row in cursor:
-                paper = Paper(
-                    id=row['id'],
-                    title=row['title'],
-                    authors=json.loads(row['authors']),
-                    categories=json.loads(row['categories']),
-                    abstract=row['abstract'],
-                    published_date=datetime.fromisoformat(row['published_date']),
-                    arxiv_url=row['arxiv_url'],
-                    pdf_url=row['pdf_url'],
-                    latex_url=row['latex_url'],
-                    scraper_status=row['scraper_status'],
-                    intro_status=row['intro_status'],
-                    category_enhancement=row['category_enhancement'],
-                    introduction_text=row['introduction_text'],
-                    intro_extraction_method=row['intro_extraction_method'],
-                    tex_file_name=row['tex_file_name'],
-                    embedding_status=row['embedding_status'],
-                    agentic_ai_score=row['agentic_ai_score'],
-                    proximal_policy_optimization_score=row['proximal_policy_optimization_score'],
-                    reinforcement_learning_score=row['reinforcement_learning_score'],
-                    reasoning_models_score=row['reasoning_models_score'],
-                    inference_time_scaling_score=row['inference_time_scaling_score'],
-                    llm_validation_status=row['llm_validation_status'],
-                    agentic_ai_relevance=row['agentic_ai_relevance'],
-                    proximal_policy_optimization_relevance=row['proximal_policy_optimization_relevance'],
-                    reinforcement_learning_relevance=row['reinforcement_learning_relevance'],
-                    reasoning_models_relevance=row['reasoning_models_relevance'],
-                    inference_time_scaling_relevance=row['inference_time_scaling_relevance'],
-                    agentic_ai_justification=row['agentic_ai_justification'],
-                    proximal_policy_optimization_justification=row['proximal_policy_optimization_justification'],
-                    reinforcement_learning_justification=row['reinforcement_learning_justification'],
-                    reasoning_models_justification=row['reasoning_models_justification'],
-                    inference_time_scaling_justification=row['inference_time_scaling_justification'],
-                    llm_score_status=row['llm_score_status'],
-                    summary=row['summary'],
-                    novelty_score=row['novelty_score'],
-                    novelty_justification=row['novelty_justification'],
-                    impact_score=row['impact_score'],
-                    impact_justification=row['impact_justification'],
-                    recommendation_score=row['recommendation_score'],
-                    recommendation_justification=row['recommendation_justification'],
-                    h_index_status=row['h_index_status'],
-                    semantic_scholar_url=row['semantic_scholar_url'],
-                    h_index_fetch_method=row['h_index_fetch_method'],
-                    total_authors=row['total_authors'],
-                    authors_found=row['authors_found'],
-                    highest_h_index=row['highest_h_index'],
-                    average_h_index=row['average_h_index'],
-                    notable_authors_count=row['notable_authors_count'],
-                    author_h_indexes=[
-                        AuthorHIndex(
-                            name=auth['name'],
-                            profile_url=auth['profile_url'],
-                            h_index=auth['h_index']
-                        ) for auth in json.loads(row['author_h_indexes'])
-                    ] if row['author_h_indexes'] else [],
-                    errors=json.loads(row['errors']),
-                    created_at=datetime.fromisoformat(row['created_at']),
-                    updated_at=datetime.fromisoformat(row['updated_at'])
-                )
+        Raises:
+            ValueError: If the predicate is invalid
+        """
+        conditions = ["substr(published_date, 1, 10) BETWEEN ? AND ?"]
+        params: list = [start_date, end_date]
+        if predicate:
+            condition, predicate_params = compile_predicate(predicate)
+            conditions.append(f"({condition})")
+            params.extend(predicate_params)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        params.append(limit)
+        # The selection only reads, so the connection refuses writes while it runs
+        conn = self._connection()
+        conn.execute("PRAGMA query_only = ON")
+        try:
+            rows = conn.execute(
+                f"SELECT id FROM papers WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?", params
+            ).fetchall()
+        finally:
+            conn.execute("PRAGMA query_only = OFF")
+        return [row[0] for row in rows]
+
+    def load_papers(self, paper_ids: list[str]) -> Dict[str, Paper]:
+        """Load multiple papers from the database, DATABASE_READ_BATCH IDs per query."""
+        papers = {}
+        
+        for start in range(0, len(paper_ids), DATABASE_READ_BATCH):
+            for row in self.load_rows(paper_ids[start:start + DATABASE_READ_BATCH]):
+                paper = PAPER_CODEC.decode(row)
                 papers[paper.id] = paper
         
         logger.info(f"Loaded {len(papers)} papers from database")
-        return papers
\ No newline at end of file
+        return papers
+    
+    def load_rows(self, paper_ids: Sequence[str]) -> List[tuple]:
+        """Select the rows of up to DATABASE_READ_BATCH papers, as PAPER_CODEC.decode expects them."""
+        return self._connection().execute(
+            f"SELECT {PAPER_CODEC.select_list} FROM papers WHERE id IN ({','.join('?' * len(paper_ids))})",
+            list(paper_ids)
+        ).fetchall()
+
+
+class CheckpointWriter:
+    """
+    Background writer that durably saves papers as soon as a stage finishes them.
+    
+    Stage workers hand finished papers to enqueue() and carry on; a single writer
+    thread commits their changed fields in small transactions. If the process dies
+    mid-stage, every paper finished before the crash is already in the database and
+    a rerun only processes the papers that were still unfinished.
+    """
+    
+    _CLOSE = object()
+    
+    def __init__(self, db: PaperDatabase, flush_interval: float = 1.0, max_batch: int = 50):
+        """
+        Initialize the writer.
+        
+        Args:
+            db: Database to write to
+            flush_interval: Seconds to collect papers before committing them together
+            max_batch: Maximum number of papers per transaction
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # (paper, release) pairs; release asks for the heavy fields to be dropped once saved
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.papers_written = 0
+        self.transactions = 0
+        self.papers_released = 0
+    
+    def start(self) -> None:
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+    
+    def enqueue(self, paper: Paper) -> None:
+        """Schedule a paper's pending changes to be written."""
+        self._queue.put((paper, False))
+    
+    def release(self, paper: Paper) -> None:
+        """Schedule a paper that has left the stages to be written, then stripped of its heavy fields."""
+        self._queue.put((paper, True))
+    
+    def close(self) -> None:
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Checkpoint writer saved {self.papers_written} paper updates in {self.transactions} transactions"
+                    f", released heavy fields of {self.papers_released} papers")
+    
+    def _run(self) -> None:
+        """Collect queued papers and commit them until closed."""
+        pending: Dict[str, Paper] = {}
+        releasing: Dict[str, Paper] = {}
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self._CLOSE:
+                    closing = True
+                    break
+                self._collect(item, pending, releasing)
+                if len(pending) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if closing:
+                # Drain anything enqueued after the close marker's predecessors
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not self._CLOSE:
+                        self._collect(item, pending, releasing)
+            
+            pending = self._flush(pending, final=closing)
+            
+            # Saved papers drop their heavy fields; fields that failed to save stay dirty and in memory
+            for paper_id in [paper_id for paper_id in releasing if paper_id not in pending]:
+                if releasing.pop(paper_id).release_heavy_fields(self.db.load_columns):
+                    self.papers_released += 1
+    
+    @staticmethod
+    def _collect(item: Tuple[Paper, bool], pending: Dict[str, Paper], releasing: Dict[str, Paper]) -> None:
+        """Add a queued (paper, release) pair to the next flush."""
+        paper, release = item
+        pending[paper.id] = paper
+        if release:
+            releasing[paper.id] = paper
+    
+    def _flush(self, pending: Dict[str, Paper], final: bool) -> Dict[str, Paper]:
+        """
+        Commit pending papers, returning the ones that must be retried.
+        
+        A failed write leaves the papers' fields dirty, so they are kept for the
+        next flush; on the final flush they are left for the next regular save.
+        """
+        changes = self.db._take_changes(pending.values())
+        if not changes:
+            return {}
+        try:
+            self.db._write_changes(changes)
+        except Exception as e:
+            if final:
+                logger.error(f"Checkpoint write of {len(changes)} papers failed: {e}")
+                return {}
+            logger.warning(f"Checkpoint write of {len(changes)} papers failed, will retry: {e}")
+            return pending
+        self.papers_written += len(changes)
+        self.transactions += 1
+        logger.debug(f"Checkpointed {len(changes)} papers")
+        return {}
@@ -0,0 +1,135 @@
+"""
+Database Connections
+
+This module keeps the pipeline's SQLite connections open for the life of the
+process instead of opening one per query. Each thread gets one connection per
+database file, created on first use and tuned once with the settings in the
+SQLITE config section: WAL journaling, synchronous=NORMAL, a sized page cache,
+a memory-mapped read window and a prepared statement cache large enough to
+reuse every upsert the pipeline issues.
+
+Connections are per thread rather than one shared handle behind a lock. In WAL
+mode readers never wait on writers, so the event loop reading released heavy
+fields back, a worker loading a batch and the checkpoint writer committing
+finished papers each run on their own connection without queueing behind one
+another. Writers still take turns on the file's write lock, waiting up to
+SQLITE['busy_timeout'] seconds for it.
+
+Table setup runs once per database file and process (see initialize()), so
+constructing a PaperDatabase or loading the topic embeddings no longer re-runs
+CREATE TABLE statements.
+"""
+
+import atexit
+import logging
+import sqlite3
+import threading
+from typing import Callable, List, Set, Tuple
+
+import config
+
+logger = logging.getLogger('DB_CONNECTIONS')
+
+
+class ConnectionManager:
+    """Hands out one long-lived, tuned connection per thread and database file."""
+
+    def __init__(self, sqlite_config: dict):
+        """
+        Initialize the manager.
+
+        Args:
+            sqlite_config: The SQLITE configuration dictionary
+        """
+        self.config = sqlite_config
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (thread, path, connection) of every open connection, so connections of
+        # finished threads can be closed and close_all() reaches every thread
+        self._open: List[Tuple[threading.Thread, str, sqlite3.Connection]] = []
+        # Bumped by close_all(), which invalidates the connections threads still hold
+        self._generation = 0
+        self._wal_paths: Set[str] = set()
+        self._initialized: Set[Tuple[str, str]] = set()
+
+    def get(self, path: str) -> sqlite3.Connection:
+        """
+        Return this thread's connection to a database file, opening it on first use.
+
+        Use `with conn:` around writes; it commits, or rolls back on an error.
+
+        Args:
+            path: Path of the SQLite database file
+
+        Returns:
+            The open connection
+        """
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.connections = {}
+            local.generation = self._generation
+        conn = local.connections.get(path)
+        if conn is None:
+            conn = self._open_connection(path)
+            local.connections[path] = conn
+        return conn
+
+    def _open_connection(self, path: str) -> sqlite3.Connection:
+        """Open and tune a connection for the current thread."""
+        conn = sqlite3.connect(path, timeout=self.config['busy_timeout'],
+                               cached_statements=self.config['cached_statements'], check_same_thread=False)
+        conn.execute(f"PRAGMA synchronous={self.config['synchronous']}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size={-self.config['cache_size_mb'] * 1024}")
+        conn.execute(f"PRAGMA mmap_size={self.config['mmap_size_mb'] * 2 ** 20}")
+
+        with self._lock:
+            # WAL is a property of the file, so it is switched on once per path
+            if path not in self._wal_paths:
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._wal_paths.add(path)
+            finished = [entry for entry in self._open if not entry[0].is_alive()]
+            self._open = [entry for entry in self._open if entry[0].is_alive()]
+            self._open.append((threading.current_thread(), path, conn))
+
+        # Threads that ended (e.g. the checkpoint writer of an earlier daemon poll) leave their connections behind
+        for _, _, stale in finished:
+            stale.close()
+        return conn
+
+    def initialize(self, path: str, name: str, setup: Callable[[sqlite3.Connection], None]) -> None:
+        """
+        Run a setup step (such as creating tables) once per database file and process.
+
+        Args:
+            path: Path of the SQLite database file
+            name: Name of the setup step, unique per file
+            setup: Called with a connection to the file; committed once it returns
+        """
+        key = (path, name)
+        if key in self._initialized:
+            return
+        conn = self.get(path)
+        with conn:
+            setup(conn)
+        with self._lock:
+            self._initialized.add(key)
+
+    def close_all(self) -> None:
+        """Close every open connection; threads open new ones on their next get()."""
+        with self._lock:
+            connections = self._open
+            self._open = []
+            self._generation += 1
+            self._wal_paths.clear()
+            self._initialized.clear()
+        for _, _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Closing a database connection failed: {e}")
+
+
+# Process-wide connections shared by the database layer and the stages
+db_connections = ConnectionManager(config.SQLITE)
+atexit.register(db_connections.close_all)
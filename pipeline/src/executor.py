@@ -0,0 +1,592 @@
+"""
+Streaming Stage Executor
+
+This module runs papers through the processing stages as a dependency graph
+instead of a strict sequence of barriers. Every stage runs on one asyncio event
+loop: it owns a bounded queue and a fixed number of worker coroutines, and a
+paper is handed to the next stage the moment every stage it depends on has
+finished with it. A slow LaTeX download for one paper therefore no longer holds
+back the LLM workers for all the others.
+
+Because the stages are network-bound, a worker spends almost all of its time
+awaiting a response, so hundreds of requests can be in flight without a thread
+per request. Bounded queues give backpressure (a stage that falls behind slows
+down the stages feeding it instead of buffering every paper), and cancelling
+the executor cancels every in-flight request at once.
+
+Stage queues are priority queues. A stage with a priority key (see
+scheduling.py) takes the most promising waiting papers first; other stages
+keep arrival order.
+
+A paper a stage deferred to the retry queue (see retry_queue.py) leaves the
+graph right after that stage: its downstream stages are skipped and its group
+entry completes, so it is submitted again when the retry falls due.
+
+If a stage's process() raises for a whole batch, its papers leave the graph the
+same way. A retryable error defers them to the retry queue, up to
+RETRY_QUEUE['batch_failure_retries'] times; any other error, or one that has
+used up its retries, marks the stage failed for them. Failed papers are counted
+in the run report and fail the run.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from paper import Paper, STAGE_FIELDS
+import http_client
+from retry_queue import is_retryable, retry_queue
+from run_report import recorder
+from tracing import tracer
+import metrics
+
+logger = logging.getLogger('EXECUTOR')
+
+# Queue marker telling a worker that no more papers will arrive for its stage
+_STAGE_CLOSED = object()
+
+
+@dataclass
+class Stage:
+    """
+    Describes one processing stage of the pipeline.
+
+    Attributes:
+        name: Unique stage name (the module name by convention)
+        process: Coroutine function that processes a batch of papers in place
+        select: Callable returning True if a paper needs this stage. Papers that
+            are not selected pass straight through to the downstream stages.
+        depends_on: Names of the stages that must finish a paper first
+        max_workers: Number of concurrent worker coroutines for this stage
+        batch_size: Maximum number of papers handed to `process` at once
+        batch_linger: Seconds a worker waits for a batch to fill up before
+            processing a partial batch
+        priority: Optional callable returning a paper's sort key; papers with
+            the smallest key are processed first. None keeps arrival order.
+        lookahead: Minimum queue capacity. A priority key can only reorder the
+            papers waiting in the queue, so prioritized stages get a deeper one.
+        prepare: Optional coroutine function loading what every batch needs
+            (see prepare_stages). Awaited before any paper is submitted, so a
+            failure stops the run instead of failing papers batch by batch.
+    """
+    name: str
+    process: Callable[[List[Paper]], Awaitable[None]]
+    select: Callable[[Paper], bool]
+    depends_on: Tuple[str, ...] = ()
+    max_workers: int = 1
+    batch_size: int = 1
+    batch_linger: float = 0.0
+    priority: Optional[Callable[[Paper], Tuple]] = None
+    lookahead: int = 0
+    prepare: Optional[Callable[[], Awaitable[None]]] = None
+
+    @property
+    def queue_size(self) -> int:
+        """Capacity of the stage queue: enough to keep every worker's next batch ready."""
+        return max(2 * max(self.batch_size, self.max_workers), self.lookahead)
+
+
+@dataclass
+class _StageState:
+    """Runtime bookkeeping for a single stage."""
+    stage: Stage
+    inbox: Optional[asyncio.PriorityQueue] = None
+    # Tie-breaker keeping arrival order among papers with equal priority
+    sequence: int = 0
+    enqueued_at: Dict[str, float] = field(default_factory=dict)
+    workers: List[asyncio.Task] = field(default_factory=list)
+    live_workers: int = 0
+    input_closed: bool = False
+    closed: bool = False
+    selected: int = 0
+    passed_through: int = 0
+    processed: int = 0
+    deferred: int = 0
+    failed: int = 0
+    batches: int = 0
+    busy_time: float = 0.0
+    first_start: Optional[float] = None
+    last_finish: Optional[float] = None
+
+
+class PaperGroup:
+    """Completion handle for a set of papers submitted together."""
+
+    def __init__(self, size: int):
+        self._remaining = size
+        self._done = asyncio.Event()
+        if size == 0:
+            self._done.set()
+
+    def _paper_done(self) -> None:
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._done.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every paper in the group is done. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class StreamingExecutor:
+    """
+    Moves papers through a dependency graph of stages, one paper at a time.
+
+    Must be used from inside a running event loop.
+
+    Usage:
+        executor = StreamingExecutor(stages)
+        await executor.run(papers)
+
+    or, when papers arrive over time:
+        executor.start()
+        group = await executor.submit_group(papers)
+        await group.wait()
+        ...
+        await executor.finish()
+    """
+
+    def __init__(self, stages: List[Stage], on_paper_done: Optional[Callable[[Paper], None]] = None,
+                 on_paper_finished: Optional[Callable[[Paper], None]] = None):
+        """
+        Validate the stage graph and prepare per-stage state.
+
+        Args:
+            stages: Stage definitions
+            on_paper_done: Optional callback invoked on the event loop each time a
+                stage finishes processing a paper (used for checkpointing). It must
+                not block.
+            on_paper_finished: Optional callback invoked on the event loop once a
+                submitted paper has left every stage (used to release its heavy
+                fields). It must not block.
+        """
+        self._on_paper_done = on_paper_done
+        self._on_paper_finished = on_paper_finished
+        self._states: Dict[str, _StageState] = {}
+        for stage in stages:
+            if stage.name in self._states:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self._states[stage.name] = _StageState(stage=stage)
+
+        self._downstream: Dict[str, List[str]] = {name: [] for name in self._states}
+        for stage in stages:
+            for dependency in stage.depends_on:
+                if dependency not in self._states:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage: {dependency}")
+                self._downstream[dependency].append(stage.name)
+
+        self._order = self._topological_order()
+        self._roots = [name for name in self._order if not self._states[name].stage.depends_on]
+        self._sinks = [name for name in self._order if not self._downstream[name]]
+
+        # (paper_id, stage_name) -> number of dependencies already finished
+        self._pending_dependencies: Dict[Tuple[str, str], int] = {}
+        # paper_id -> number of sink stages already finished, for papers in a group
+        self._pending_sinks: Dict[str, int] = {}
+        self._groups: Dict[str, PaperGroup] = {}
+        self._source_closed = False
+        self._started = False
+        self._start_time: Optional[float] = None
+
+    def _topological_order(self) -> List[str]:
+        """Return stage names in dependency order, rejecting cycles."""
+        order = []
+        remaining = {name: set(state.stage.depends_on) for name, state in self._states.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Stage graph contains a cycle: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    async def run(self, papers: Dict[str, Paper]) -> Dict[str, Paper]:
+        """
+        Process every paper through all stages and wait for completion.
+
+        Args:
+            papers: Dictionary of paper_id -> Paper objects
+
+        Returns:
+            The same dictionary, with papers updated in place
+        """
+        await prepare_stages([state.stage for state in self._states.values()])
+        self.start()
+        try:
+            for paper in papers.values():
+                await self.submit(paper)
+            await self.finish()
+        except BaseException:
+            self.cancel()
+            raise
+        return papers
+
+    def start(self) -> None:
+        """Start the worker coroutines of every stage on the running event loop."""
+        if self._started:
+            raise RuntimeError("Executor already started")
+        self._started = True
+        self._start_time = time.monotonic()
+
+        for name in self._order:
+            state = self._states[name]
+            state.inbox = asyncio.PriorityQueue(maxsize=state.stage.queue_size)
+            state.live_workers = state.stage.max_workers
+            for i in range(state.stage.max_workers):
+                worker = asyncio.create_task(self._worker_loop(state), name=f"{name}-{i + 1}")
+                state.workers.append(worker)
+
+        logger.info(f"Started streaming executor with stages: "
+                    f"{', '.join(f'{n} ({self._states[n].stage.max_workers} workers)' for n in self._order)}")
+
+    async def submit(self, paper: Paper) -> None:
+        """Hand a paper to the root stages of the graph, waiting while they are full."""
+        if self._source_closed:
+            raise RuntimeError("Cannot submit papers after finish() was called")
+        for name in self._roots:
+            await self._offer(name, paper)
+
+    async def submit_group(self, papers: Dict[str, Paper]) -> 'PaperGroup':
+        """
+        Submit a set of papers and return a handle that completes when all of them
+        have been through every stage.
+
+        Args:
+            papers: Dictionary of paper_id -> Paper objects
+
+        Returns:
+            PaperGroup whose wait() completes when the papers are done
+        """
+        group = PaperGroup(len(papers))
+        for paper_id in papers:
+            self._groups[paper_id] = group
+        for paper in papers.values():
+            await self.submit(paper)
+        return group
+
+    async def finish(self) -> None:
+        """Signal that no more papers will be submitted and wait for all stages to drain."""
+        self._source_closed = True
+        for name in self._roots:
+            await self._close_stage_input(name)
+
+        workers = [worker for name in self._order for worker in self._states[name].workers]
+        await asyncio.gather(*workers)
+
+        self._log_summary()
+
+    def cancel(self) -> None:
+        """Cancel every worker, abandoning the papers still in flight."""
+        self._source_closed = True
+        cancelled = 0
+        for name in self._order:
+            for worker in self._states[name].workers:
+                if not worker.done():
+                    worker.cancel()
+                    cancelled += 1
+        if cancelled:
+            logger.warning(f"Cancelled {cancelled} stage workers")
+
+    async def _offer(self, stage_name: str, paper: Paper) -> None:
+        """Record that one dependency of a stage finished a paper, enqueueing it once all have."""
+        state = self._states[stage_name]
+        required = len(state.stage.depends_on)
+
+        if required > 1:
+            key = (paper.id, stage_name)
+            done = self._pending_dependencies.get(key, 0) + 1
+            if done < required:
+                self._pending_dependencies[key] = done
+                return
+            self._pending_dependencies.pop(key, None)
+
+        try:
+            needs_stage = state.stage.select(paper)
+        except Exception as e:
+            logger.error(f"{stage_name} - error selecting paper {paper.id}: {e}")
+            needs_stage = False
+
+        if needs_stage:
+            state.selected += 1
+            state.enqueued_at[paper.id] = time.monotonic()
+            await self._enqueue(state, paper)
+        else:
+            state.passed_through += 1
+            await self._forward(stage_name, paper)
+
+    async def _enqueue(self, state: _StageState, item: Any) -> None:
+        """
+        Put a paper (or the closing marker) on a stage queue.
+
+        Entries are (closing, key, sequence, item) tuples: papers sort before the
+        closing markers, then by priority key, then by arrival.
+        """
+        key = ()
+        if item is not _STAGE_CLOSED and state.stage.priority is not None:
+            try:
+                key = state.stage.priority(item)
+            except Exception as e:
+                logger.error(f"{state.stage.name} - error computing priority of paper {item.id}: {e}")
+        state.sequence += 1
+        await state.inbox.put((item is _STAGE_CLOSED, key, state.sequence, item))
+
+    async def _dequeue(self, state: _StageState) -> Any:
+        """Take the highest-priority entry from a stage queue and return its item."""
+        return (await state.inbox.get())[-1]
+
+    async def _forward(self, stage_name: str, paper: Paper) -> None:
+        """Pass a paper that a stage has finished with to its downstream stages."""
+        if not self._downstream[stage_name]:
+            self._reach_sink(paper)
+        for downstream in self._downstream[stage_name]:
+            await self._offer(downstream, paper)
+
+    def _reach_sink(self, paper: Paper) -> None:
+        """Record that a sink stage finished a paper, completing its group entry after the last one."""
+        if paper.id not in self._groups:
+            return
+        done = self._pending_sinks.get(paper.id, 0) + 1
+        if done < len(self._sinks):
+            self._pending_sinks[paper.id] = done
+            return
+        self._leave_graph(paper)
+
+    def _leave_graph(self, paper: Paper) -> None:
+        """Complete the group entry of a paper that is done with the graph, at a sink or deferred."""
+        self._pending_sinks.pop(paper.id, None)
+        group = self._groups.pop(paper.id, None)
+        if group is None:
+            return
+        group._paper_done()
+        if self._on_paper_finished is not None:
+            try:
+                self._on_paper_finished(paper)
+            except Exception as e:
+                logger.error(f"Paper finished callback failed for {paper.id}: {e}")
+
+    async def _close_stage_input(self, stage_name: str) -> None:
+        """Close a stage's input once every stage feeding it has closed."""
+        state = self._states[stage_name]
+        if state.input_closed:
+            return
+        if not state.stage.depends_on:
+            upstream_closed = self._source_closed
+        else:
+            upstream_closed = all(self._states[d].closed for d in state.stage.depends_on)
+        state.input_closed = upstream_closed
+        if upstream_closed:
+            for _ in range(state.stage.max_workers):
+                await self._enqueue(state, _STAGE_CLOSED)
+
+    async def _worker_loop(self, state: _StageState) -> None:
+        """Pull batches from a stage queue, process them and forward the papers."""
+        stage = state.stage
+        while True:
+            batch, closed = await self._next_batch(state)
+
+            if batch:
+                started = time.monotonic()
+                if state.first_start is None:
+                    state.first_start = started
+                failed_ids = set()
+                try:
+                    with tracer.stage_spans(stage.name, batch, batch_size=len(batch)):
+                        for paper in batch:
+                            tracer.annotate(paper.id, queue_wait_seconds=round(
+                                started - state.enqueued_at.get(paper.id, started), 3))
+                        # Papers resubmitted after finishing (retries) may have released heavy
+                        # fields; read them back off the event loop before the stage touches them
+                        released = [paper for paper in batch if paper.has_released_fields()]
+                        if released:
+                            await asyncio.to_thread(_restore_heavy_fields, released)
+                        await stage.process(batch)
+                        for paper in batch:
+                            tracer.annotate(paper.id, status=metrics.stage_status(stage.name, paper))
+                except Exception as e:
+                    logger.error(f"{stage.name} - unexpected error processing batch of {len(batch)} papers: {e}")
+                    failed_ids = await self._fail_batch(stage, batch, e)
+                finished = time.monotonic()
+                state.batches += 1
+                state.processed += len(batch)
+                state.busy_time += finished - started
+                state.last_finish = finished
+                metrics.STAGE_BATCH_SIZE.labels(stage.name).observe(len(batch))
+                recorder.record_stage_rss(stage.name)
+                # Time each paper spent in the stage, from entering its queue to being processed
+                for paper in batch:
+                    recorder.record_paper_stage_latency(stage.name, finished - state.enqueued_at.pop(paper.id, started))
+                    metrics.record_stage_paper(stage.name, paper)
+
+                for paper in batch:
+                    if self._on_paper_done is not None:
+                        try:
+                            self._on_paper_done(paper)
+                        except Exception as e:
+                            logger.error(f"{stage.name} - paper done callback failed for {paper.id}: {e}")
+                    if retry_queue.take_deferred(stage.name, paper.id) is not None:
+                        state.deferred += 1
+                        self._leave_graph(paper)
+                    elif paper.id in failed_ids:
+                        state.failed += 1
+                        self._leave_graph(paper)
+                    else:
+                        await self._forward(stage.name, paper)
+
+            if closed:
+                break
+
+        state.live_workers -= 1
+        if state.live_workers == 0:
+            state.closed = True
+            logger.debug(f"{stage.name} - stage drained")
+            for downstream in self._downstream[stage.name]:
+                await self._close_stage_input(downstream)
+
+    async def _fail_batch(self, stage: Stage, batch: List[Paper], error: Exception) -> set:
+        """
+        Defer or fail the papers of a batch whose process() raised.
+
+        Returns:
+            IDs of the papers marked failed (deferred papers are picked up through the retry queue)
+        """
+        backoff_seconds = retry_queue.config['batch_failure_backoff']
+        retryable = is_retryable(error)
+        failed_ids = set()
+        for paper in batch:
+            deferred = await retry_queue.adefer(stage.name, paper.id, error, retry_queue.config['batch_failure_retries'],
+                                                lambda retry: backoff_seconds * 2 ** retry, retryable)
+            if deferred:
+                continue
+            if stage.name in STAGE_FIELDS:
+                paper.fail_stage(stage.name, f"{stage.name} failed: {error}")
+            else:
+                paper.add_error(f"{stage.name} failed: {error}")
+            failed_ids.add(paper.id)
+        return failed_ids
+
+    async def _next_batch(self, state: _StageState) -> Tuple[List[Paper], bool]:
+        """
+        Collect the next batch of papers for a stage.
+
+        Waits for the first paper, then keeps filling the batch until it is full,
+        the linger time runs out or the stage input is closed.
+
+        Returns:
+            Tuple of (batch, closed) where closed means this worker should exit
+        """
+        item = await self._dequeue(state)
+        if item is _STAGE_CLOSED:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + state.stage.batch_linger
+        while len(batch) < state.stage.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = await asyncio.wait_for(self._dequeue(state), remaining)
+                else:
+                    item = state.inbox.get_nowait()[-1]
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if item is _STAGE_CLOSED:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _log_summary(self) -> None:
+        """Log per-stage throughput and timing once the executor has drained."""
+        elapsed = time.monotonic() - self._start_time
+        logger.info(f"Streaming executor finished in {elapsed:.1f}s")
+        for name in self._order:
+            state = self._states[name]
+            active = (state.last_finish - state.first_start) if state.first_start is not None else 0.0
+            deferred = f", {state.deferred} deferred for retry" if state.deferred else ""
+            failed = f", {state.failed} FAILED" if state.failed else ""
+            logger.info(f"  {name}: {state.processed} processed in {state.batches} batches, "
+                        f"{state.passed_through} passed through{deferred}{failed}, active {active:.1f}s, "
+                        f"busy {state.busy_time:.1f}s")
+            recorder.record_stage(name, active, busy_time=state.busy_time, processed=state.processed,
+                                  passed_through=state.passed_through, failed=state.failed)
+
+    @property
+    def failed_papers(self) -> int:
+        """Number of papers a stage failed because its process() raised for their batch."""
+        return sum(state.failed for state in self._states.values())
+
+
+def _restore_heavy_fields(papers: List[Paper]) -> None:
+    """Read the released heavy fields of papers back from the database (blocking)."""
+    for paper in papers:
+        paper.restore_heavy_fields()
+
+
+async def prepare_stages(stages: List[Stage]) -> None:
+    """
+    Await the prepare() step of every stage that has one.
+
+    Called before an executor or worker takes papers. Steps must be idempotent:
+    a daemon prepares its stages again on every poll.
+
+    Raises:
+        Exception: Whatever a prepare step raised
+    """
+    for stage in stages:
+        if stage.prepare is not None:
+            await stage.prepare()
+
+
+def select_stages(stages: List[Stage], names: List[str]) -> List[Stage]:
+    """
+    Return a subset of the stages as a graph of its own.
+
+    Dependencies on stages left out are dropped, so papers enter the subset at
+    its first stages; dependencies between selected stages are kept.
+
+    Args:
+        stages: Stage definitions of the full graph
+        names: Names of the stages to keep
+
+    Returns:
+        The selected stages, in their original order
+    """
+    unknown = set(names) - {stage.name for stage in stages}
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    return [replace(stage, depends_on=tuple(d for d in stage.depends_on if d in names))
+            for stage in stages if stage.name in names]
+
+
+def run_stage(stage: Stage, papers: Dict[str, Paper]) -> Dict[str, Paper]:
+    """
+    Run a single stage over a set of papers on a fresh event loop.
+
+    Used by the modules' standalone run() entry points. Stage dependencies are
+    ignored; the stage's select() still decides which papers it processes.
+
+    Args:
+        stage: Stage definition
+        papers: Dictionary of paper_id -> Paper objects
+
+    Returns:
+        The same dictionary, with papers updated in place
+    """
+    executor = StreamingExecutor([replace(stage, depends_on=())])
+
+    async def run() -> Dict[str, Paper]:
+        try:
+            return await executor.run(papers)
+        finally:
+            # The loop ends with this call, so its HTTP client must not outlive it
+            await http_client.aclose()
+
+    return asyncio.run(run())
@@ -0,0 +1,416 @@
+"""
+HTTP Client
+
+This module is the single choke point for outbound HTTP traffic. Modules issue
+requests through aget() and apost() from the event loop (get() and post() for
+the few synchronous callers), and hand async_client() to the OpenAI SDK, instead
+of creating their own clients. All traffic therefore shares one keep-alive
+connection pool per event loop (HTTP/2 where the server and the optional h2
+package allow it), one timeout and connect-retry policy set in the HTTP_CLIENT
+config section, and per-host request metrics in the run report.
+
+Traffic can be recorded to disk with --record and served back offline with
+--replay. Replayed runs see the same responses in the same order, which makes
+performance work on the stages measurable on identical inputs. configure() also
+accepts a transport to inject, so tests and benchmarks can point every module
+at local fakes without touching the network.
+
+Every response is also reported to the rate limiter, so Retry-After and
+rate-limit headers pause the host for all callers (see rate_limiter.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Union
+
+import httpx
+
+import config
+import rate_limiter
+from run_report import recorder
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger('HTTP_CLIENT')
+
+# Response headers that describe the wire encoding rather than the body we store
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie', 'connection'}
+
+# Connection pool limits shared by every request on a client
+_LIMITS = httpx.Limits(
+    max_connections=config.HTTP_CLIENT['max_connections'],
+    max_keepalive_connections=config.HTTP_CLIENT['max_keepalive_connections'],
+    keepalive_expiry=config.HTTP_CLIENT['keepalive_expiry']
+)
+
+# Default timeout for requests that do not pass their own
+_DEFAULT_TIMEOUT = httpx.Timeout(config.HTTP_CLIENT['timeout'], connect=config.HTTP_CLIENT['connect_timeout'])
+
+# Negotiate HTTP/2 only when it is wanted and the h2 package is installed
+_HTTP2 = config.HTTP_CLIENT['http2'] and _HTTP2_AVAILABLE
+
+
+class ReplayMissError(httpx.ConnectError):
+    """Raised when a replayed run issues a request that was never recorded."""
+
+
+class ExchangeStore:
+    """
+    Directory of recorded request/response exchanges.
+
+    Each distinct request (method, URL and body) is stored under a hash key as a
+    JSON metadata file plus one raw body file per response. Repeated identical
+    requests (retries, polling) are recorded in order and replayed in the same
+    order, with the last response repeated if the replayed run asks more often.
+    """
+
+    def __init__(self, directory: str, mode: str, latency: Union[None, str, float] = None):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory holding the recorded exchanges
+            mode: 'record' or 'replay'
+            latency: Replay latency: None for none, 'recorded' to reproduce the
+                recorded response times, or a fixed number of seconds
+        """
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._replay_positions: Dict[str, int] = {}
+        if mode == 'record':
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isdir(directory):
+            raise FileNotFoundError(f"Replay directory not found: {directory}")
+
+    @staticmethod
+    def key(method: str, url: str, body: Optional[bytes]) -> str:
+        """Return the storage key of a request."""
+        digest = hashlib.sha256()
+        digest.update(method.upper().encode())
+        digest.update(b'\n')
+        digest.update(url.encode())
+        digest.update(b'\n')
+        digest.update(body or b'')
+        return digest.hexdigest()[:32]
+
+    def record(self, method: str, url: str, body: Optional[bytes], status: int,
+               headers: Dict[str, str], content: bytes, elapsed: float) -> None:
+        """Append a response to the recorded exchanges of a request."""
+        key = self.key(method, url, body)
+        meta_path = os.path.join(self.directory, f"{key}.json")
+        headers = {name: value for name, value in headers.items() if name.lower() not in _DROPPED_HEADERS}
+
+        with self._lock:
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            else:
+                meta = {'method': method.upper(), 'url': url, 'responses': []}
+
+            index = len(meta['responses'])
+            with open(os.path.join(self.directory, f"{key}-{index}.body"), 'wb') as f:
+                f.write(content)
+            meta['responses'].append({'status': status, 'headers': headers, 'elapsed': round(elapsed, 4)})
+
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f, indent=2)
+
+    def replay(self, method: str, url: str, body: Optional[bytes]) -> Optional[dict]:
+        """
+        Return the next recorded response of a request.
+
+        The caller waits out the returned delay, so the same store serves both
+        blocking and event-loop clients.
+
+        Returns:
+            Dictionary with status, headers, content and delay (seconds of replay
+            latency), or None if never recorded
+        """
+        key = self.key(method, url, body)
+        meta_path = os.path.join(self.directory, f"{key}.json")
+
+        with self._lock:
+            if not os.path.exists(meta_path):
+                return None
+            with open(meta_path) as f:
+                meta = json.load(f)
+            position = self._replay_positions.get(key, 0)
+            self._replay_positions[key] = position + 1
+            index = min(position, len(meta['responses']) - 1)
+            response = meta['responses'][index]
+            with open(os.path.join(self.directory, f"{key}-{index}.body"), 'rb') as f:
+                content = f.read()
+
+        if self.latency == 'recorded':
+            delay = response['elapsed']
+        else:
+            delay = float(self.latency or 0)
+
+        return {'status': response['status'], 'headers': response['headers'], 'content': content, 'delay': delay}
+
+
+def _replayed_response(request: httpx.Request, recorded: Optional[dict]) -> httpx.Response:
+    """Build a response from a recorded exchange, or raise if there is none."""
+    if recorded is None:
+        raise ReplayMissError(f"No recorded response for {request.method} {request.url}", request=request)
+    return httpx.Response(recorded['status'], headers=recorded['headers'],
+                          content=recorded['content'], request=request)
+
+
+def _recorded_response(request: httpx.Request, response: httpx.Response, content: bytes) -> httpx.Response:
+    """Rebuild a live response from its fully read body, as the store recorded it."""
+    headers = {name: value for name, value in response.headers.items() if name.lower() not in _DROPPED_HEADERS}
+    return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+
+class _RecordReplayTransport(httpx.BaseTransport):
+    """Blocking httpx transport that records or replays exchanges through a store."""
+
+    def __init__(self, store: ExchangeStore, inner: httpx.BaseTransport):
+        self.store = store
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        url = str(request.url)
+
+        if self.store.mode == 'replay':
+            recorded = self.store.replay(request.method, url, body)
+            if recorded is not None and recorded['delay'] > 0:
+                time.sleep(recorded['delay'])
+            return _replayed_response(request, recorded)
+
+        started = time.monotonic()
+        response = self._inner.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        self.store.record(request.method, url, body, response.status_code,
+                          dict(response.headers), content, time.monotonic() - started)
+        return _recorded_response(request, response, content)
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class _AsyncRecordReplayTransport(httpx.AsyncBaseTransport):
+    """Event-loop httpx transport that records or replays exchanges through a store."""
+
+    def __init__(self, store: ExchangeStore, inner: httpx.AsyncBaseTransport):
+        self.store = store
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        url = str(request.url)
+
+        if self.store.mode == 'replay':
+            # The store does blocking file I/O; keep it off the event loop
+            recorded = await asyncio.to_thread(self.store.replay, request.method, url, body)
+            if recorded is not None and recorded['delay'] > 0:
+                await asyncio.sleep(recorded['delay'])
+            return _replayed_response(request, recorded)
+
+        started = time.monotonic()
+        response = await self._inner.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        await asyncio.to_thread(self.store.record, request.method, url, body, response.status_code,
+                                dict(response.headers), content, time.monotonic() - started)
+        return _recorded_response(request, response, content)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _host(request: httpx.Request) -> str:
+    """Host (with a non-default port) a request is sent to, as used for metrics."""
+    return request.url.netloc.decode('ascii')
+
+
+class _MeteredTransport(httpx.BaseTransport):
+    """Blocking transport wrapper recording per-host request metrics in the run report."""
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        try:
+            response = self._inner.handle_request(request)
+        except httpx.TransportError as e:
+            recorder.record_http_request(_host(request), None, time.monotonic() - started, error=type(e).__name__)
+            raise
+        recorder.record_http_request(_host(request), response.status_code, time.monotonic() - started,
+                                     http_version=response.extensions.get('http_version', b'').decode('ascii') or None)
+        return response
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class _AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    """Event-loop transport wrapper recording per-host request metrics in the run report."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except httpx.TransportError as e:
+            recorder.record_http_request(_host(request), None, time.monotonic() - started, error=type(e).__name__)
+            raise
+        recorder.record_http_request(_host(request), response.status_code, time.monotonic() - started,
+                                     http_version=response.extensions.get('http_version', b'').decode('ascii') or None)
+        return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _observe_response(response: httpx.Response) -> None:
+    """Response hook of the blocking client: let the rate limiter see the response headers."""
+    rate_limiter.observe(response)
+
+
+async def _async_observe_response(response: httpx.Response) -> None:
+    """Response hook of the async client: let the rate limiter see the response headers."""
+    rate_limiter.observe(response)
+
+
+# Process-wide HTTP state, set up once by configure()
+_store: Optional[ExchangeStore] = None
+_transport: Union[None, httpx.BaseTransport, httpx.AsyncBaseTransport] = None
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+# One async client per event loop: connections cannot be shared across loops
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def configure(record_dir: Optional[str] = None, replay_dir: Optional[str] = None,
+              replay_latency: Union[None, str, float] = None,
+              transport: Union[None, httpx.BaseTransport, httpx.AsyncBaseTransport] = None) -> None:
+    """
+    Select live, record or replay mode for all outbound HTTP traffic.
+
+    Must be called before the first request is made.
+
+    Args:
+        record_dir: Directory to record exchanges into
+        replay_dir: Directory to replay exchanges from
+        replay_latency: Replay latency (None, 'recorded' or seconds)
+        transport: Transport to send requests through instead of the network,
+            e.g. an httpx.MockTransport answering from local fakes. It must
+            implement the blocking and/or async interface of the clients used.
+    """
+    global _store, _transport, _client, _async_client, _async_client_loop
+    if record_dir and replay_dir:
+        raise ValueError("Cannot record and replay at the same time")
+
+    with _client_lock:
+        _transport = transport
+        if record_dir:
+            _store = ExchangeStore(record_dir, 'record')
+            logger.info(f"Recording HTTP traffic to {record_dir}")
+        elif replay_dir:
+            _store = ExchangeStore(replay_dir, 'replay', replay_latency)
+            logger.info(f"Replaying HTTP traffic from {replay_dir} (latency: {replay_latency or 'none'})")
+        else:
+            _store = None
+        _client = None
+        _async_client = None
+        _async_client_loop = None
+
+
+def client() -> httpx.Client:
+    """Return the shared blocking client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            transport = _transport or httpx.HTTPTransport(limits=_LIMITS, http2=_HTTP2,
+                                                          retries=config.HTTP_CLIENT['connect_retries'])
+            if _store is not None:
+                transport = _RecordReplayTransport(_store, transport)
+            _client = httpx.Client(transport=_MeteredTransport(transport), timeout=_DEFAULT_TIMEOUT,
+                                   follow_redirects=True, event_hooks={'response': [_observe_response]})
+        return _client
+
+
+def async_client() -> httpx.AsyncClient:
+    """
+    Return the async client of the running event loop, creating it on first use.
+
+    Also handed to the OpenAI SDK, so embedding requests share the pool and are
+    recorded or replayed like every other request.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        transport = _transport or httpx.AsyncHTTPTransport(limits=_LIMITS, http2=_HTTP2,
+                                                           retries=config.HTTP_CLIENT['connect_retries'])
+        if _store is not None:
+            transport = _AsyncRecordReplayTransport(_store, transport)
+        _async_client = httpx.AsyncClient(transport=_AsyncMeteredTransport(transport), timeout=_DEFAULT_TIMEOUT,
+                                          follow_redirects=True, event_hooks={'response': [_async_observe_response]})
+        logger.debug(f"Created async HTTP client (HTTP/2 {'enabled' if _HTTP2 else 'disabled'})")
+        _async_client_loop = loop
+    return _async_client
+
+
+async def aclose() -> None:
+    """Close the async client of the running event loop, if one was created."""
+    global _async_client, _async_client_loop
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
+
+
+def _request_options(kwargs: dict) -> dict:
+    """
+    Apply the shared timeout policy to per-request arguments.
+
+    A plain number of seconds bounds the whole request as before, but never
+    lets connecting take longer than the configured connect timeout.
+    """
+    timeout = kwargs.get('timeout')
+    if isinstance(timeout, (int, float)):
+        kwargs['timeout'] = httpx.Timeout(timeout, connect=min(timeout, config.HTTP_CLIENT['connect_timeout']))
+    return kwargs
+
+
+def get(url: str, **kwargs) -> httpx.Response:
+    """Send a blocking GET request through the shared client (same arguments as httpx.get)."""
+    return client().get(url, **_request_options(kwargs))
+
+
+def post(url: str, **kwargs) -> httpx.Response:
+    """Send a blocking POST request through the shared client (same arguments as httpx.post)."""
+    return client().post(url, **_request_options(kwargs))
+
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    """Send a GET request from the event loop (same arguments as httpx.AsyncClient.get)."""
+    return await async_client().get(url, **_request_options(kwargs))
+
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    """Send a POST request from the event loop (same arguments as httpx.AsyncClient.post)."""
+    return await async_client().post(url, **_request_options(kwargs))
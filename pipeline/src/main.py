@@ -8,13 +8,21 @@ in the SQLite database.
 """
 
 import argparse
+import asyncio
 import logging
 import os
+import signal
 import sys
-from datetime import datetime
-from typing import Dict
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 from paper import Paper
-from database import PaperDatabase
+from database import PaperDatabase, compile_predicate
+from run_report import recorder
+from budget import budget
+from tracing import tracer
+import metrics
 from dotenv import load_dotenv
 
 
@@ -22,10 +30,13 @@ def setup_logging() -> None:
     """
     Configure the centralized logging system.
     
-    This function sets up logging to both file and console with a consistent
-    format throughout the entire application. Each module will automatically
-    tap into this configuration.
+    This function sets up logging to both file and console throughout the
+    entire application. Each module will automatically tap into this
+    configuration. Records are written by a background thread (see
+    structured_logging.py); the daily log file holds one JSON object per line.
     """
+    from structured_logging import configure_logging
+    
     # Create logs directory if it doesn't exist (force to pipeline root)
     pipeline_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     log_dir = os.path.join(pipeline_root, 'logs')
@@ -34,20 +45,7 @@ def setup_logging() -> None:
     # Generate log filename based on current date
     log_filename = os.path.join(log_dir, f"{datetime.now().strftime('%Y%m%d')}.log")
     
-    # Configure logging format
-    log_format = '%(asctime)s,%(msecs)03d [%(name)s] [%(levelname)s] %(message)s'
-    date_format = '%Y-%m-%d %H:%M:%S'
-    
-    # Set up logging configuration
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        datefmt=date_format,
-        handlers=[
-            logging.FileHandler(log_filename),
-            logging.StreamHandler()  # Also log to console
-        ]
-    )
+    configure_logging(log_filename)
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -57,8 +55,19 @@ def parse_arguments() -> argparse.Namespace:
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  %(prog)s --date 2025-01-15        Process papers from January 15, 2025
-  %(prog)s --test papers.txt        Process papers listed in papers.txt
+  %(prog)s --date 2025-01-15                        Process papers from January 15, 2025
+  %(prog)s --date-range 2025-01-01:2025-01-31       Backfill every date in January 2025
+  %(prog)s --test papers.txt                        Process papers listed in papers.txt
+  %(prog)s --daemon                                 Keep polling arXiv and process new papers as they appear
+  %(prog)s --test papers.txt --record traffic/      Process papers and record all HTTP traffic
+  %(prog)s --test papers.txt --replay traffic/      Rerun offline against the recorded traffic
+  %(prog)s --reprocess llm_scoring --published 2025-01-01:2025-01-31
+                                                    Re-score stored papers published in January 2025
+  %(prog)s --date 2025-01-15 --distribute           Scrape, then leave the stages to --worker processes
+  %(prog)s --worker --stages intro_extractor        Claim and process queued papers for the given stages
+  %(prog)s --serve-queue                            Serve the work queue to workers on other hosts
+  %(prog)s --worker --queue-url http://db-host:8765 Work from another host through the queue service
+  %(prog)s --profile-startup                        Report import and initialization times, then exit
         """
     )
     
@@ -69,11 +78,117 @@ Examples:
         type=str,
         help='Process papers from specific date (YYYY-MM-DD format)'
     )
+    mode_group.add_argument(
+        '--date-range',
+        type=str,
+        help='Process papers from every date in an inclusive range (YYYY-MM-DD:YYYY-MM-DD format)'
+    )
     mode_group.add_argument(
         '--test',
         type=str,
         help='Process papers from test file (one arXiv ID per line)'
     )
+    mode_group.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Run continuously: poll the most recent arXiv dates and publish results to the serving database'
+    )
+    mode_group.add_argument(
+        '--reprocess',
+        type=str,
+        metavar='STAGES',
+        help='Reset the given stages (comma-separated) of papers already in the database and run them '
+             'again, without scraping'
+    )
+    mode_group.add_argument(
+        '--worker',
+        action='store_true',
+        help='Run continuously as a worker: claim queued papers from the shared work table and process them'
+    )
+    mode_group.add_argument(
+        '--serve-queue',
+        action='store_true',
+        help='Run continuously on the database host, serving the shared work table to --worker processes '
+             'on other hosts (see --queue-url)'
+    )
+    mode_group.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='Measure the import and initialization time of a cold start, then exit without processing papers'
+    )
+    
+    parser.add_argument(
+        '--date-parallelism',
+        type=int,
+        default=None,
+        help='Number of dates processed concurrently with --date-range (default from config.BACKFILL)'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=None,
+        help='Seconds between polls with --daemon (default from config.DAEMON)'
+    )
+    
+    # Scale-out over several processes sharing the work table
+    parser.add_argument(
+        '--distribute',
+        action='store_true',
+        help='Queue the scraped papers for --worker processes instead of processing them in this process, '
+             'then wait until they are finished'
+    )
+    parser.add_argument(
+        '--stages',
+        type=str,
+        default=None,
+        help='Comma-separated stages this --worker runs (default: all)'
+    )
+    parser.add_argument(
+        '--queue-url',
+        type=str,
+        default=None,
+        metavar='URL',
+        help='Reach the work table through the --serve-queue service at URL instead of the database file, '
+             'for a --worker on a host other than the database\'s'
+    )
+    
+    # Selection of the stored papers to reprocess
+    parser.add_argument(
+        '--published',
+        type=str,
+        metavar='START:END',
+        help='Reprocess papers published in this inclusive date range (YYYY-MM-DD:YYYY-MM-DD), with --reprocess'
+    )
+    parser.add_argument(
+        '--where',
+        type=str,
+        metavar='PREDICATE',
+        help='Reprocess only papers matching this condition on papers columns, with --reprocess '
+             '(e.g. "llm_score_status = \'failed\'"; comparisons, LIKE, IN and IS NULL joined by AND/OR/NOT)'
+    )
+    
+    # Record/replay of all outbound HTTP traffic, for reproducible offline profiling
+    traffic_group = parser.add_mutually_exclusive_group()
+    traffic_group.add_argument(
+        '--record',
+        type=str,
+        metavar='DIR',
+        help='Record every HTTP request/response pair to DIR'
+    )
+    traffic_group.add_argument(
+        '--replay',
+        type=str,
+        metavar='DIR',
+        help='Serve HTTP responses recorded in DIR instead of calling live services'
+    )
+    parser.add_argument(
+        '--replay-latency',
+        type=str,
+        default=None,
+        metavar='SECONDS|recorded',
+        help='Latency added to each replayed response: a fixed number of seconds, or "recorded" '
+             'to reproduce the recorded response times (default: none)'
+    )
     
     return parser.parse_args()
 
@@ -86,21 +201,109 @@ def validate_arguments(args: argparse.Namespace) -> None:
         except ValueError:
             raise ValueError(f"Invalid date format: {args.date}. Expected YYYY-MM-DD")
     
+    if args.date_range:
+        parse_date_range(args.date_range)
+    
+    if args.date_parallelism is not None and args.date_parallelism < 1:
+        raise ValueError(f"Invalid date parallelism: {args.date_parallelism}. Expected a positive integer")
+    
     if args.test:
         if not os.path.exists(args.test):
             raise FileNotFoundError(f"Test file not found: {args.test}")
+    
+    if args.poll_interval is not None:
+        if not args.daemon:
+            raise ValueError("--poll-interval requires --daemon")
+        if args.poll_interval <= 0:
+            raise ValueError(f"Invalid poll interval: {args.poll_interval}. Expected a positive number of seconds")
+    
+    if args.reprocess:
+        parse_stage_list(args.reprocess)
+        if not args.published:
+            raise ValueError("--reprocess requires --published")
+        parse_date_range(args.published)
+        if args.where:
+            compile_predicate(args.where)
+    elif args.published or args.where:
+        raise ValueError("--published and --where require --reprocess")
+    
+    if args.distribute and not (args.date or args.date_range or args.test):
+        raise ValueError("--distribute requires --date, --date-range or --test")
+    
+    if args.stages is not None:
+        if not args.worker:
+            raise ValueError("--stages requires --worker")
+        parse_stage_list(args.stages)
+    
+    if args.queue_url is not None and not args.worker:
+        raise ValueError("--queue-url requires --worker")
+    
+    if args.replay_latency is not None:
+        if not args.replay:
+            raise ValueError("--replay-latency requires --replay")
+        if args.replay_latency != 'recorded':
+            try:
+                float(args.replay_latency)
+            except ValueError:
+                raise ValueError(f"Invalid replay latency: {args.replay_latency}. Expected seconds or 'recorded'")
+    
+    if args.replay and not os.path.isdir(args.replay):
+        raise FileNotFoundError(f"Replay directory not found: {args.replay}")
 
 
-def save_to_database(runtime_paper_dict: Dict[str, Paper]) -> None:
+def parse_date_range(date_range: str) -> List[str]:
+    """
+    Expand a START:END date range into the list of dates it covers.
+    
+    Args:
+        date_range: Inclusive range in YYYY-MM-DD:YYYY-MM-DD format
+        
+    Returns:
+        List of dates in YYYY-MM-DD format, oldest first
+    """
+    try:
+        start_str, end_str = date_range.split(':')
+        start = datetime.strptime(start_str, '%Y-%m-%d')
+        end = datetime.strptime(end_str, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date range: {date_range}. Expected YYYY-MM-DD:YYYY-MM-DD")
+    
+    if end < start:
+        raise ValueError(f"Invalid date range: {date_range}. End date is before start date")
+    
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+
+
+def parse_stage_list(stage_list: str) -> List[str]:
+    """
+    Parse a comma-separated list of processing stage names.
+    
+    Args:
+        stage_list: Stage names, e.g. 'llm_validation,llm_scoring'
+        
+    Returns:
+        List of distinct stage names, in the order given
+    """
+    from paper import STAGE_FIELDS
+    names = list(dict.fromkeys(name.strip() for name in stage_list.split(',') if name.strip()))
+    unknown = [name for name in names if name not in STAGE_FIELDS]
+    if not names or unknown:
+        raise ValueError(f"Invalid stages: {stage_list}. Expected a comma-separated list of: "
+                         f"{', '.join(STAGE_FIELDS)}")
+    return names
+
+
+def save_to_database(runtime_paper_dict: Dict[str, Paper], db: PaperDatabase) -> None:
     """
     Save the current state of all papers to the database.
 
-    This function performs an INSERT OR UPDATE operation for every paper
-    in the runtime dictionary, ensuring the database always reflects the
-    latest state of processing.
+    Only papers with changes since the last save are written, and only their
+    changed columns, ensuring the database always reflects the latest state of
+    processing without rewriting unchanged rows.
 
     Args:
         runtime_paper_dict: Dictionary of paper_id -> Paper objects
+        db: Shared database handle of the run
     """
     logger = logging.getLogger('MAIN')
 
@@ -108,9 +311,706 @@ def save_to_database(runtime_paper_dict: Dict[str, Paper]) -> None:
         logger.info("No papers to save to database")
         return
 
+    with recorder.stage('database_save'):
+        db.save_papers(runtime_paper_dict)
+    logger.info(f"Saved {len(runtime_paper_dict)} runtime papers to database")
+
+
+def build_processing_stages() -> list:
+    """
+    Build the processing stages shared by every shard of a run.
+    
+    Module singletons (HTTP clients, tokenizer, topic embeddings) are created
+    once here, so concurrent date shards reuse them instead of each loading their own.
+    The stages take papers in the order set by the SCHEDULING policy.
+    
+    Returns:
+        List of Stage definitions for the streaming executor
+    """
+    import config
+    import scheduling
+    from modules import intro_extractor, embedding_similarity, llm_validation, llm_scoring, h_index_fetching
+    stages = [
+        intro_extractor.build_stage(config.LATEX_EXTRACTION),
+        embedding_similarity.build_stage(config.EMBEDDING),
+        llm_validation.build_stage(config.LLM_VALIDATION),
+        llm_scoring.build_stage(config.LLM_SCORING),
+        h_index_fetching.build_stage(config.H_INDEX_FETCHING)
+    ]
+    return scheduling.apply_policy(stages, config.SCHEDULING)
+
+
+async def run_shard(run_mode: str, run_value: str, executor, db: PaperDatabase,
+                    work_queue=None) -> Dict[str, Paper]:
+    """
+    Scrape one shard (a date or a test file) and stream its papers through the stages.
+    
+    Args:
+        run_mode: 'date' or 'test'
+        run_value: Date string (YYYY-MM-DD) or test file path
+        executor: Running StreamingExecutor shared by all shards
+        db: Shared database handle
+        work_queue: WorkQueue to hand the papers to --worker processes instead
+            of the executor (None to process them here)
+        
+    Returns:
+        Dictionary of paper_id -> Paper objects for this shard
+    """
+    logger = logging.getLogger('MAIN')
+    
+    # Step 1: Scrape papers and save them to the database
+    logger.info(f"Executing scraper module for {run_mode} {run_value}")
+    with recorder.stage('scraper'):
+        if run_mode == 'date':
+            from modules import scraper
+            runtime_paper_dict = await scraper.run_async(run_mode, run_value, db)
+        else:
+            from modules import test_scraper
+            runtime_paper_dict = await test_scraper.run_async(run_mode, run_value, db)
+    await asyncio.to_thread(save_to_database, runtime_paper_dict, db)
+    
+    if work_queue is not None:
+        # Steps 2-6 run on the workers; wait for them, then read back their results
+        import config
+        batch = f"{recorder.run_id}:{run_value}"
+        await asyncio.to_thread(work_queue.enqueue, list(runtime_paper_dict), batch)
+        while True:
+            remaining = await asyncio.to_thread(work_queue.remaining, batch)
+            if not remaining:
+                break
+            logger.info(f"Waiting for workers on {run_mode} {run_value}: "
+                        f"{', '.join(f'{count} papers in {stage}' for stage, count in remaining.items())}")
+            await asyncio.sleep(config.WORK_QUEUE['wait_interval'])
+        return await asyncio.to_thread(db.load_papers, list(runtime_paper_dict))
+    
+    # Steps 2-6: Stream papers through the processing stages
+    # Each paper moves on to the next stage as soon as it is done with the
+    # previous one, instead of waiting for the whole batch at every stage.
+    logger.info(f"Executing processing stages for {len(runtime_paper_dict)} papers from {run_mode} {run_value}")
+    group = await executor.submit_group(runtime_paper_dict)
+    await group.wait()
+    await asyncio.to_thread(save_to_database, runtime_paper_dict, db)
+    
+    return runtime_paper_dict
+
+
+async def drain_retries(executor, db: PaperDatabase, papers: Dict[str, Paper]) -> None:
+    """
+    Run the deferred retries that fall due before the run ends through the stages again.
+    
+    Papers a stage deferred to the retry queue (see retry_queue.py), in this
+    run or an earlier one, are submitted to the executor again once due. The
+    drain goes on while the next retry is due within RETRY_QUEUE['drain_wait']
+    seconds; retries due later are left queued for the next run.
+    
+    Args:
+        executor: Running StreamingExecutor with the full stage graph
+        db: Shared database handle
+        papers: Papers of this run by ID (other papers are loaded from the database)
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    from retry_queue import retry_queue
+    
+    while True:
+        next_due = await asyncio.to_thread(retry_queue.next_due)
+        if next_due is None:
+            return
+        wait = next_due - time.time()
+        if wait > config.RETRY_QUEUE['drain_wait']:
+            pending = await asyncio.to_thread(retry_queue.pending)
+            logger.info(f"Leaving {pending} deferred retries for the next run (next due in {wait:.0f}s)")
+            return
+        if wait > 0:
+            logger.info(f"Waiting {wait:.1f}s for the next deferred retry")
+            await asyncio.sleep(wait)
+        
+        paper_ids = await asyncio.to_thread(retry_queue.claim_due)
+        retries = {paper_id: papers[paper_id] for paper_id in paper_ids if paper_id in papers}
+        missing = [paper_id for paper_id in paper_ids if paper_id not in papers]
+        if missing:
+            retries.update(await asyncio.to_thread(db.load_papers, missing))
+        logger.info(f"Retrying {len(retries)} deferred papers")
+        group = await executor.submit_group(retries)
+        await group.wait()
+        await asyncio.to_thread(save_to_database, retries, db)
+        await asyncio.to_thread(retry_queue.settle, paper_ids)
+
+
+async def run_shards(shards: List[Tuple[str, str]], parallelism: int, db: PaperDatabase,
+                     stages: Optional[list] = None, distribute: bool = False) -> Dict[str, Optional[Dict[str, Paper]]]:
+    """
+    Run several shards concurrently through one shared set of processing stages.
+    
+    Everything network-bound runs as coroutines on this event loop. If the run
+    is interrupted, every in-flight request is cancelled and the papers finished
+    so far are still checkpointed. Once every shard is done, deferred retries
+    that fall due soon are drained (see drain_retries).
+    
+    Args:
+        shards: List of (run_mode, run_value) pairs
+        parallelism: Maximum number of shards in flight at once
+        db: Shared database handle
+        stages: Processing stages to reuse (built here if not given)
+        distribute: Queue the papers for --worker processes instead of processing them here
+        
+    Returns:
+        Dictionary of run_value -> papers dictionary, or None if that shard failed
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    import http_client
+    from database import CheckpointWriter
+    from executor import StreamingExecutor, prepare_stages
+    from work_queue import WorkQueue
+    
+    if stages is None:
+        logger.info("Building processing stages: introduction extractor, embedding similarity, "
+                    "LLM validation, LLM scoring, H-index fetching")
+        stages = build_processing_stages()
+    # Load what every batch needs (topic embeddings) up front; a failure stops the run here
+    await prepare_stages(stages)
+    
+    # Every paper a stage finishes is committed in the background right away, so a
+    # crash mid-stage loses no paid-for results and a rerun resumes the unfinished papers.
+    checkpoint_writer = CheckpointWriter(db, config.CHECKPOINT['flush_interval'], config.CHECKPOINT['max_batch'])
+    checkpoint_writer.start()
+    
+    work_queue = None
+    if distribute:
+        work_queue = WorkQueue(db.db_path, config.WORK_QUEUE, {stage.name: stage.depends_on for stage in stages})
+    # Papers that have left every stage are saved and stripped of their heavy text
+    # fields, which are read back from the database only if something needs them
+    on_paper_finished = checkpoint_writer.release if config.CHECKPOINT['release_heavy_fields'] else None
+    executor = StreamingExecutor(stages, on_paper_done=checkpoint_writer.enqueue, on_paper_finished=on_paper_finished)
+    executor.start()
+    
+    shard_slots = asyncio.Semaphore(parallelism)
+    
+    async def run_bounded(run_mode: str, run_value: str) -> Dict[str, Paper]:
+        async with shard_slots:
+            return await run_shard(run_mode, run_value, executor, db, work_queue)
+    
+    results = {}
+    try:
+        tasks = {run_value: asyncio.create_task(run_bounded(run_mode, run_value), name=f"shard-{run_value}")
+                 for run_mode, run_value in shards}
+        try:
+            for run_value, task in tasks.items():
+                try:
+                    results[run_value] = await task
+                except Exception as e:
+                    if len(shards) == 1:
+                        raise
+                    logger.error(f"Processing {run_value} failed: {e}")
+                    results[run_value] = None
+            if not distribute:
+                run_papers = {paper_id: paper for papers in results.values() if papers
+                              for paper_id, paper in papers.items()}
+                await drain_retries(executor, db, run_papers)
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            executor.cancel()
+            raise
+        await executor.finish()
+    finally:
+        try:
+            await http_client.aclose()
+        finally:
+            checkpoint_writer.close()
+    
+    return results
+
+
+def log_summary(results: Dict[str, Optional[Dict[str, Paper]]]) -> None:
+    """
+    Log the final summary, with one line of counts per shard when there are several.
+    
+    Args:
+        results: Dictionary of run_value -> papers dictionary (None for failed shards)
+    """
+    logger = logging.getLogger('MAIN')
+    
+    def stage_counts(papers: Dict[str, Paper]) -> Dict[str, int]:
+        values = papers.values()
+        return {
+            'total': len(papers),
+            'scraped': sum(1 for p in values if p.is_successfully_scraped()),
+            'scrape_failed': sum(1 for p in values if p.has_scraping_failed()),
+            'intro': sum(1 for p in values if p.is_intro_successful()),
+            'intro_failed': sum(1 for p in values if p.intro_status not in ["not_extracted", "intro_successful"]),
+            'embedding': sum(1 for p in values if p.is_embedding_completed()),
+            'embedding_failed': sum(1 for p in values if p.embedding_status == "failed"),
+            'validation': sum(1 for p in values if p.is_llm_validation_completed()),
+            'validation_failed': sum(1 for p in values if p.llm_validation_status == "failed"),
+            'scoring': sum(1 for p in values if p.is_llm_score_completed()),
+            'scoring_failed': sum(1 for p in values if p.llm_score_status == "failed"),
+            'h_index': sum(1 for p in values if p.is_h_index_completed()),
+            'h_index_failed': sum(1 for p in values if p.h_index_status == "failed"),
+        }
+    
+    all_papers = {}
+    for papers in results.values():
+        if papers:
+            all_papers.update(papers)
+    counts = stage_counts(all_papers)
+    
+    logger.info("=" * 80)
+    if any(papers is None for papers in results.values()):
+        logger.info("PIPELINE COMPLETED WITH FAILED DATES")
+    elif recorder.failed_papers():
+        logger.info(f"PIPELINE COMPLETED WITH {recorder.failed_papers()} PAPERS FAILED BY STAGE ERRORS")
+    else:
+        logger.info("PIPELINE COMPLETED SUCCESSFULLY")
+    logger.info("=" * 80)
+    logger.info(f"Total papers processed: {counts['total']}")
+    logger.info(f"  Scraping: {counts['scraped']} successful, {counts['scrape_failed']} failed")
+    logger.info(f"  Introduction extraction: {counts['intro']} successful, {counts['intro_failed']} failed/skipped")
+    logger.info(f"  Embedding similarity: {counts['embedding']} successful, {counts['embedding_failed']} failed")
+    logger.info(f"  LLM validation: {counts['validation']} successful, {counts['validation_failed']} failed")
+    logger.info(f"  LLM scoring: {counts['scoring']} successful, {counts['scoring_failed']} failed")
+    logger.info(f"  H-index fetching: {counts['h_index']} successful, {counts['h_index_failed']} failed")
+    
+    if len(results) > 1:
+        logger.info("Per-date results (papers / intro / embedding / validation / scoring / h-index):")
+        for run_value, papers in results.items():
+            if papers is None:
+                logger.info(f"  {run_value}: FAILED")
+                continue
+            c = stage_counts(papers)
+            logger.info(f"  {run_value}: {c['total']} / {c['intro']} / {c['embedding']} / "
+                        f"{c['validation']} / {c['scoring']} / {c['h_index']}")
+    
+    logger.info(f"Data saved to: database.sqlite")
+    logger.info("=" * 80)
+
+
+def cleanup_database(runtime_paper_dict: Dict[str, Paper], db: PaperDatabase) -> None:
+    """
+    Run the database cleanup module, logging rather than raising on failure,
+    then checkpoint the database's write-ahead log.
+    
+    Args:
+        runtime_paper_dict: Dictionary of paper_id -> Paper objects from this run
+        db: Shared database handle
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    
+    logger.info("Executing database cleanup module")
+    try:
+        from modules import database_cleanup
+        with recorder.stage('database_cleanup'):
+            runtime_paper_dict = database_cleanup.run(runtime_paper_dict, config.DATABASE_CLEANUP)
+        save_to_database(runtime_paper_dict, db)
+    except Exception as e:
+        logger.warning(f"Database cleanup failed: {e}")
+        logger.info("Pipeline will continue despite database cleanup failure")
+    db.checkpoint()
+
+
+def run_pipeline(args: argparse.Namespace, shards: List[Tuple[str, str]], parallelism: int) -> Dict[str, Optional[Dict[str, Paper]]]:
+    """
+    Run every pipeline step for the given shards.
+    
+    Args:
+        args: Parsed command-line arguments
+        shards: List of (run_mode, run_value) pairs
+        parallelism: Maximum number of shards in flight at once
+        
+    Returns:
+        Dictionary of run_value -> papers dictionary, or None if that shard failed
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    
+    # Steps 1-6: Scrape and process every shard on shared stages and database handle
     db = PaperDatabase()
-    db.save_papers(runtime_paper_dict)
-    logger.info(f"Saved {len(runtime_paper_dict)} papers to database")
+    results = asyncio.run(run_shards(shards, parallelism, db, distribute=args.distribute))
+    runtime_paper_dict = {}
+    for papers in results.values():
+        if papers:
+            runtime_paper_dict.update(papers)
+
+    # Step 7: Execute database cleanup module
+    cleanup_database(runtime_paper_dict, db)
+
+    # Step 8: Execute Slack notification module (one message per shard)
+    if args.date_range and not config.BACKFILL['slack_notifications']:
+        logger.info("Skipping Slack notification for date-range backfill")
+    else:
+        logger.info("Executing Slack notification module")
+        from modules import slack
+        for run_value, papers in results.items():
+            if papers is None:
+                continue
+            try:
+                with recorder.stage('slack'):
+                    slack.run(papers, {})
+                save_to_database(papers, db)
+            except Exception as e:
+                logger.warning(f"Slack notification failed for {run_value}: {e}")
+                logger.info("Pipeline will continue despite Slack notification failure")
+    
+    return results
+
+
+def start_run_report(run_mode: str, run_value: str, remote: bool = False) -> None:
+    """
+    Begin recording a run and its trace, and start its LLM budget from today's
+    earlier usage.
+    
+    Args:
+        run_mode: 'date', 'date_range', 'test', 'daemon', 'reprocess' or 'worker'
+        run_value: Date, date range, test file, polled date window, reprocessing selection or worker ID
+        remote: Whether this is a worker on another host than the database's, whose
+            LLM usage goes through the queue service (see budget.use_service)
+    """
+    import config
+    recorder.start_run(run_mode, run_value)
+    budget.start_run(None if remote else config.DATABASE_PATHS['main_database'], recorder.run_id)
+    tracer.start_run(recorder.run_id)
+
+
+def finish_run_report(results: Dict[str, Optional[Dict[str, Paper]]]) -> None:
+    """
+    Persist the timing report, LLM usage and trace of the run being recorded,
+    and update the last-run metrics.
+    
+    Args:
+        results: Dictionary of run_value -> papers dictionary (None for failed shards)
+    """
+    failed = not results or any(papers is None for papers in results.values()) or recorder.failed_papers() > 0
+    close_run_report('failed' if failed else 'completed',
+                     sum(len(papers) for papers in results.values() if papers))
+
+
+def close_run_report(status: str, paper_count: int, remote: bool = False) -> None:
+    """
+    Persist the timing report, LLM usage and trace of the run being recorded
+    with the given outcome, and update the last-run metrics.
+    
+    Args:
+        status: 'completed' or 'failed'
+        paper_count: Number of papers handled by the run
+        remote: Whether this is a worker on another host than the database's, whose
+            run history goes through the queue service (see recorder.use_service)
+    """
+    import config
+    budget.save()
+    recorder.record_budget(budget.summary())
+    report = recorder.finish_run(status, paper_count, config.RUN_REPORT['report_dir'],
+                                 None if remote else config.DATABASE_PATHS['main_database'])
+    metrics.record_run(report)
+    tracer.export(config.TRACING['trace_dir'])
+
+
+def recent_dates(lookback_days: int) -> List[str]:
+    """
+    Return the most recent arXiv submission dates (UTC), oldest first.
+    
+    Args:
+        lookback_days: Number of dates, including today
+        
+    Returns:
+        List of dates in YYYY-MM-DD format
+    """
+    today = datetime.now(timezone.utc).date()
+    return [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(lookback_days - 1, -1, -1)]
+
+
+async def run_poll(dates: List[str], parallelism: int, db: PaperDatabase, stages: list) -> Dict[str, Optional[Dict[str, Paper]]]:
+    """
+    Run one daemon poll: scrape and process the given dates, clean up and record the run.
+    
+    Args:
+        dates: Dates to query, in YYYY-MM-DD format
+        parallelism: Maximum number of dates in flight at once
+        db: Shared database handle
+        stages: Processing stages shared by every poll
+        
+    Returns:
+        Dictionary of date -> papers dictionary, or None if that date failed
+    """
+    start_run_report('daemon', f"{dates[0]}:{dates[-1]}")
+    results = {}
+    try:
+        results = await run_shards([('date', date) for date in dates], parallelism, db, stages)
+        runtime_paper_dict = {}
+        for papers in results.values():
+            if papers:
+                runtime_paper_dict.update(papers)
+        await asyncio.to_thread(cleanup_database, runtime_paper_dict, db)
+    finally:
+        await asyncio.to_thread(finish_run_report, results)
+    log_summary(results)
+    return results
+
+
+async def run_daemon(poll_interval: float, lookback_days: int, parallelism: int) -> None:
+    """
+    Poll the most recent arXiv dates until stopped by SIGINT or SIGTERM.
+    
+    Every poll re-queries the last lookback_days dates. Papers already processed
+    are cache hits and pass straight through the stages, so only newly announced
+    papers cost API calls. Each finished paper is committed to the serving
+    database as soon as a stage finishes it. Slack notifications are left to the
+    daily batch run.
+    
+    Args:
+        poll_interval: Seconds between the starts of consecutive polls
+        lookback_days: Number of most recent dates queried per poll
+        parallelism: Maximum number of dates in flight at once
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    
+    db = PaperDatabase(config.DATABASE_PATHS['main_database'])
+    # Built once, so clients, tokenizer and topic embeddings are shared by every poll
+    stages = build_processing_stages()
+    
+    metrics.serve(config.METRICS['address'], config.METRICS['port'])
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    poll_number = 0
+    while not stop.is_set():
+        poll_number += 1
+        dates = recent_dates(lookback_days)
+        started = time.monotonic()
+        logger.info(f"Poll {poll_number}: checking {', '.join(dates)}")
+        
+        poll = asyncio.create_task(run_poll(dates, parallelism, db, stages), name=f"poll-{poll_number}")
+        stopped = asyncio.create_task(stop.wait())
+        await asyncio.wait({poll, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+        if not poll.done():
+            # Finished papers are already checkpointed; the rest are picked up after a restart
+            logger.info(f"Stop requested, cancelling poll {poll_number}")
+            poll.cancel()
+        try:
+            await poll
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Poll {poll_number} failed: {e}")
+        
+        wait = poll_interval - (time.monotonic() - started)
+        if wait > 0 and not stop.is_set():
+            logger.info(f"Next poll in {wait:.0f}s")
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+    
+    logger.info("Daemon stopped")
+
+
+async def run_reprocess(stage_names: List[str], start_date: str, end_date: str,
+                        predicate: Optional[str], db: PaperDatabase) -> Dict[str, Dict[str, int]]:
+    """
+    Reset the chosen stages of stored papers and stream the papers through those stages again.
+    
+    Papers are selected from the database by publication date and predicate and
+    are never scraped again. They are read page by page: each page is reset and
+    submitted to the stages while the next one is read, and at most
+    REPROCESS['pages_in_flight'] pages are held at once, so a selection of any
+    size runs in bounded memory. Only the chosen stages run; dependencies
+    between them are kept. Finished papers are checkpointed as in a normal run.
+    
+    Args:
+        stage_names: Stages to reset and rerun
+        start_date: First publication date (YYYY-MM-DD), inclusive
+        end_date: Last publication date (YYYY-MM-DD), inclusive
+        predicate: Optional SQL condition on the papers table
+        db: Shared database handle
+        
+    Returns:
+        Dictionary of stage -> resulting status -> number of papers
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    import http_client
+    from collections import Counter, deque
+    from database import CheckpointWriter
+    from executor import StreamingExecutor, prepare_stages, select_stages
+    
+    stages = select_stages(build_processing_stages(), stage_names)
+    await prepare_stages(stages)
+    
+    checkpoint_writer = CheckpointWriter(db, config.CHECKPOINT['flush_interval'], config.CHECKPOINT['max_batch'])
+    checkpoint_writer.start()
+    on_paper_finished = checkpoint_writer.release if config.CHECKPOINT['release_heavy_fields'] else None
+    executor = StreamingExecutor(stages, on_paper_done=checkpoint_writer.enqueue, on_paper_finished=on_paper_finished)
+    executor.start()
+    
+    outcomes = {name: Counter() for name in stage_names}
+    in_flight = deque()
+    
+    async def settle_oldest_page() -> None:
+        papers, group = in_flight.popleft()
+        await group.wait()
+        await asyncio.to_thread(save_to_database, papers, db)
+        for paper in papers.values():
+            for name in stage_names:
+                outcomes[name][metrics.stage_status(name, paper)] += 1
+    
+    try:
+        try:
+            selected = 0
+            after_id = None
+            while True:
+                while len(in_flight) >= config.REPROCESS['pages_in_flight']:
+                    await settle_oldest_page()
+                page_ids = await asyncio.to_thread(db.select_paper_ids, start_date, end_date, predicate,
+                                                   after_id, config.REPROCESS['page_size'])
+                if not page_ids:
+                    break
+                after_id = page_ids[-1]
+                papers = await asyncio.to_thread(db.load_papers, page_ids)
+                for paper in papers.values():
+                    paper.reset_stages(stage_names)
+                selected += len(papers)
+                logger.info(f"Reprocessing {len(papers)} more papers ({selected} selected so far)")
+                in_flight.append((papers, await executor.submit_group(papers)))
+            while in_flight:
+                await settle_oldest_page()
+        except BaseException:
+            executor.cancel()
+            raise
+        await executor.finish()
+    finally:
+        try:
+            await http_client.aclose()
+        finally:
+            checkpoint_writer.close()
+    
+    return {name: dict(counts) for name, counts in outcomes.items()}
+
+
+async def run_worker(stage_names: Optional[List[str]], queue_url: Optional[str] = None) -> None:
+    """
+    Process papers from the shared work table until stopped by SIGINT or SIGTERM.
+    
+    Any number of workers can run at once; each claims papers per stage under an
+    expiring lease, writes the results to the papers table and queues the papers
+    for the next stages. Workers on the database host use the database file;
+    workers on other hosts go through the --serve-queue service at queue_url
+    (see queue_service.py). The worker's lifetime is recorded as a series of
+    runs of WORK_QUEUE['report_interval'] seconds each.
+    
+    Args:
+        stage_names: Stages this worker runs (None for all)
+        queue_url: URL of the queue service (None to use the database file)
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    import http_client
+    from executor import select_stages
+    from queue_service import QueueServiceClient, RemotePaperStore, RemoteWorkQueue, service_token
+    from retry_queue import retry_queue
+    from work_queue import WorkQueue, worker_id
+    from worker import Worker
+    
+    all_stages = build_processing_stages()
+    service = None
+    if queue_url:
+        service = QueueServiceClient(queue_url, service_token(), config.WORK_QUEUE['service_timeout'])
+        db = RemotePaperStore(service)
+        work_queue = RemoteWorkQueue(service)
+        # Retry counts, LLM usage and the run history go through the service too, so
+        # this host never opens (or creates) a database file of its own
+        retry_queue.use_service(service)
+        budget.use_service(service)
+        recorder.use_service(service)
+    else:
+        db = PaperDatabase(config.DATABASE_PATHS['main_database'])
+        # Completing a stage queues the next ones, so the queue needs the whole graph
+        work_queue = WorkQueue(db.db_path, config.WORK_QUEUE, {stage.name: stage.depends_on for stage in all_stages})
+    stages = select_stages(all_stages, stage_names) if stage_names else all_stages
+    owner = worker_id()
+    
+    try:
+        metrics.serve(config.METRICS['address'], config.METRICS['port'])
+    except OSError as e:
+        # Several workers on one host: the first one serves the port
+        logger.warning(f"Not serving metrics: {e}")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    remote = service is not None
+    worker = Worker(stages, work_queue, db, owner, config.WORK_QUEUE)
+    # Work items completed in the runs already closed
+    reported = 0
+    
+    async def rotate_run_reports() -> None:
+        """Close the worker's run and start the next one every report_interval seconds."""
+        nonlocal reported
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), config.WORK_QUEUE['report_interval'])
+                return
+            except asyncio.TimeoutError:
+                pass
+            finished = worker.completed
+            await asyncio.to_thread(close_run_report, 'failed' if recorder.failed_papers() else 'completed',
+                                    finished - reported, remote)
+            reported = finished
+            await asyncio.to_thread(start_run_report, 'worker', owner, remote)
+    
+    start_run_report('worker', owner, remote)
+    rotation = asyncio.create_task(rotate_run_reports(), name='run-report-rotation')
+    completed = 0
+    status = 'failed'
+    try:
+        completed = await worker.run(stop)
+        status = 'completed'
+    finally:
+        # Let a rotation in progress finish before the last run is closed
+        stop.set()
+        await asyncio.gather(rotation, return_exceptions=True)
+        try:
+            await http_client.aclose()
+        finally:
+            await asyncio.to_thread(close_run_report, status, worker.completed - reported, remote)
+            if service is not None:
+                service.close()
+    logger.info(f"Worker stopped after completing {completed} work items")
+
+
+def run_queue_service() -> None:
+    """
+    Serve the shared work table to --worker processes on other hosts until stopped by SIGINT or SIGTERM.
+    
+    Runs on the host that holds the database, so the file is never opened over
+    a network filesystem (see queue_service.py).
+    """
+    logger = logging.getLogger('MAIN')
+    import config
+    from queue_service import QueueService, serve, service_token
+    from work_queue import WorkQueue
+    
+    token = service_token()
+    db = PaperDatabase(config.DATABASE_PATHS['main_database'])
+    # Completing a stage queues the next ones, so the queue needs the whole graph
+    work_queue = WorkQueue(db.db_path, config.WORK_QUEUE,
+                           {stage.name: stage.depends_on for stage in build_processing_stages()})
+    server = serve(QueueService(work_queue, db), config.WORK_QUEUE['service_address'],
+                   config.WORK_QUEUE['service_port'], token)
+    
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    stop.wait()
+    server.shutdown()
+    logger.info("Queue service stopped")
 
 
 def main() -> None:
@@ -126,107 +1026,95 @@ def main() -> None:
         # Parse and validate arguments
         args = parse_arguments()
         validate_arguments(args)
+        import config
         
-        # Determine run mode and value
-        if args.date:
-            run_mode = 'date'
-            run_value = args.date
-            logger.info(f"Starting pipeline with --date {run_value}")
+        # Route outbound HTTP traffic live, to a recording, or from a recording
+        import http_client
+        http_client.configure(args.record, args.replay, args.replay_latency)
+        
+        if args.profile_startup:
+            import startup
+            startup.log_profile(startup.profile())
+            return
+        
+        if args.reprocess:
+            stage_names = parse_stage_list(args.reprocess)
+            dates = parse_date_range(args.published)
+            selection = f"{','.join(stage_names)} {args.published}" + (f" where {args.where}" if args.where else "")
+            logger.info(f"Starting pipeline with --reprocess {selection}")
+            start_run_report('reprocess', selection)
+            db = PaperDatabase(config.DATABASE_PATHS['main_database'])
+            outcomes = None
+            try:
+                outcomes = asyncio.run(run_reprocess(stage_names, dates[0], dates[-1], args.where, db))
+            finally:
+                paper_count = sum(outcomes[stage_names[0]].values()) if outcomes else 0
+                failed = outcomes is None or recorder.failed_papers() > 0
+                close_run_report('failed' if failed else 'completed', paper_count)
+                metrics.write_textfile(config.METRICS['textfile_path'])
+            db.checkpoint()
             
-            # Import and run date-based scraper
-            from modules import scraper
-            runtime_paper_dict = scraper.run(run_mode, run_value)
+            logger.info("=" * 80)
+            logger.info(f"REPROCESSING COMPLETED: {paper_count} papers")
+            for name, counts in outcomes.items():
+                logger.info(f"  {name}: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+            logger.info("=" * 80)
+            if recorder.failed_papers():
+                raise RuntimeError(f"{recorder.failed_papers()} papers failed because a stage raised for their batch")
+            return
+        
+        if args.worker:
+            logger.info(f"Starting pipeline with --worker ({args.stages or 'all stages'})")
+            asyncio.run(run_worker(parse_stage_list(args.stages) if args.stages else None, args.queue_url))
+            return
+        
+        if args.serve_queue:
+            logger.info("Starting pipeline with --serve-queue")
+            run_queue_service()
+            return
+        
+        if args.daemon:
+            poll_interval = args.poll_interval or config.DAEMON['poll_interval']
+            parallelism = args.date_parallelism or config.BACKFILL['date_parallelism']
+            logger.info(f"Starting pipeline with --daemon (every {poll_interval:.0f}s, last "
+                        f"{config.DAEMON['lookback_days']} dates, publishing to {config.DATABASE_PATHS['main_database']})")
+            asyncio.run(run_daemon(poll_interval, config.DAEMON['lookback_days'], parallelism))
+            return
+        
+        # Determine run mode and shards
+        parallelism = 1
+        if args.date:
+            logger.info(f"Starting pipeline with --date {args.date}")
+            start_run_report('date', args.date)
+            shards = [('date', args.date)]
+        elif args.date_range:
+            dates = parse_date_range(args.date_range)
+            parallelism = args.date_parallelism or config.BACKFILL['date_parallelism']
+            logger.info(f"Starting pipeline with --date-range {args.date_range} "
+                        f"({len(dates)} dates, {parallelism} in parallel)")
+            start_run_report('date_range', args.date_range)
+            shards = [('date', date) for date in dates]
         else:  # args.test
-            run_mode = 'test'
-            run_value = args.test
-            logger.info(f"Starting pipeline with --test {run_value}")
-            
-            # Import and run test-based scraper
-            from modules import test_scraper
-            runtime_paper_dict = test_scraper.run(run_mode, run_value)
+            logger.info(f"Starting pipeline with --test {args.test}")
+            start_run_report('test', args.test)
+            shards = [('test', args.test)]
         
-        # Step 1: Save scraped papers to database
-        logger.info("Executing scraper module")
-        save_to_database(runtime_paper_dict)
-
-        # Step 2: Execute introduction extractor module
-        logger.info("Executing introduction extractor module")
-        from modules import intro_extractor
-        import config
-        runtime_paper_dict = intro_extractor.run(runtime_paper_dict, config.LATEX_EXTRACTION)
-        save_to_database(runtime_paper_dict)
-
-        # Step 3: Execute embedding similarity module
-        logger.info("Executing embedding similarity module")
-        from modules import embedding_similarity
-        runtime_paper_dict = embedding_similarity.run(runtime_paper_dict, config.EMBEDDING)
-        save_to_database(runtime_paper_dict)
-
-        # Step 4: Execute LLM validation module
-        logger.info("Executing LLM validation module")
-        from modules import llm_validation
-        runtime_paper_dict = llm_validation.run(runtime_paper_dict, config.LLM_VALIDATION)
-        save_to_database(runtime_paper_dict)
-
-        # Step 5: Execute LLM scoring module
-        logger.info("Executing LLM scoring module")
-        from modules import llm_scoring
-        runtime_paper_dict = llm_scoring.run(runtime_paper_dict, config.LLM_SCORING)
-        save_to_database(runtime_paper_dict)
-
-        # Step 6: Execute H-index fetching module
-        logger.info("Executing H-index fetching module")
-        from modules import h_index_fetching
-        runtime_paper_dict = h_index_fetching.run(runtime_paper_dict, config.H_INDEX_FETCHING)
-        save_to_database(runtime_paper_dict)
-
-        # Step 7: Execute database cleanup module
-        logger.info("Executing database cleanup module")
+        # Run all steps, then persist the timing report whatever the outcome
+        results = {}
         try:
-            from modules import database_cleanup
-            runtime_paper_dict = database_cleanup.run(runtime_paper_dict, config.DATABASE_CLEANUP)
-            save_to_database(runtime_paper_dict)
-        except Exception as e:
-            logger.warning(f"Database cleanup failed: {e}")
-            logger.info("Pipeline will continue despite database cleanup failure")
-
-        # Step 8: Execute Slack notification module
-        logger.info("Executing Slack notification module")
-        try:
-            from modules import slack
-            runtime_paper_dict = slack.run(runtime_paper_dict, {})
-            save_to_database(runtime_paper_dict)
-        except Exception as e:
-            logger.warning(f"Slack notification failed: {e}")
-            logger.info("Pipeline will continue despite Slack notification failure")
+            results = run_pipeline(args, shards, parallelism)
+        finally:
+            finish_run_report(results)
+            metrics.write_textfile(config.METRICS['textfile_path'])
 
         # Final summary
-        total_papers = len(runtime_paper_dict)
-        successful_papers = sum(1 for p in runtime_paper_dict.values() if p.is_successfully_scraped())
-        failed_papers = sum(1 for p in runtime_paper_dict.values() if p.has_scraping_failed())
-        intro_successful = sum(1 for p in runtime_paper_dict.values() if p.is_intro_successful())
-        intro_failed = sum(1 for p in runtime_paper_dict.values() if p.intro_status not in ["not_extracted", "intro_successful"])
-        embedding_successful = sum(1 for p in runtime_paper_dict.values() if p.is_embedding_completed())
-        embedding_failed = sum(1 for p in runtime_paper_dict.values() if p.embedding_status == "failed")
-        llm_validation_successful = sum(1 for p in runtime_paper_dict.values() if p.is_llm_validation_completed())
-        llm_validation_failed = sum(1 for p in runtime_paper_dict.values() if p.llm_validation_status == "failed")
-        llm_scoring_successful = sum(1 for p in runtime_paper_dict.values() if p.is_llm_score_completed())
-        llm_scoring_failed = sum(1 for p in runtime_paper_dict.values() if p.llm_score_status == "failed")
-        h_index_successful = sum(1 for p in runtime_paper_dict.values() if p.is_h_index_completed())
-        h_index_failed = sum(1 for p in runtime_paper_dict.values() if p.h_index_status == "failed")
-
-        logger.info("=" * 80)
-        logger.info("PIPELINE COMPLETED SUCCESSFULLY")
-        logger.info("=" * 80)
-        logger.info(f"Total papers processed: {total_papers}")
-        logger.info(f"  Scraping: {successful_papers} successful, {failed_papers} failed")
-        logger.info(f"  Introduction extraction: {intro_successful} successful, {intro_failed} failed/skipped")
-        logger.info(f"  Embedding similarity: {embedding_successful} successful, {embedding_failed} failed")
-        logger.info(f"  LLM validation: {llm_validation_successful} successful, {llm_validation_failed} failed")
-        logger.info(f"  LLM scoring: {llm_scoring_successful} successful, {llm_scoring_failed} failed")
-        logger.info(f"  H-index fetching: {h_index_successful} successful, {h_index_failed} failed")
-        logger.info(f"Data saved to: database.sqlite")
-        logger.info("=" * 80)
+        log_summary(results)
+        
+        failed_shards = [run_value for run_value, papers in results.items() if papers is None]
+        if failed_shards:
+            raise RuntimeError(f"{len(failed_shards)} of {len(results)} dates failed: {', '.join(failed_shards)}")
+        if recorder.failed_papers():
+            raise RuntimeError(f"{recorder.failed_papers()} papers failed because a stage raised for their batch")
         
     except KeyboardInterrupt:
         logger.info("Pipeline interrupted by user")
@@ -237,4 +1125,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,144 @@
+"""
+Metrics
+
+This module exposes pipeline and upstream health as Prometheus metrics: papers
+per stage and status, per-paper stage latency and batch sizes, stage cache
+hits, HTTP requests
+and latency per host (including 429s), retries and rate-limit sleeps, LLM
+tokens, database write time, and the outcome of the last run.
+
+In --daemon mode the metrics are served over HTTP at /metrics for Prometheus to
+scrape. One-shot runs (cron) instead write them to a node-exporter textfile at
+the end of the run, so both deployments can alert on throughput drops and tune
+max_workers from data.
+
+The run report (run_report.py) remains the per-run breakdown; these metrics are
+cumulative for the life of the process.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, ProcessCollector
+from prometheus_client import start_http_server, write_to_textfile
+
+logger = logging.getLogger('METRICS')
+
+# Status field each stage sets on the papers it processes
+STAGE_STATUS_FIELDS = {
+    'intro_extractor': 'intro_status',
+    'embedding_similarity': 'embedding_status',
+    'llm_validation': 'llm_validation_status',
+    'llm_scoring': 'llm_score_status',
+    'h_index_fetching': 'h_index_status'
+}
+
+# Dedicated registry, so the textfile only carries the pipeline's own metrics
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+STAGE_PAPERS = Counter(
+    'researchfeed_stage_papers', 'Papers finished by a stage, by resulting status',
+    ['stage', 'status'], registry=registry)
+STAGE_PAPER_LATENCY = Histogram(
+    'researchfeed_stage_paper_latency_seconds', 'Time a paper spent in a stage, queue wait included',
+    ['stage'], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900), registry=registry)
+STAGE_BATCH_SIZE = Histogram(
+    'researchfeed_stage_batch_size', 'Papers handed to a stage in one batch',
+    ['stage'], buckets=(1, 2, 5, 10, 20, 50, 100, 200), registry=registry)
+
+STAGE_CACHE_LOOKUPS = Counter(
+    'researchfeed_stage_cache_lookups', 'Stage cache lookups, by stage and result (hit or miss)',
+    ['stage', 'result'], registry=registry)
+
+HTTP_REQUESTS = Counter(
+    'researchfeed_http_requests', 'HTTP requests sent, by host and status code (or transport error)',
+    ['host', 'status'], registry=registry)
+HTTP_REQUEST_DURATION = Histogram(
+    'researchfeed_http_request_duration_seconds', 'Time until response headers arrived, per host',
+    ['host'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120), registry=registry)
+RETRIES = Counter(
+    'researchfeed_retries', 'Retried requests, by service',
+    ['service'], registry=registry)
+SLEEP_SECONDS = Counter(
+    'researchfeed_sleep_seconds', 'Seconds slept for rate limiting or retry backoff, by service',
+    ['service', 'kind'], registry=registry)
+
+LLM_TOKENS = Counter(
+    'researchfeed_llm_tokens', 'LLM tokens used, by stage, model and kind (prompt or completion)',
+    ['stage', 'model', 'kind'], registry=registry)
+LLM_COST = Counter(
+    'researchfeed_llm_cost_usd', 'LLM spend in USD, by stage and model',
+    ['stage', 'model'], registry=registry)
+
+DB_WRITE_DURATION = Histogram(
+    'researchfeed_db_write_duration_seconds', 'Duration of one paper write transaction',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 30), registry=registry)
+DB_PAPERS_WRITTEN = Counter(
+    'researchfeed_db_papers_written', 'Papers written to the database',
+    registry=registry)
+
+LAST_RUN_TIMESTAMP = Gauge(
+    'researchfeed_last_run_timestamp_seconds', 'Unix time the last run (or daemon poll) finished',
+    registry=registry)
+LAST_RUN_SUCCESS = Gauge(
+    'researchfeed_last_run_success', '1 if the last run (or daemon poll) completed, 0 if it failed',
+    registry=registry)
+LAST_RUN_DURATION = Gauge(
+    'researchfeed_last_run_duration_seconds', 'Wall time of the last run (or daemon poll)',
+    registry=registry)
+LAST_RUN_PAPERS = Gauge(
+    'researchfeed_last_run_papers', 'Papers handled by the last run (or daemon poll)',
+    registry=registry)
+
+
+def stage_status(stage: str, paper) -> str:
+    """Return the status a stage left a paper in."""
+    field = STAGE_STATUS_FIELDS.get(stage)
+    status = getattr(paper, field, None) if field else None
+    return status or 'unknown'
+
+
+def record_stage_paper(stage: str, paper) -> None:
+    """Count a paper finished by a stage under the status the stage left it in."""
+    STAGE_PAPERS.labels(stage, stage_status(stage, paper)).inc()
+
+
+def record_run(report: dict) -> None:
+    """Set the last-run gauges from a finished run report."""
+    LAST_RUN_TIMESTAMP.set_to_current_time()
+    LAST_RUN_SUCCESS.set(1 if report.get('status') == 'completed' else 0)
+    LAST_RUN_DURATION.set(report.get('wall_time') or 0)
+    LAST_RUN_PAPERS.set(report.get('paper_count') or 0)
+
+
+def serve(address: str, port: int) -> None:
+    """
+    Serve /metrics over HTTP from a background thread.
+
+    Args:
+        address: Address to bind
+        port: Port to listen on
+    """
+    start_http_server(port, addr=address, registry=registry)
+    logger.info(f"Serving Prometheus metrics on http://{address}:{port}/metrics")
+
+
+def write_textfile(path: Optional[str]) -> None:
+    """
+    Write the metrics to a node-exporter textfile (atomically replaced).
+
+    Failures are logged and never fail the run itself.
+
+    Args:
+        path: Target .prom file, or None to skip
+    """
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        write_to_textfile(path, registry)
+        logger.info(f"Metrics written to {path}")
+    except OSError as e:
+        logger.warning(f"Failed to write metrics textfile: {e}")
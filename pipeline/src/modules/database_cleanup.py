@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 from typing import Dict
 from paper import Paper
 from config import DATABASE_PATHS
+from db_connections import db_connections
 
 logger = logging.getLogger('DATABASE_CLEANUP')
 
@@ -41,8 +42,9 @@ def run(runtime_paper_dict: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
 
         logger.info(f"Using retention period: {retention_days} days (cutoff date: {cutoff_date})")
 
-        # Connect to the database
-        with sqlite3.connect(DATABASE_PATHS['main_database']) as conn:
+        # One transaction on the pipeline's shared connection
+        conn = db_connections.get(DATABASE_PATHS['main_database'])
+        with conn:
             # Update last_generated for all runtime papers
             updated_count = _update_runtime_papers(conn, runtime_paper_dict, current_date)
 
@@ -76,15 +78,12 @@ def _update_runtime_papers(conn: sqlite3.Connection, runtime_paper_dict: Dict[st
     for paper in runtime_paper_dict.values():
         paper.last_generated = current_date
     
-    # Update the database
-    paper_ids = list(runtime_paper_dict.keys())
-    placeholders = ','.join('?' for _ in paper_ids)
-    
-    cursor = conn.execute(f"""
+    # Update the database, reusing one prepared statement for every paper
+    cursor = conn.executemany("""
         UPDATE papers 
         SET last_generated = ? 
-        WHERE id IN ({placeholders})
-    """, [current_date] + paper_ids)
+        WHERE id = ?
+    """, [(current_date, paper_id) for paper_id in runtime_paper_dict])
     
     updated_count = cursor.rowcount
     logger.info(f"Updated last_generated for {updated_count} papers in database")
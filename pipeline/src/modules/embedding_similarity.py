@@ -3,9 +3,11 @@ Embedding Similarity Module
 
 This module calculates similarity scores between papers and predefined research topics
 using embeddings. It supports batch processing for efficiency and caches results
-to reduce API costs.
+to reduce API costs: topic embeddings in the topic embeddings cache, paper
+embeddings in the stage cache (keyed by the exact paper text sent).
 """
 
+import asyncio
 import logging
 import json
 import os
@@ -15,12 +17,50 @@ import sqlite3
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from paper import Paper
-from openai import OpenAI
+from executor import Stage, run_stage
+import http_client
+import rate_limiter
+from run_report import external_call
+from tracing import tracer
+from stage_cache import stage_cache
+from openai import AsyncOpenAI
 from config import DATABASE_PATHS
+from db_connections import db_connections
 import tiktoken
 
 logger = logging.getLogger('EMBEDDING_SIMILARITY')
 
+def load_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Load the tokenizer of an embedding model.
+    
+    tiktoken reads the BPE file from its cache directory (TIKTOKEN_CACHE_DIR),
+    downloading it first if it is missing; the pipeline image pre-fetches it
+    at build time (see startup.prefetch_tokenizers).
+    
+    Args:
+        model: Embedding model name
+        
+    Returns:
+        The model's encoding, or cl100k_base for models tiktoken doesn't know
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def _create_topic_embeddings_table(conn: sqlite3.Connection) -> None:
+    """Create the topic_embeddings table of the topic cache if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS topic_embeddings (
+            topic_name TEXT PRIMARY KEY,
+            description TEXT,
+            embedding_vector TEXT,
+            model TEXT,
+            created_at TEXT
+        )
+    """)
+
 class EmbeddingSimilarity:
     """
     Handles similarity calculation between papers and research topics using embeddings.
@@ -32,7 +72,14 @@ class EmbeddingSimilarity:
     def __init__(self, config: dict):
         """Initialize with configuration settings."""
         self.config = config
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Created on first use, bound to the running event loop's connection pool
+        self._client: Optional[AsyncOpenAI] = None
+        self._client_pool = None
+        self._topic_embeddings: Optional[Dict[str, List[float]]] = None
+        self._topic_lock = asyncio.Lock()
+        
+        # Load the tokenizer once; it is shared by every paper (and every date shard)
+        self.encoding = load_encoding(config['model'])
         
         # Define research topics with detailed descriptions
         self.topics = {
@@ -69,10 +116,7 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
         """
         logger.info(f"Starting embedding similarity calculation for {len(papers)} papers")
         
-        # Step 1: Load or compute topic embeddings
-        topic_embeddings = self._ensure_topic_embeddings()
-        
-        # Step 2: Identify papers needing processing
+        # Step 1: Identify papers needing processing
         papers_to_process = [p for p in papers.values() if not p.is_embedding_completed()]
         skipped_papers = len(papers) - len(papers_to_process)
         
@@ -85,16 +129,10 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
         
         logger.info(f"Processing {len(papers_to_process)} papers for embedding similarity")
         
-        # Step 3: Process papers in batches
-        for i, batch in enumerate(self._create_batches(papers_to_process, self.config['batch_size'])):
-            batch_size = len(batch)
-            logger.info(f"Processing batch {i+1} with {batch_size} papers")
-            self._process_batch(batch, topic_embeddings)
-        
-        # Step 4: Round similarity scores to 3 significant figures
-        self._round_similarity_scores(papers)
+        # Step 2: Process papers in batches (topic embeddings are loaded before the first one)
+        run_stage(self.build_stage(), {paper.id: paper for paper in papers_to_process})
         
-        # Step 5: Log summary statistics
+        # Step 3: Log summary statistics
         completed_count = sum(1 for p in papers.values() if p.embedding_status == "completed")
         failed_count = sum(1 for p in papers.values() if p.embedding_status == "failed")
         
@@ -102,7 +140,60 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
         
         return papers
     
-    def _ensure_topic_embeddings(self) -> Dict[str, List[float]]:
+    def build_stage(self) -> Stage:
+        """
+        Build the streaming executor stage for embedding similarity.
+        
+        Topic embeddings are loaded once, by the stage's prepare step, before
+        any paper is submitted; if they cannot be loaded the run stops there
+        instead of failing every batch. Papers are grouped
+        into batches of up to batch_size as they arrive, waiting at most
+        batch_linger seconds for a batch to fill so that papers are never held
+        back for long.
+        
+        Returns:
+            Stage definition for the streaming executor
+        """
+        async def process(batch: List[Paper]) -> None:
+            topic_embeddings = await self._get_topic_embeddings()
+            logger.info(f"Processing batch with {len(batch)} papers")
+            try:
+                await self._process_batch(batch, topic_embeddings)
+            finally:
+                await stage_cache.aflush()
+            self._round_similarity_scores({paper.id: paper for paper in batch})
+        
+        return Stage(
+            name='embedding_similarity',
+            process=process,
+            select=lambda paper: not paper.is_embedding_completed(),
+            depends_on=('intro_extractor',),
+            max_workers=self.config['max_workers'],
+            batch_size=self.config['batch_size'],
+            batch_linger=self.config['batch_linger'],
+            prepare=self._get_topic_embeddings
+        )
+    
+    def _get_client(self) -> AsyncOpenAI:
+        """Return the OpenAI client that sends through the shared HTTP client of the running loop."""
+        pool = http_client.async_client()
+        if self._client is None or self._client_pool is not pool:
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=self.config['api_base_url'],
+                http_client=pool
+            )
+            self._client_pool = pool
+        return self._client
+    
+    async def _get_topic_embeddings(self) -> Dict[str, List[float]]:
+        """Return the topic embeddings, loading them on first use (the stage's prepare step)."""
+        async with self._topic_lock:
+            if self._topic_embeddings is None:
+                self._topic_embeddings = await self._ensure_topic_embeddings()
+            return self._topic_embeddings
+    
+    async def _ensure_topic_embeddings(self) -> Dict[str, List[float]]:
         """
         Load topic embeddings from database or compute if not found.
 
@@ -110,83 +201,74 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
             Dictionary mapping topic names to embedding vectors
         """
         
-        # Connect to the database
-        conn = sqlite3.connect(DATABASE_PATHS['topic_embeddings_cache'])
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Create topic_embeddings table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS topic_embeddings (
-                topic_name TEXT PRIMARY KEY,
-                description TEXT,
-                embedding_vector TEXT,
-                model TEXT,
-                created_at TEXT
-            )
-        """)
+        # The topic cache runs on the pipeline's shared connection; the table is created once per process
+        path = DATABASE_PATHS['topic_embeddings_cache']
+        db_connections.initialize(path, 'topic_embeddings', _create_topic_embeddings_table)
+        conn = db_connections.get(path)
         
         # Check if we have embeddings for all topics with the current model
         topic_embeddings = {}
         current_model = self.config['model']
         
         for topic_name in self.topics.keys():
-            cursor.execute(
+            result = conn.execute(
                 "SELECT embedding_vector FROM topic_embeddings WHERE topic_name = ? AND model = ?",
                 (topic_name, current_model)
-            )
-            result = cursor.fetchone()
+            ).fetchone()
             
             if result:
                 # Topic embedding exists, load it
-                embedding_vector = json.loads(result['embedding_vector'])
+                embedding_vector = json.loads(result[0])
                 topic_embeddings[topic_name] = embedding_vector
         
         # If any topics are missing embeddings, compute them
         missing_topics = set(self.topics.keys()) - set(topic_embeddings.keys())
         if missing_topics:
             logger.info(f"Computing embeddings for {len(missing_topics)} topics")
+            new_rows = []
             
             for topic_name in missing_topics:
                 description = self.topics[topic_name]
                 
                 try:
                     # Generate embedding for topic description
-                    response = self.client.embeddings.create(
-                        model=current_model,
-                        input=description
-                    )
+                    await rate_limiter.acquire(self.config['api_base_url'], 'openai_embeddings')
+                    with external_call('openai_embeddings'):
+                        response = await self._get_client().embeddings.create(
+                            model=current_model,
+                            input=description
+                        )
                     embedding_vector = response.data[0].embedding
                     
-                    # Store embedding in dictionary and database
+                    # Store embedding in dictionary; rows are written once all topics are computed
                     topic_embeddings[topic_name] = embedding_vector
+                    new_rows.append((
+                        topic_name,
+                        description,
+                        json.dumps(embedding_vector),
+                        current_model,
+                        datetime.now().isoformat()
+                    ))
                     
-                    cursor.execute(
-                        """
-                        INSERT OR REPLACE INTO topic_embeddings
-                        (topic_name, description, embedding_vector, model, created_at)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (
-                            topic_name,
-                            description,
-                            json.dumps(embedding_vector),
-                            current_model,
-                            datetime.now().isoformat()
-                        )
-                    )
-                    
-                    logger.info(f"Generated and saved embedding for topic: {topic_name}")
+                    logger.info(f"Generated embedding for topic: {topic_name}")
                     
                 except Exception as e:
                     logger.error(f"Failed to generate embedding for topic {topic_name}: {e}")
                     # If we can't generate a topic embedding, we have a serious problem
                     raise RuntimeError(f"Failed to generate critical topic embedding: {e}")
             
-            # Commit changes if we added any embeddings
-            conn.commit()
+            # One short write, so no transaction stays open across the API calls
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO topic_embeddings
+                    (topic_name, description, embedding_vector, model, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    new_rows
+                )
+            logger.info(f"Saved embeddings for {len(new_rows)} topics")
         
-        conn.close()
         logger.info(f"Loaded embeddings for {len(topic_embeddings)} topics")
         return topic_embeddings
     
@@ -207,10 +289,7 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
         categories = ', '.join(paper.categories) if paper.categories else ''
         
         # Smart Truncation with TikToken
-        try:
-            encoding = tiktoken.encoding_for_model(self.config['model'])
-        except KeyError:
-            encoding = tiktoken.get_encoding("cl100k_base")
+        encoding = self.encoding
             
         # Model limit is 8192. We maximize usage with a small safety buffer.
         MAX_TOKENS = 8000
@@ -221,6 +300,7 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
         # Scenario 1: Base text alone is too long (very rare)
         if len(base_tokens) >= MAX_TOKENS:
             truncated_tokens = base_tokens[:MAX_TOKENS]
+            tracer.annotate(paper.id, **{'embedding.input_tokens': MAX_TOKENS})
             return encoding.decode(truncated_tokens)
             
         # Scenario 2: Add Introduction if we have space
@@ -241,28 +321,18 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
                 if len(intro_tokens) > remaining_tokens:
                     logger.warning(f"Paper {paper.id}: Intro truncated. Kept {remaining_tokens}/{len(intro_tokens)} tokens. Total paper: {MAX_TOKENS} tokens.")
                 
+                tracer.annotate(paper.id, **{
+                    'embedding.input_tokens': len(base_tokens) + len(prefix_tokens) + len(safe_intro_tokens)})
                 return f"{base_text}{intro_prefix}{safe_intro_text}"
             else:
                 # Calculate what we are missing for the log
                 intro_tokens = encoding.encode(paper.introduction_text)
                 logger.warning(f"Paper {paper.id}: Intro fully truncated. Kept 0/{len(intro_tokens)} tokens. Base text used {len(base_tokens)}/{MAX_TOKENS}.")
         
+        tracer.annotate(paper.id, **{'embedding.input_tokens': len(base_tokens)})
         return base_text
     
-    def _create_batches(self, papers: List[Paper], batch_size: int) -> List[List[Paper]]:
-        """
-        Split papers into batches of specified size.
-        
-        Args:
-            papers: List of papers to batch
-            batch_size: Maximum size of each batch
-            
-        Returns:
-            List of paper batches
-        """
-        return [papers[i:i + batch_size] for i in range(0, len(papers), batch_size)]
-    
-    def _process_batch(self, papers: List[Paper], topic_embeddings: Dict[str, List[float]]) -> None:
+    async def _process_batch(self, papers: List[Paper], topic_embeddings: Dict[str, List[float]]) -> None:
         """
         Process a batch of papers with a single API call.
         
@@ -270,20 +340,34 @@ Keywords: Inference-time scaling, test-time compute, inference-time search, comp
             papers: List of papers to process in this batch
             topic_embeddings: Dictionary of topic embeddings
         """
-        # Prepare paper texts for batch embedding
-        paper_texts = [self._build_paper_text(paper) for paper in papers]
+        # Prepare paper texts for batch embedding (tokenizing is CPU work; keep it off the event loop)
+        with tracer.span('build_paper_text', [paper.id for paper in papers]):
+            paper_texts = await asyncio.to_thread(lambda: [self._build_paper_text(paper) for paper in papers])
+        
+        # Reuse the embeddings of paper texts that were embedded before
+        cache_keys = [stage_cache.key('embedding_similarity', self.config['model'], text) for text in paper_texts]
+        embeddings = await stage_cache.aget_many('embedding_similarity', cache_keys)
+        missing = [i for i, key in enumerate(cache_keys) if key not in embeddings]
         
         try:
-            # Generate embeddings for the batch
-            response = self.client.embeddings.create(
-                model=self.config['model'],
-                input=paper_texts
-            )
+            # Generate embeddings for the rest of the batch
+            if missing:
+                missing_papers = [papers[i] for i in missing]
+                await rate_limiter.acquire(self.config['api_base_url'], 'openai_embeddings', [paper.id for paper in missing_papers])
+                with external_call('openai_embeddings', [paper.id for paper in missing_papers]):
+                    response = await self._get_client().embeddings.create(
+                        model=self.config['model'],
+                        input=[paper_texts[i] for i in missing]
+                    )
+                for position, i in enumerate(missing):
+                    # Stored as float32, and used as stored, so cached and fresh scores agree
+                    embeddings[cache_keys[i]] = np.asarray(response.data[position].embedding, dtype=np.float32).tobytes()
+                    stage_cache.put('embedding_similarity', cache_keys[i], embeddings[cache_keys[i]])
             
             # Process each paper with its embedding
             for i, paper in enumerate(papers):
                 try:
-                    paper_embedding = response.data[i].embedding
+                    paper_embedding = np.frombuffer(embeddings[cache_keys[i]], dtype=np.float32)
                     
                     # Calculate similarity scores for each topic
                     scores = {
@@ -395,3 +479,16 @@ def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
     """
     processor = EmbeddingSimilarity(config)
     return processor.run(papers)
+
+def build_stage(config: dict) -> Stage:
+    """
+    Build the streaming executor stage for the embedding similarity module.
+    
+    Args:
+        config: Configuration dictionary with embedding parameters
+        
+    Returns:
+        Stage definition for the streaming executor
+    """
+    processor = EmbeddingSimilarity(config)
+    return processor.build_stage()
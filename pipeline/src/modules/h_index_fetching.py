@@ -3,16 +3,20 @@ H-Index Fetching Module
 
 This module fetches H-index data for valuable papers (Must Read, Should Read) from Semantic Scholar.
 It uses a cascading search strategy: full arXiv ID -> base arXiv ID -> title search.
-Processing is sequential with rate limiting.
+Requests are paced by the shared per-host rate limiter.
 """
 
 import logging
 import json
 import os
-import time
-import requests
 from typing import Dict, List, Optional, Tuple
 from paper import Paper, AuthorHIndex
+from executor import Stage, run_stage
+import http_client
+import rate_limiter
+from retry_queue import retry_queue
+from run_report import external_call, record_retry
+from structured_logging import success_log
 
 logger = logging.getLogger('H_INDEX_FETCHING')
 
@@ -31,7 +35,6 @@ class HIndexFetching:
         self.base_url = config['api_base_url']
         self.timeout = config['timeout']
         self.max_retries = config['max_retries']
-        self.rate_limit_delay = config['rate_limit_delay']
         self.notable_threshold = config['notable_h_index_threshold']
 
         # Load API key from environment
@@ -70,27 +73,8 @@ class HIndexFetching:
         logger.info(f"Fetching H-index for {len(papers_to_process)} papers, skipping {skipped_papers} papers "
                    f"({already_completed} already completed, {not_recommended} not recommended)")
         
-        # Step 2: Process papers sequentially with rate limiting
-        for i, paper in enumerate(papers_to_process, 1):
-            try:
-                self._fetch_h_index_for_paper(paper)
-                
-                # Log progress for each paper
-                if paper.h_index_status == "completed":
-                    method_name = paper.h_index_fetch_method.replace('_', ' ')
-                    logger.info(f"{paper.id} - found via {method_name}, found {paper.authors_found}/{paper.total_authors} authors, "
-                               f"highest H-index: {paper.highest_h_index}")
-                else:
-                    logger.warning(f"{paper.id} - failed to fetch H-index data")
-                
-                # Rate limiting: wait between requests (except for the last one)
-                if i < len(papers_to_process):
-                    time.sleep(self.rate_limit_delay)
-                    
-            except Exception as e:
-                logger.error(f"Unexpected error processing paper {paper.id}: {e}")
-                paper.update_h_index_status("failed")
-                paper.add_error(f"H-index fetching failed: {str(e)}")
+        # Step 2: Process papers through the rate-limited fetching stage
+        run_stage(self.build_stage(), {paper.id: paper for paper in papers_to_process})
         
         # Step 3: Log summary statistics
         completed_count = sum(1 for p in papers.values() if p.h_index_status == "completed")
@@ -100,6 +84,50 @@ class HIndexFetching:
         
         return papers
     
+    def build_stage(self) -> Stage:
+        """
+        Build the streaming executor stage for H-index fetching.
+        
+        Every request acquires a slot from the shared rate limiter, so the
+        Semantic Scholar request rate stays at its configured allowance.
+        
+        Returns:
+            Stage definition for the streaming executor
+        """
+        async def process(papers: List[Paper]) -> None:
+            for paper in papers:
+                try:
+                    await self._fetch_h_index_for_paper(paper)
+                    await retry_queue.aresolve('h_index_fetching', paper.id)
+                    
+                    if paper.h_index_status == "completed":
+                        method_name = paper.h_index_fetch_method.replace('_', ' ')
+                        success_log.paper_succeeded(
+                            logger, 'h_index_fetching', paper.id,
+                            f"{paper.id} - found via {method_name}, found {paper.authors_found}/{paper.total_authors} authors, "
+                            f"highest H-index: {paper.highest_h_index}",
+                            highest_h_index=paper.highest_h_index)
+                    else:
+                        logger.warning(f"{paper.id} - failed to fetch H-index data")
+                        
+                except Exception as e:
+                    # Timeouts, 429s and server errors are retried later instead of in place
+                    if await retry_queue.adefer('h_index_fetching', paper.id, e, self.max_retries,
+                                                lambda retry: 2 ** retry):
+                        record_retry('semantic_scholar', [paper.id])
+                        continue
+                    logger.error(f"Unexpected error processing paper {paper.id}: {e}")
+                    paper.update_h_index_status("failed")
+                    paper.add_error(f"H-index fetching failed: {str(e)}")
+        
+        return Stage(
+            name='h_index_fetching',
+            process=process,
+            select=lambda paper: not paper.can_skip_h_index_fetching() and paper.is_valuable_paper(),
+            depends_on=('llm_scoring',),
+            max_workers=self.config['max_workers']
+        )
+    
     def _identify_target_papers(self, papers: Dict[str, Paper]) -> List[Paper]:
         """
         Identify papers that need H-index fetching.
@@ -124,7 +152,7 @@ class HIndexFetching:
         
         return papers_to_process
     
-    def _fetch_h_index_for_paper(self, paper: Paper) -> None:
+    async def _fetch_h_index_for_paper(self, paper: Paper) -> None:
         """
         Fetch H-index data for a single paper using cascading search strategy.
         
@@ -138,21 +166,21 @@ class HIndexFetching:
         base_arxiv_id = arxiv_id.split('v')[0] if 'v' in arxiv_id else arxiv_id
         
         # Strategy 1: Search by full arXiv ID
-        ss_data = self._search_by_full_arxiv_id(arxiv_id)
+        ss_data = await self._search_by_full_arxiv_id(arxiv_id, paper.id)
         if ss_data:
             self._process_semantic_scholar_data(paper, ss_data, "full_id")
             return
         
         # Strategy 2: Search by base arXiv ID (if different from full ID)
         if base_arxiv_id != arxiv_id:
-            ss_data = self._search_by_base_arxiv_id(base_arxiv_id)
+            ss_data = await self._search_by_base_arxiv_id(base_arxiv_id, paper.id)
             if ss_data:
                 self._process_semantic_scholar_data(paper, ss_data, "base_id")
                 return
         
         # Strategy 3: Search by title
         if paper.title:
-            ss_data = self._search_by_title(paper.title)
+            ss_data = await self._search_by_title(paper.title, paper.id)
             if ss_data:
                 self._process_semantic_scholar_data(paper, ss_data, "title_search")
                 return
@@ -162,19 +190,19 @@ class HIndexFetching:
         paper.add_error("H-index fetching failed: not found in Semantic Scholar")
         logger.debug(f"{paper.id} - not found in Semantic Scholar")
     
-    def _search_by_full_arxiv_id(self, arxiv_id: str) -> Optional[Dict]:
+    async def _search_by_full_arxiv_id(self, arxiv_id: str, paper_id: str) -> Optional[Dict]:
         """Search Semantic Scholar by full arXiv ID."""
         url = f"{self.base_url}/paper/arXiv:{arxiv_id}"
         params = {"fields": self.api_fields}
-        return self._make_api_request(url, params)
+        return await self._make_api_request(url, params, paper_id)
     
-    def _search_by_base_arxiv_id(self, base_arxiv_id: str) -> Optional[Dict]:
+    async def _search_by_base_arxiv_id(self, base_arxiv_id: str, paper_id: str) -> Optional[Dict]:
         """Search Semantic Scholar by base arXiv ID."""
         url = f"{self.base_url}/paper/arXiv:{base_arxiv_id}"
         params = {"fields": self.api_fields}
-        return self._make_api_request(url, params)
+        return await self._make_api_request(url, params, paper_id)
     
-    def _search_by_title(self, title: str) -> Optional[Dict]:
+    async def _search_by_title(self, title: str, paper_id: str) -> Optional[Dict]:
         """Search Semantic Scholar by paper title."""
         url = f"{self.base_url}/paper/search"
         params = {
@@ -182,63 +210,49 @@ class HIndexFetching:
             "fields": self.api_fields,
             "limit": 1
         }
-        response = self._make_api_request(url, params)
+        response = await self._make_api_request(url, params, paper_id)
         
         # Extract first result from search response
         if response and 'data' in response and response['data']:
             return response['data'][0]
         return None
     
-    def _make_api_request(self, url: str, params: dict = None) -> Optional[Dict]:
+    async def _make_api_request(self, url: str, params: dict = None, paper_id: Optional[str] = None) -> Optional[Dict]:
         """
-        Make authenticated API request to Semantic Scholar with retry logic.
+        Make authenticated API request to Semantic Scholar.
 
         Args:
             url: API endpoint URL
             params: Query parameters
+            paper_id: ID of the paper the request is made for (for the run report)
 
         Returns:
             JSON response data or None if failed
+
+        Raises:
+            httpx.HTTPError: On a timeout, a connection error or a 429 or 5xx
+                response, which the stage defers to the retry queue
         """
         headers = {'x-api-key': self.api_key}
+        paper_ids = [paper_id] if paper_id else []
 
-        for attempt in range(self.max_retries + 1):
-            try:
-                response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
+        await rate_limiter.acquire(url, 'semantic_scholar', paper_ids)
+        with external_call('semantic_scholar', paper_ids):
+            response = await http_client.aget(url, headers=headers, params=params, timeout=self.timeout)
 
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 404:
-                    return None
-                elif response.status_code == 429:
-                    if attempt < self.max_retries:
-                        wait_time = (2 ** attempt) * self.rate_limit_delay
-                        logger.warning(f"Rate limited, waiting {wait_time:.1f}s before retry")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error("Rate limited after all retries")
-                        return None
-                elif response.status_code in (401, 403):
-                    logger.error(f"Authentication failed with status {response.status_code}")
-                    return None
-                else:
-                    logger.warning(f"API request failed with status {response.status_code}")
-                    return None
-
-            except requests.exceptions.Timeout:
-                if attempt < self.max_retries:
-                    logger.warning(f"Request timeout, attempt {attempt + 1}/{self.max_retries + 1}")
-                    time.sleep(1)
-                    continue
-                else:
-                    logger.error("Request timeout after all retries")
-                    return None
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request failed: {e}")
-                return None
-
-        return None
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 404:
+            return None
+        elif response.status_code == 429 or response.status_code >= 500:
+            # A 429 has paused the host in the rate limiter; the retry waits it out
+            response.raise_for_status()
+        elif response.status_code in (401, 403):
+            logger.error(f"Authentication failed with status {response.status_code}")
+            return None
+        else:
+            logger.warning(f"API request failed with status {response.status_code}")
+            return None
     
     def _process_semantic_scholar_data(self, paper: Paper, ss_data: Dict, method: str) -> None:
         """
@@ -310,3 +324,17 @@ def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
     """
     fetcher = HIndexFetching(config)
     return fetcher.run(papers)
+
+
+def build_stage(config: dict) -> Stage:
+    """
+    Build the streaming executor stage for the H-index fetching module.
+    
+    Args:
+        config: Configuration dictionary
+        
+    Returns:
+        Stage definition for the streaming executor
+    """
+    fetcher = HIndexFetching(config)
+    return fetcher.build_stage()
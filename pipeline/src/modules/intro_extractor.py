@@ -5,15 +5,21 @@ This module handles the extraction of paper introductions from LaTeX source file
 It implements a hierarchical approach to find and extract introductions.
 """
 
+import asyncio
 import logging
 import re
 import tempfile
-import time
-import requests
 import tarfile
 from pathlib import Path
 from typing import Dict, Optional, List
 from paper import Paper
+from executor import Stage, run_stage
+import http_client
+import rate_limiter
+from retry_queue import retry_queue
+from run_report import external_call, record_retry
+from structured_logging import success_log
+from tracing import tracer
 
 logger = logging.getLogger('INTRO_EXTRACTOR')
 
@@ -358,8 +364,13 @@ def find_introduction_in_archive(tar_file, paper_id: str) -> Optional[tuple[str,
 
 
 
-def download_and_extract_introduction(paper: Paper, config: dict) -> None:
-    """Download LaTeX source and extract introduction text with retry logic."""
+async def download_and_extract_introduction(paper: Paper, config: dict) -> None:
+    """
+    Download LaTeX source and extract introduction text.
+    
+    A download that fails with a retryable error defers the paper to the retry
+    queue, with the configured backoff delays, instead of retrying in place.
+    """
     # Convert PDF URL to LaTeX URL
     if not paper.pdf_url:
         paper.update_intro_status("extraction_failed")
@@ -368,59 +379,64 @@ def download_and_extract_introduction(paper: Paper, config: dict) -> None:
         
     paper.latex_url = paper.pdf_url.replace('/pdf/', '/src/')
     
-    # Retry logic with configurable backoff delays
-    max_retries = config['max_retries']
-    retry_delays = config['retry_delays']
-    
-    for retry_count in range(max_retries + 1):
-        try:
-            # Download the LaTeX source
-            response = requests.get(paper.latex_url, timeout=config['timeout'])
+    try:
+        # Download the LaTeX source
+        await rate_limiter.acquire(paper.latex_url, 'arxiv_source', [paper.id])
+        with external_call('arxiv_source', [paper.id]):
+            response = await http_client.aget(paper.latex_url, timeout=config['timeout'])
+            tracer.annotate(paper.id, **{'arxiv.source_bytes': len(response.content)})
             response.raise_for_status()
+        
+        # Unpacking and searching the archive is CPU and disk work; keep it off the event loop
+        with tracer.span('extract_introduction', [paper.id]):
+            await asyncio.to_thread(extract_introduction_from_source, paper, response.content, config)
+            tracer.annotate(paper.id, **{'intro.chars': len(paper.introduction_text or ''),
+                                         'intro.method': paper.intro_extraction_method})
+        await retry_queue.aresolve('intro_extractor', paper.id)
+    
+    except Exception as e:
+        retry_delays = config['retry_delays']
+        if await retry_queue.adefer('intro_extractor', paper.id, e, config['max_retries'],
+                                    lambda retry: retry_delays[min(retry, len(retry_delays) - 1)]):
+            record_retry('arxiv_source', [paper.id])
+            return
+        paper.update_intro_status("extraction_failed")
+        paper.add_error(f"Introduction extraction failed: {str(e)}")
+        logger.error(f"[{paper.id}] Introduction extraction failed: {e}")
+
+def extract_introduction_from_source(paper: Paper, source: bytes, config: dict) -> None:
+    """Extract the introduction from a downloaded LaTeX source archive into the paper."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Extract gzipped tar file
+        tar_path = Path(temp_dir) / "source.tar.gz"
+        tar_path.write_bytes(source)
+        
+        # Extract introduction using hierarchical approach
+        with tarfile.open(tar_path, 'r:gz') as tar:
+            result = find_introduction_in_archive(tar, paper.id)
             
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Extract gzipped tar file
-                tar_path = Path(temp_dir) / "source.tar.gz"
-                tar_path.write_bytes(response.content)
+            if result:
+                intro_text, tex_filename, method = result
                 
-                # Extract introduction using hierarchical approach
-                with tarfile.open(tar_path, 'r:gz') as tar:
-                    result = find_introduction_in_archive(tar, paper.id)
-                    
-                    if result:
-                        intro_text, tex_filename, method = result
-                        
-                        # Validate and truncate if needed
-                        if len(intro_text) > config['max_introduction_length']:
-                            intro_text = intro_text[:config['max_introduction_length']] + "..."
-                        
-                        paper.introduction_text = intro_text
-                        paper.tex_file_name = tex_filename
-                        paper.intro_extraction_method = method
-                        paper.update_intro_status("intro_successful")
-                        return
-                    else:
-                        paper.update_intro_status("no_intro_found")
-                        paper.add_error("Could not find introduction section")
-                        logger.warning(f"[{paper.id}] No introduction found in any tex files")
-                        return
-        
-        except Exception as e:
-            if retry_count < max_retries:
-                delay = retry_delays[retry_count] if retry_count < len(retry_delays) else retry_delays[-1]
-                logger.warning(f"[{paper.id}] Retry {retry_count + 1}/{max_retries + 1} after {delay}s: {e}")
-                time.sleep(delay)
+                # Validate and truncate if needed
+                if len(intro_text) > config['max_introduction_length']:
+                    intro_text = intro_text[:config['max_introduction_length']] + "..."
+                
+                paper.introduction_text = intro_text
+                paper.tex_file_name = tex_filename
+                paper.intro_extraction_method = method
+                paper.update_intro_status("intro_successful")
             else:
-                paper.update_intro_status("extraction_failed")
-                paper.add_error(f"Introduction extraction failed after {max_retries + 1} attempts: {str(e)}")
-                logger.error(f"[{paper.id}] Introduction extraction failed after {max_retries + 1} attempts: {e}")
+                paper.update_intro_status("no_intro_found")
+                paper.add_error("Could not find introduction section")
+                logger.warning(f"[{paper.id}] No introduction found in any tex files")
 
 def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
     """
-    Run the introduction extraction process with sequential downloading and rate limiting.
+    Run the introduction extraction process with rate-limited downloading.
     
-    Downloads papers sequentially with proper rate limiting (1 second delay between requests),
-    then extracts introductions using the 3-method hierarchical approach.
+    Downloads papers at the arXiv rate set in RATE_LIMITS, then extracts
+    introductions using the 3-method hierarchical approach.
     
     Args:
         papers: Dictionary of paper_id -> Paper objects
@@ -439,41 +455,58 @@ def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
         logger.info("No papers require introduction extraction")
         return papers
     
-    logger.info(f"Processing {len(papers_to_process)} papers for introduction extraction with {config['rate_limit_delay']}s delays")
+    logger.info(f"Processing {len(papers_to_process)} papers for introduction extraction")
     
-    # Step 2: Process filtered papers sequentially (no parallel downloads)
-    successful_count = 0
-    failed_count = 0
-    
-    for i, paper in enumerate(papers_to_process, 1):
-        logger.info(f"Processing paper {i}/{len(papers_to_process)}: {paper.id}")
-        
-        try:
-            download_and_extract_introduction(paper, config)
-            
-            if paper.is_intro_successful():
-                successful_count += 1
-                logger.info(f"  {paper.id} - SUCCESS - Method: {paper.intro_extraction_method}")
-            else:
-                failed_count += 1
-                logger.info(f"  {paper.id} - FAILED - Status: {paper.intro_status}")
-        
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"  {paper.id} - FAILED - Unexpected error: {e}")
-        
-        # Wait between requests (respect arXiv rate limits)
-        if i < len(papers_to_process):  # Don't wait after the last paper
-            delay = config['rate_limit_delay']
-            logger.debug(f"Waiting {delay}s before next request...")
-            time.sleep(delay)
+    # Step 2: Process filtered papers through the extraction stage
+    run_stage(build_stage(config), {paper.id: paper for paper in papers_to_process})
     
     # Step 3: Log final summary
-    total_papers = len(papers)
+    successful_count = sum(1 for paper in papers_to_process if paper.is_intro_successful())
+    failed_count = len(papers_to_process) - successful_count
     logger.info(f"Introduction extraction complete: {successful_count}/{len(papers_to_process)} successful, {failed_count} failed, {skipped_papers} skipped")
     
     return papers
 
+def build_stage(config: dict) -> Stage:
+    """
+    Build the streaming executor stage for introduction extraction.
+    
+    Every download acquires a slot from the shared rate limiter, so the arXiv
+    request rate stays at its configured allowance however many workers run.
+    
+    Args:
+        config: Configuration dictionary with extraction parameters
+        
+    Returns:
+        Stage definition for the streaming executor
+    """
+    async def process(papers: List[Paper]) -> None:
+        for paper in papers:
+            try:
+                await download_and_extract_introduction(paper, config)
+                
+                if paper.is_intro_successful():
+                    success_log.paper_succeeded(logger, 'intro_extractor', paper.id,
+                                                f"  {paper.id} - SUCCESS - Method: {paper.intro_extraction_method}",
+                                                method=paper.intro_extraction_method)
+                # A paper that still needs extraction was deferred; the retry queue logged that
+                elif not _needs_intro_extraction(paper):
+                    logger.info(f"  {paper.id} - FAILED - Status: {paper.intro_status}")
+            
+            except Exception as e:
+                logger.error(f"  {paper.id} - FAILED - Unexpected error: {e}")
+    
+    return Stage(
+        name='intro_extractor',
+        process=process,
+        select=_needs_intro_extraction,
+        max_workers=config['max_workers']
+    )
+
+def _needs_intro_extraction(paper: Paper) -> bool:
+    """Check if a paper still needs introduction extraction."""
+    return paper.intro_status not in ["intro_successful", "no_latex_source", "no_intro_found", "extraction_failed"]
+
 def _identify_papers_for_intro_extraction(papers: Dict[str, Paper]) -> List[Paper]:
     """
     Identify papers that need introduction extraction.
@@ -6,17 +6,24 @@ Moderately Relevant, or Tangentially Relevant topic. It provides detailed scorin
 dimensions: novelty, impact, and recommendation using Grok 3 Mini via OpenRouter API.
 """
 
+import itertools
 import logging
 import json
 import os
-import time
 import random
-import requests
+import httpx
 import xml.etree.ElementTree as ET
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Semaphore
 from typing import Dict, List, Optional
 from paper import Paper
+from executor import Stage, run_stage
+import http_client
+import rate_limiter
+from budget import budget
+from retry_queue import retry_queue, is_retryable
+from run_report import external_call, record_retry
+from structured_logging import success_log
+from tracing import tracer
+from stage_cache import stage_cache
 
 logger = logging.getLogger('LLM_SCORING')
 
@@ -39,9 +46,6 @@ class LLMScoring:
             raise ValueError(f"API key not found in environment variable: {config['openrouter_api_key_env_var']}")
         
         self.api_key = api_key
-        
-        # Initialize semaphore for concurrency control
-        self.semaphore = Semaphore(config['max_workers'])
     
     def run(self, papers: Dict[str, Paper]) -> Dict[str, Paper]:
         """
@@ -65,21 +69,8 @@ class LLMScoring:
         
         logger.info(f"Processing {len(papers_to_process)} papers for LLM scoring using {self.config['max_workers']} workers")
         
-        # Step 2: Process papers in parallel (no batching for this module)
-        with ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
-            # Submit all papers
-            future_to_paper = {
-                executor.submit(self._process_paper_with_retry_wrapper, paper, i + 1, len(papers_to_process)): paper
-                for i, paper in enumerate(papers_to_process)
-            }
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_paper):
-                paper = future_to_paper[future]
-                try:
-                    future.result()  # This will raise any exception that occurred
-                except Exception as e:
-                    logger.error(f"Unexpected error processing paper {paper.id}: {e}")
+        # Step 2: Process papers concurrently, max_workers at a time (no batching for this module)
+        run_stage(self.build_stage(), {paper.id: paper for paper in papers_to_process})
         
         # Step 3: Log summary statistics
         completed_count = sum(1 for p in papers.values() if p.llm_score_status == "completed")
@@ -108,25 +99,16 @@ class LLMScoring:
         insufficient_relevance = 0
         
         for paper in papers.values():
-            # Check if LLM validation is completed
-            if not paper.is_llm_validation_completed():
-                no_llm_validation += 1
-                continue
+            skip_reason = self._classify_for_scoring(paper)
             
-            # Check if already scored
-            if paper.can_skip_llm_scoring():
+            if skip_reason == "no_llm_validation":
+                no_llm_validation += 1
+            elif skip_reason == "already_scored":
                 already_scored += 1
-                continue
-            
-            # Check if has at least one Highly/Moderately/Tangentially Relevant topic
-            if paper.has_highly_relevant_topic():
-                papers_to_process.append(paper)
-                logger.debug(f"Paper {paper.id} needs scoring")
-            else:
-                # Mark as not relevant enough
-                paper.update_llm_score_status("not_relevant_enough")
+            elif skip_reason == "insufficient_relevance":
                 insufficient_relevance += 1
-                logger.debug(f"Paper {paper.id} has no Highly/Moderately/Tangentially Relevant topics, marked as not_relevant_enough")
+            else:
+                papers_to_process.append(paper)
         
         # Log detailed skip statistics
         total_skipped = no_llm_validation + already_scored + insufficient_relevance
@@ -143,65 +125,107 @@ class LLMScoring:
         
         return papers_to_process
     
-    def _process_paper_with_retry_wrapper(self, paper: Paper, paper_index: int, total_papers: int) -> None:
+    def _classify_for_scoring(self, paper: Paper) -> Optional[str]:
         """
-        Wrapper for parallel processing that handles semaphore acquisition.
+        Decide whether a single paper needs LLM scoring.
+        
+        Papers without a Highly/Moderately/Tangentially Relevant topic are
+        marked as not_relevant_enough here.
         
         Args:
-            paper: Paper object to process
-            paper_index: Current paper index (1-based)
-            total_papers: Total number of papers being processed
+            paper: Paper object to classify
+            
+        Returns:
+            None if the paper needs scoring, otherwise the skip reason
+        """
+        # Check if LLM validation is completed
+        if not paper.is_llm_validation_completed():
+            return "no_llm_validation"
+        
+        # Check if already scored
+        if paper.can_skip_llm_scoring():
+            return "already_scored"
+        
+        # Check if has at least one Highly/Moderately/Tangentially Relevant topic
+        if paper.has_highly_relevant_topic():
+            logger.debug(f"Paper {paper.id} needs scoring")
+            return None
+        
+        # Mark as not relevant enough
+        paper.update_llm_score_status("not_relevant_enough")
+        logger.debug(f"Paper {paper.id} has no Highly/Moderately/Tangentially Relevant topics, marked as not_relevant_enough")
+        return "insufficient_relevance"
+    
+    def build_stage(self) -> Stage:
+        """
+        Build the streaming executor stage for LLM scoring.
+        
+        Returns:
+            Stage definition for the streaming executor
         """
-        with self.semaphore:  # Acquire semaphore to limit concurrent API calls
-            self._process_paper_with_retry(paper, paper_index, total_papers)
+        counter = itertools.count(1)
+        
+        async def process(papers: List[Paper]) -> None:
+            try:
+                for paper in papers:
+                    # Papers refused by the budget are deferred until the budget opens again
+                    if await budget.allow('llm_scoring', paper):
+                        await self._process_paper_with_retry(paper, f"Paper {next(counter)}")
+            finally:
+                await stage_cache.aflush()
+        
+        return Stage(
+            name='llm_scoring',
+            process=process,
+            select=lambda paper: self._classify_for_scoring(paper) is None,
+            depends_on=('llm_validation',),
+            max_workers=self.config['max_workers']
+        )
     
-    def _process_paper_with_retry(self, paper: Paper, paper_index: int, total_papers: int) -> None:
+    async def _process_paper_with_retry(self, paper: Paper, progress: str) -> None:
         """
-        Process a single paper with retry logic.
+        Process a single paper, deferring it to the retry queue if it fails.
+        
+        Any failure except an exceeded token limit or a non-retryable HTTP
+        status is retried, since a malformed model response usually succeeds
+        on the next attempt.
         
         Args:
             paper: Paper object to process
-            paper_index: Current paper index (1-based)
-            total_papers: Total number of papers being processed
+            progress: Progress label used in log lines (e.g. "Paper 3/10")
         """
         max_retries = 3  # Fixed at 3 retries as requested
         
-        for attempt in range(max_retries + 1):
-            try:
-                self._process_single_paper(paper)
-                paper.update_llm_score_status("completed")
-                logger.info(f"Paper {paper_index}/{total_papers}: {paper.id} - LLM scoring SUCCESS")
+        try:
+            await self._process_single_paper(paper)
+            paper.update_llm_score_status("completed")
+            await retry_queue.aresolve('llm_scoring', paper.id)
+            success_log.paper_succeeded(logger, 'llm_scoring', paper.id, f"{progress}: {paper.id} - LLM scoring SUCCESS")
+            
+        except Exception as e:
+            error_msg = str(e)
+            
+            # Check for token limit exceeded
+            if "token" in error_msg.lower() and ("limit" in error_msg.lower() or "exceed" in error_msg.lower()):
+                logger.error(f"{progress}: {paper.id} - token limit exceeded, marking as failed")
+                await retry_queue.aresolve('llm_scoring', paper.id)
+                paper.update_llm_score_status("failed")
+                paper.add_error(f"LLM scoring failed: token limit exceeded")
+                return
+            
+            # A 429 has already paused the host in the rate limiter; the retry
+            # waits for it when acquiring its request slot
+            if await retry_queue.adefer('llm_scoring', paper.id, e, max_retries,
+                                        lambda retry: (2 ** retry) + random.uniform(0, 1),
+                                        retryable=is_retryable(e, default=True)):
+                record_retry('openrouter', [paper.id])
                 return
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check for rate limiting (429 error) and add extra delay
-                if "429" in error_msg or "rate limit" in error_msg.lower():
-                    extra_delay = random.uniform(1.0, 3.0)
-                    logger.warning(f"Paper {paper_index}/{total_papers}: {paper.id} - rate limited, waiting {extra_delay:.1f}s")
-                    time.sleep(extra_delay)
-                
-                # Check for token limit exceeded
-                if "token" in error_msg.lower() and ("limit" in error_msg.lower() or "exceed" in error_msg.lower()):
-                    logger.error(f"Paper {paper_index}/{total_papers}: {paper.id} - token limit exceeded, marking as failed")
-                    paper.update_llm_score_status("failed")
-                    paper.add_error(f"LLM scoring failed: token limit exceeded")
-                    return
-                
-                if attempt == max_retries:
-                    # Final attempt failed
-                    paper.update_llm_score_status("failed")
-                    paper.add_error(f"LLM scoring failed after {max_retries + 1} attempts: {error_msg}")
-                    logger.error(f"Paper {paper_index}/{total_papers}: {paper.id} - LLM scoring FAILED after all retries: {error_msg}")
-                else:
-                    # Log retry attempt
-                    logger.warning(f"Paper {paper_index}/{total_papers}: {paper.id} - attempt {attempt + 1}/{max_retries + 1} FAILED: {error_msg}")
-                    # Wait before retry with exponential backoff
-                    retry_delay = (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(retry_delay)
+            
+            paper.update_llm_score_status("failed")
+            paper.add_error(f"LLM scoring failed: {error_msg}")
+            logger.error(f"{progress}: {paper.id} - LLM scoring FAILED: {error_msg}")
     
-    def _process_single_paper(self, paper: Paper) -> None:
+    async def _process_single_paper(self, paper: Paper) -> None:
         """
         Process a single paper through LLM scoring.
         
@@ -216,11 +240,23 @@ class LLMScoring:
         # Step 1: Build prompt
         prompt = self._build_scoring_prompt(paper)
         
-        # Step 2: Make API call
-        response_content = self._make_api_call(prompt)
+        # Step 2: Make API call, unless this exact prompt was answered before
+        # The budget may lower the reasoning effort, so the sampling parameters are part of the key
+        sampling = self._sampling_params()
+        cache_key = stage_cache.key('llm_scoring', self.config['model'], json.dumps(sampling, sort_keys=True), prompt)
+        response_content = await stage_cache.aget('llm_scoring', cache_key)
+        cached = response_content is not None
+        if cached:
+            logger.debug(f"{paper.id} - Reusing cached response")
+        else:
+            await rate_limiter.acquire(self.config['api_base_url'], 'openrouter', [paper.id])
+            with external_call('openrouter', [paper.id]):
+                response_content = await self._make_api_call(prompt, sampling)
         
         # Step 3: Parse and validate response
         scoring_results = self._parse_xml_response(response_content)
+        if not cached:
+            stage_cache.put('llm_scoring', cache_key, response_content)
         
         # Step 4: Update paper object
         self._update_paper_with_results(paper, scoring_results)
@@ -301,12 +337,24 @@ Important: Evaluate all three dimensions and use only the specified categories.
         
         return prompt
     
-    def _make_api_call(self, prompt: str) -> str:
+    def _sampling_params(self) -> dict:
+        """Return the sampling parameters of the next request, with the reasoning effort the budget allows."""
+        return {
+            "temperature": 0.1,
+            "max_tokens": 4000,
+            "reasoning": {
+                "effort": budget.reasoning_effort("medium"),
+                "exclude": True
+            }
+        }
+    
+    async def _make_api_call(self, prompt: str, sampling: dict) -> str:
         """
         Make API call to OpenRouter.
         
         Args:
             prompt: The prompt to send
+            sampling: Sampling parameters from _sampling_params()
             
         Returns:
             Response content from the API
@@ -331,16 +379,15 @@ Important: Evaluate all three dimensions and use only the specified categories.
                     "content": prompt
                 }
             ],
-            "temperature": 0.1,
-            "max_tokens": 4000,
-            "reasoning": {
-                "effort": "medium",
-                "exclude": True
+            **sampling,
+            # Report token usage and cost in the response, for the LLM budget
+            "usage": {
+                "include": True
             }
         }
         
         try:
-            response = requests.post(
+            response = await http_client.apost(
                 url, 
                 headers=headers, 
                 json=payload, 
@@ -349,6 +396,11 @@ Important: Evaluate all three dimensions and use only the specified categories.
             response.raise_for_status()
             
             response_data = response.json()
+            budget.record_usage('llm_scoring', self.config['model'], response_data.get('usage'))
+            usage = response_data.get('usage') or {}
+            tracer.annotate_current(**{'llm.model': self.config['model'],
+                                       'llm.prompt_tokens': usage.get('prompt_tokens'),
+                                       'llm.completion_tokens': usage.get('completion_tokens')})
             
             if 'choices' not in response_data or not response_data['choices']:
                 raise Exception("No choices in API response")
@@ -359,9 +411,9 @@ Important: Evaluate all three dimensions and use only the specified categories.
             
             return content
             
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             raise Exception("API request timed out")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"API request failed: {str(e)}")
         except json.JSONDecodeError:
             raise Exception("Invalid JSON in API response")
@@ -500,3 +552,16 @@ def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
     """
     processor = LLMScoring(config)
     return processor.run(papers)
+
+def build_stage(config: dict) -> Stage:
+    """
+    Build the streaming executor stage for the LLM scoring module.
+    
+    Args:
+        config: Configuration dictionary with LLM scoring parameters
+        
+    Returns:
+        Stage definition for the streaming executor
+    """
+    processor = LLMScoring(config)
+    return processor.build_stage()
@@ -6,17 +6,24 @@ It processes papers that have passed the embedding similarity threshold and gets
 detailed relevance assessments with justifications from an LLM.
 """
 
+import itertools
 import logging
 import json
 import os
-import time
 import random
-import requests
+import httpx
 import xml.etree.ElementTree as ET
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Semaphore
 from typing import Dict, List, Optional
 from paper import Paper
+from executor import Stage, run_stage
+import http_client
+import rate_limiter
+from budget import budget
+from retry_queue import retry_queue, is_retryable
+from run_report import external_call, record_retry
+from structured_logging import success_log
+from tracing import tracer
+from stage_cache import stage_cache
 
 logger = logging.getLogger('LLM_VALIDATION')
 
@@ -40,9 +47,6 @@ class LLMValidation:
         
         self.api_key = api_key
         
-        # Initialize semaphore for concurrency control
-        self.semaphore = Semaphore(config['max_workers'])
-        
         # Topic descriptions for prompt building
         self.topic_descriptions = {
             "Agentic Artificial Intelligence": "Agentic AI and Agentic Workflows - Systems where autonomous AI agents, typically powered by large language models, can perceive high-level goals, decompose them into subtasks, use external tools like APIs or code execution, and orchestrate multi-step workflows with minimal human intervention. Key features include task decomposition, tool use, planning modules, and often hierarchical multi-agent coordination. If the system is just a chatbot or single-prompt LLM without autonomous planning and tool use, it is not agentic AI.",
@@ -74,36 +78,8 @@ class LLMValidation:
         
         logger.info(f"Processing {len(papers_to_process)} papers for LLM validation using {self.config['max_workers']} workers")
         
-        # Step 2: Process papers in parallel batches
-        batch_size = self.config['batch_size']
-        batches = [papers_to_process[i:i + batch_size] for i in range(0, len(papers_to_process), batch_size)]
-        
-        total_processed = 0
-        for batch_num, batch in enumerate(batches, 1):
-            logger.info(f"Processing batch {batch_num}/{len(batches)} with {len(batch)} papers")
-            
-            # Process batch in parallel
-            with ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
-                # Submit all papers in the batch
-                future_to_paper = {
-                    executor.submit(self._process_paper_with_retry_wrapper, paper, total_processed + i + 1, len(papers_to_process)): paper
-                    for i, paper in enumerate(batch)
-                }
-                
-                # Collect results as they complete
-                for future in as_completed(future_to_paper):
-                    paper = future_to_paper[future]
-                    try:
-                        future.result()  # This will raise any exception that occurred
-                    except Exception as e:
-                        logger.error(f"Unexpected error processing paper {paper.id}: {e}")
-            
-            total_processed += len(batch)
-            
-            # Rate limiting between batches (not individual papers)
-            if batch_num < len(batches):  # Don't delay after last batch
-                delay = self.config['rate_limit_delay'] + random.uniform(0, self.config['jitter'])
-                time.sleep(delay)
+        # Step 2: Process papers concurrently, max_workers at a time
+        run_stage(self.build_stage(), {paper.id: paper for paper in papers_to_process})
         
         # Step 3: Log summary statistics
         completed_count = sum(1 for p in papers.values() if p.llm_validation_status == "completed")
@@ -124,7 +100,6 @@ class LLMValidation:
             List of papers that need validation
         """
         papers_to_process = []
-        threshold = self.config['similarity_threshold']
         
         # Counters for detailed logging
         no_embedding_data = 0
@@ -132,41 +107,17 @@ class LLMValidation:
         no_topics_above_threshold = 0
         
         for paper in papers.values():
+            skip_reason = self._classify_for_validation(paper)
+            
             # Check specific skip reasons for detailed logging
-            if not paper.is_embedding_completed():
+            if skip_reason == "no_embedding_data":
                 no_embedding_data += 1
-                continue
-            
-            if paper.llm_validation_status in ["completed", "failed"]:
+            elif skip_reason == "already_validated":
                 already_validated += 1
-                continue
-            
-            # Check if any topic scores are above threshold
-            topic_scores = {
-                'Agentic Artificial Intelligence': paper.agentic_ai_score,
-                'Proximal Policy Optimization': paper.proximal_policy_optimization_score,
-                'Reinforcement Learning': paper.reinforcement_learning_score,
-                'Reasoning Models': paper.reasoning_models_score,
-                'Inference Time Scaling': paper.inference_time_scaling_score
-            }
-            
-            above_threshold_topics = [
-                topic for topic, score in topic_scores.items()
-                if score is not None and score >= threshold
-            ]
-            
-            if above_threshold_topics:
-                # Set below-threshold topics to "below_threshold" justification
-                self._set_below_threshold_justifications(paper, topic_scores, threshold)
-                papers_to_process.append(paper)
-                
-                logger.debug(f"Paper {paper.id} needs validation for topics: {', '.join(above_threshold_topics)}")
-            else:
-                # All topics below threshold, set all justifications and mark as completed
-                self._set_all_below_threshold(paper)
-                paper.update_llm_validation_status("completed")
+            elif skip_reason == "no_topics_above_threshold":
                 no_topics_above_threshold += 1
-                logger.debug(f"Paper {paper.id} has no topics above threshold, marked as completed")
+            else:
+                papers_to_process.append(paper)
         
         # Log detailed skip statistics
         total_skipped = no_embedding_data + already_validated + no_topics_above_threshold
@@ -183,6 +134,82 @@ class LLMValidation:
         
         return papers_to_process
     
+    def _classify_for_validation(self, paper: Paper) -> Optional[str]:
+        """
+        Decide whether a single paper needs LLM validation.
+        
+        Papers with no topic above the threshold are marked as completed here,
+        and below-threshold justifications are filled in for papers that proceed.
+        
+        Args:
+            paper: Paper object to classify
+            
+        Returns:
+            None if the paper needs validation, otherwise the skip reason
+        """
+        threshold = self.config['similarity_threshold']
+        
+        if not paper.is_embedding_completed():
+            return "no_embedding_data"
+        
+        if paper.llm_validation_status in ["completed", "failed"]:
+            return "already_validated"
+        
+        # Check if any topic scores are above threshold
+        topic_scores = {
+            'Agentic Artificial Intelligence': paper.agentic_ai_score,
+            'Proximal Policy Optimization': paper.proximal_policy_optimization_score,
+            'Reinforcement Learning': paper.reinforcement_learning_score,
+            'Reasoning Models': paper.reasoning_models_score,
+            'Inference Time Scaling': paper.inference_time_scaling_score
+        }
+        
+        above_threshold_topics = [
+            topic for topic, score in topic_scores.items()
+            if score is not None and score >= threshold
+        ]
+        
+        if above_threshold_topics:
+            # Set below-threshold topics to "below_threshold" justification
+            self._set_below_threshold_justifications(paper, topic_scores, threshold)
+            logger.debug(f"Paper {paper.id} needs validation for topics: {', '.join(above_threshold_topics)}")
+            return None
+        
+        # All topics below threshold, set all justifications and mark as completed
+        self._set_all_below_threshold(paper)
+        paper.update_llm_validation_status("completed")
+        logger.debug(f"Paper {paper.id} has no topics above threshold, marked as completed")
+        return "no_topics_above_threshold"
+    
+    def build_stage(self) -> Stage:
+        """
+        Build the streaming executor stage for LLM validation.
+        
+        Each worker validates one paper at a time, so at most max_workers
+        requests are in flight.
+        
+        Returns:
+            Stage definition for the streaming executor
+        """
+        counter = itertools.count(1)
+        
+        async def process(papers: List[Paper]) -> None:
+            try:
+                for paper in papers:
+                    # Papers refused by the budget are deferred until the budget opens again
+                    if await budget.allow('llm_validation', paper):
+                        await self._process_paper_with_retry(paper, f"Paper {next(counter)}")
+            finally:
+                await stage_cache.aflush()
+        
+        return Stage(
+            name='llm_validation',
+            process=process,
+            select=lambda paper: self._classify_for_validation(paper) is None,
+            depends_on=('embedding_similarity',),
+            max_workers=self.config['max_workers']
+        )
+    
     def _set_below_threshold_justifications(self, paper: Paper, topic_scores: Dict[str, Optional[float]], threshold: float) -> None:
         """Set justifications for topics below threshold."""
         below_threshold_justification = "below_threshold"
@@ -207,58 +234,43 @@ class LLMValidation:
         paper.reasoning_models_justification = below_threshold_justification
         paper.inference_time_scaling_justification = below_threshold_justification
     
-    def _process_paper_with_retry_wrapper(self, paper: Paper, paper_index: int, total_papers: int) -> None:
+    async def _process_paper_with_retry(self, paper: Paper, progress: str) -> None:
         """
-        Wrapper for parallel processing that handles semaphore acquisition.
+        Process a single paper, deferring it to the retry queue if it fails.
         
-        Args:
-            paper: Paper object to process
-            paper_index: Current paper index (1-based)
-            total_papers: Total number of papers being processed
-        """
-        with self.semaphore:  # Acquire semaphore to limit concurrent API calls
-            self._process_paper_with_retry(paper, paper_index, total_papers)
-    
-    def _process_paper_with_retry(self, paper: Paper, paper_index: int, total_papers: int) -> None:
-        """
-        Process a single paper with retry logic.
+        Any failure except a non-retryable HTTP status is retried, since a
+        malformed model response usually succeeds on the next attempt.
         
         Args:
             paper: Paper object to process
-            paper_index: Current paper index (1-based)
-            total_papers: Total number of papers being processed
+            progress: Progress label used in log lines (e.g. "Paper 3/10")
         """
         max_retries = self.config['max_retries']
         
-        for attempt in range(max_retries + 1):
-            try:
-                validated_topics = self._process_single_paper(paper)
-                paper.update_llm_validation_status("completed")
-                logger.info(f"Paper {paper_index}/{total_papers}: {paper.id} - LLM validation SUCCESS for topics: {', '.join(validated_topics)}")
+        try:
+            validated_topics = await self._process_single_paper(paper)
+            paper.update_llm_validation_status("completed")
+            await retry_queue.aresolve('llm_validation', paper.id)
+            success_log.paper_succeeded(logger, 'llm_validation', paper.id,
+                                        f"{progress}: {paper.id} - LLM validation SUCCESS for topics: {', '.join(validated_topics)}",
+                                        topics=validated_topics)
+            
+        except Exception as e:
+            error_msg = str(e)
+            
+            # A 429 has already paused the host in the rate limiter; the retry
+            # waits for it when acquiring its request slot
+            if await retry_queue.adefer('llm_validation', paper.id, e, max_retries,
+                                        lambda retry: (2 ** retry) + random.uniform(0, 1),
+                                        retryable=is_retryable(e, default=True)):
+                record_retry('openrouter', [paper.id])
                 return
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check for rate limiting (429 error) and add extra delay
-                if "429" in error_msg or "rate limit" in error_msg.lower():
-                    extra_delay = random.uniform(1.0, 3.0)
-                    logger.warning(f"Paper {paper_index}/{total_papers}: {paper.id} - rate limited, waiting {extra_delay:.1f}s")
-                    time.sleep(extra_delay)
-                
-                if attempt == max_retries:
-                    # Final attempt failed
-                    paper.update_llm_validation_status("failed")
-                    paper.add_error(f"LLM validation failed after {max_retries + 1} attempts: {error_msg}")
-                    logger.error(f"Paper {paper_index}/{total_papers}: {paper.id} - LLM validation FAILED after all retries: {error_msg}")
-                else:
-                    # Log retry attempt
-                    logger.warning(f"Paper {paper_index}/{total_papers}: {paper.id} - attempt {attempt + 1}/{max_retries + 1} FAILED: {error_msg}")
-                    # Wait before retry with exponential backoff
-                    retry_delay = (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(retry_delay)
+            
+            paper.update_llm_validation_status("failed")
+            paper.add_error(f"LLM validation failed: {error_msg}")
+            logger.error(f"{progress}: {paper.id} - LLM validation FAILED: {error_msg}")
     
-    def _process_single_paper(self, paper: Paper) -> List[str]:
+    async def _process_single_paper(self, paper: Paper) -> List[str]:
         """
         Process a single paper through LLM validation.
         
@@ -282,11 +294,23 @@ class LLMValidation:
         # Step 2: Build prompt
         prompt = self._build_validation_prompt(paper, topics_to_validate)
         
-        # Step 3: Make API call
-        response_content = self._make_api_call(prompt)
+        # Step 3: Make API call, unless this exact prompt was answered before
+        # The budget may lower the reasoning effort, so the sampling parameters are part of the key
+        sampling = self._sampling_params()
+        cache_key = stage_cache.key('llm_validation', self.config['model'], json.dumps(sampling, sort_keys=True), prompt)
+        response_content = await stage_cache.aget('llm_validation', cache_key)
+        cached = response_content is not None
+        if cached:
+            logger.debug(f"{paper.id} - Reusing cached response")
+        else:
+            await rate_limiter.acquire(self.config['api_base_url'], 'openrouter', [paper.id])
+            with external_call('openrouter', [paper.id]):
+                response_content = await self._make_api_call(prompt, sampling)
         
         # Step 4: Parse and validate response
         validation_results = self._parse_xml_response(response_content, topics_to_validate)
+        if not cached:
+            stage_cache.put('llm_validation', cache_key, response_content)
         
         # Step 5: Update paper object
         self._update_paper_with_results(paper, validation_results)
@@ -361,12 +385,24 @@ Important: Ensure you evaluate ALL {len(topics_to_validate)} topics listed and u
         
         return prompt
     
-    def _make_api_call(self, prompt: str) -> str:
+    def _sampling_params(self) -> dict:
+        """Return the sampling parameters of the next request, with the reasoning effort the budget allows."""
+        return {
+            "temperature": 0.1,
+            "max_tokens": 4000,
+            "reasoning": {
+                "effort": budget.reasoning_effort("medium"),
+                "exclude": True
+            }
+        }
+    
+    async def _make_api_call(self, prompt: str, sampling: dict) -> str:
         """
         Make API call to OpenRouter.
         
         Args:
             prompt: The prompt to send
+            sampling: Sampling parameters from _sampling_params()
             
         Returns:
             Response content from the API
@@ -389,16 +425,15 @@ Important: Ensure you evaluate ALL {len(topics_to_validate)} topics listed and u
                     "content": prompt
                 }
             ],
-            "temperature": 0.1,
-            "max_tokens": 4000,
-            "reasoning": {
-                "effort": "medium",
-                "exclude": True
+            **sampling,
+            # Report token usage and cost in the response, for the LLM budget
+            "usage": {
+                "include": True
             }
         }
         
         try:
-            response = requests.post(
+            response = await http_client.apost(
                 url, 
                 headers=headers, 
                 json=payload, 
@@ -407,6 +442,11 @@ Important: Ensure you evaluate ALL {len(topics_to_validate)} topics listed and u
             response.raise_for_status()
             
             response_data = response.json()
+            budget.record_usage('llm_validation', self.config['model'], response_data.get('usage'))
+            usage = response_data.get('usage') or {}
+            tracer.annotate_current(**{'llm.model': self.config['model'],
+                                       'llm.prompt_tokens': usage.get('prompt_tokens'),
+                                       'llm.completion_tokens': usage.get('completion_tokens')})
             
             if 'choices' not in response_data or not response_data['choices']:
                 raise Exception("No choices in API response")
@@ -417,9 +457,9 @@ Important: Ensure you evaluate ALL {len(topics_to_validate)} topics listed and u
             
             return content
             
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             raise Exception("API request timed out")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"API request failed: {str(e)}")
         except json.JSONDecodeError:
             raise Exception("Invalid JSON in API response")
@@ -547,3 +587,16 @@ def run(papers: Dict[str, Paper], config: dict) -> Dict[str, Paper]:
     """
     processor = LLMValidation(config)
     return processor.run(papers)
+
+def build_stage(config: dict) -> Stage:
+    """
+    Build the streaming executor stage for the LLM validation module.
+    
+    Args:
+        config: Configuration dictionary with LLM validation parameters
+        
+    Returns:
+        Stage definition for the streaming executor
+    """
+    processor = LLMValidation(config)
+    return processor.build_stage()
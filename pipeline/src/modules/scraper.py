@@ -1,8 +1,6 @@
-import time
+import asyncio
 import random
 import logging
-import urllib.parse
-import urllib.request
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -10,6 +8,10 @@ from typing import Dict, List, Optional
 import config
 from paper import Paper
 from database import PaperDatabase
+import http_client
+import rate_limiter
+from retry_queue import is_retryable
+from run_report import external_call, record_retry, async_timed_sleep, SLEEP_BACKOFF
 
 logger = logging.getLogger('SCRAPER')
 
@@ -196,9 +198,9 @@ class ArxivScraper:
         'stat.TH': 'stat.TH (Statistics Theory)',
     }
     
-    def __init__(self):
+    def __init__(self, db: Optional[PaperDatabase] = None):
         self.config = config.ARXIV
-        self.db = PaperDatabase()
+        self.db = db or PaperDatabase()
         self.session_stats = {
             'successfully_scraped': 0,
             'scraping_failed': 0,
@@ -206,7 +208,7 @@ class ArxivScraper:
             'retries': 0
         }
 
-    def run(self, run_mode: str, run_value: str) -> Dict[str, Paper]:
+    async def run(self, run_mode: str, run_value: str) -> Dict[str, Paper]:
         """
         Main entry point for the date-based scraper.
         
@@ -227,7 +229,7 @@ class ArxivScraper:
         logger.info(f"Starting date-based scraping for {run_value}")
 
         # Step 1: Fetch all papers in single query
-        xml_response = self._fetch_papers_for_date(run_value)
+        xml_response = await self._fetch_papers_for_date(run_value)
 
         # Step 2: Extract IDs and check limits
         paper_ids = self._extract_paper_ids(xml_response)
@@ -235,10 +237,10 @@ class ArxivScraper:
         self._check_paper_limit(len(paper_ids))
         
         # Step 3: Load cached papers and build runtime dict
-        runtime_dict = self._load_cached_papers(paper_ids)
+        runtime_dict = await asyncio.to_thread(self._load_cached_papers, paper_ids)
         
         # Step 4: Extract metadata for missing papers
-        complete_dict = self._extract_metadata_for_missing_papers(xml_response, runtime_dict)
+        complete_dict = await asyncio.to_thread(self._extract_metadata_for_missing_papers, xml_response, runtime_dict)
         
         # Step 5: Clean up categories to keep only arXiv format
         complete_dict = self._clean_arxiv_categories(complete_dict)
@@ -276,7 +278,7 @@ class ArxivScraper:
         logger.debug(f"Built search query: {query}")
         return query
 
-    def _fetch_papers_for_date(self, date_str: str) -> str:
+    async def _fetch_papers_for_date(self, date_str: str) -> str:
         """
         Fetch all papers for given date with retry logic.
 
@@ -290,15 +292,23 @@ class ArxivScraper:
             Exception: If all retry attempts fail
         """
         search_query = self._build_date_search_query(date_str)
-        url = f"https://export.arxiv.org/api/query?search_query={search_query}&max_results=1001"
+        # One more result than the limit, so _check_paper_limit can detect overflow
+        max_results = self.config['max_paper_limit'] + 1
+        url = f"{self.config['api_base_url']}?search_query={search_query}&max_results={max_results}"
         
         logger.info(f"Fetching papers for date {date_str}")
-        return self._make_api_request(url)
+        return await self._make_api_request(url)
 
-    def _make_api_request(self, url: str) -> str:
+    async def _make_api_request(self, url: str) -> str:
         """
         Make API request with exponential backoff retry logic.
         
+        The listing is requested per date, not per paper, and the date's shard
+        cannot proceed without it, so retryable failures are still retried here
+        with backoff. The wait holds only this shard's coroutine; other shards and
+        the stage workers keep going. Failures that are not retryable (see
+        retry_queue.is_retryable) raise right away.
+        
         Args:
             url: Complete URL to request
             
@@ -318,20 +328,25 @@ class ArxivScraper:
                 self.session_stats['api_calls'] += 1
                 logger.debug(f"API request attempt {attempt + 1}/{max_retries + 1}: {url}")
                 
-                with urllib.request.urlopen(url, timeout=30) as response:
-                    return response.read().decode('utf-8')
+                # The limiter spaces requests across every concurrent date shard
+                await rate_limiter.acquire(url, 'arxiv_api')
+                with external_call('arxiv_api'):
+                    response = await http_client.aget(url, timeout=30)
+                    response.raise_for_status()
+                    return response.content.decode('utf-8')
                     
             except Exception as e:
-                if attempt < max_retries:
+                if attempt < max_retries and is_retryable(e):
                     self.session_stats['retries'] += 1
                     wait_time = base_wait * (backoff_factor ** attempt)
                     actual_wait = wait_time + random.uniform(-jitter, jitter)
                     actual_wait = max(0, actual_wait)
                     
                     logger.warning(f"API request failed (attempt {attempt + 1}), retrying in {actual_wait:.1f}s: {e}")
-                    time.sleep(actual_wait)
+                    record_retry('arxiv_api')
+                    await async_timed_sleep(actual_wait, 'arxiv_api', SLEEP_BACKOFF)
                 else:
-                    logger.error(f"API request failed after {max_retries + 1} attempts: {e}")
+                    logger.error(f"API request failed after {attempt + 1} attempts: {e}")
                     raise
 
     def _extract_paper_ids(self, xml_response: str) -> List[str]:
@@ -659,9 +674,9 @@ class ArxivScraper:
                     
                     cleaned_count += 1
                     
-                    logger.info(f"Processed categories for paper {paper_id}: "
-                               f"enhanced {paper_enhanced_count} valid categories, "
-                               f"removed {len(removed_categories)} invalid categories: {removed_categories}")
+                    logger.debug(f"Processed categories for paper {paper_id}: "
+                                f"enhanced {paper_enhanced_count} valid categories, "
+                                f"removed {len(removed_categories)} invalid categories: {removed_categories}")
                 elif paper_enhanced_count > 0:
                     logger.debug(f"Enhanced categories for paper {paper_id}: {enhanced_categories}")
         
@@ -685,16 +700,32 @@ class ArxivScraper:
         logger.info(f"  Retries: {self.session_stats['retries']}")
 
 
-def run(run_mode: str, run_value: str) -> Dict[str, Paper]:
+def run(run_mode: str, run_value: str, db: Optional[PaperDatabase] = None) -> Dict[str, Paper]:
     """
     Main entry point for the scraper module.
     
     Args:
         run_mode: Must be 'date'
         run_value: Date string (YYYY-MM-DD)
+        db: Optional shared database handle
+        
+    Returns:
+        Dictionary of paper_id -> Paper objects
+    """
+    return asyncio.run(run_async(run_mode, run_value, db))
+
+
+async def run_async(run_mode: str, run_value: str, db: Optional[PaperDatabase] = None) -> Dict[str, Paper]:
+    """
+    Event-loop entry point for the scraper module, used by the pipeline.
+    
+    Args:
+        run_mode: Must be 'date'
+        run_value: Date string (YYYY-MM-DD)
+        db: Optional shared database handle
         
     Returns:
         Dictionary of paper_id -> Paper objects
     """
-    scraper = ArxivScraper()
-    return scraper.run(run_mode, run_value)
\ No newline at end of file
+    scraper = ArxivScraper(db)
+    return await scraper.run(run_mode, run_value)
\ No newline at end of file
@@ -9,8 +9,9 @@ import logging
 import os
 from typing import Dict, List
 from datetime import datetime
-import requests
+import httpx
 from paper import Paper
+import http_client
 
 logger = logging.getLogger('SLACK')
 
@@ -126,7 +127,7 @@ def send_slack_message(runtime_paper_dict: Dict[str, Paper]) -> bool:
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = http_client.post(url, json=payload, headers=headers, timeout=30)
         response.raise_for_status()
         
         response_data = response.json()
@@ -137,7 +138,7 @@ def send_slack_message(runtime_paper_dict: Dict[str, Paper]) -> bool:
             logger.warning(f"Slack API error: {response_data.get('error', 'Unknown error')}")
             return False
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.warning(f"Failed to send Slack notification: {e}")
         return False
     except Exception as e:
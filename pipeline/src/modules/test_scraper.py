@@ -1,7 +1,9 @@
+import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 from .scraper import ArxivScraper
 from paper import Paper
+from database import PaperDatabase
 
 logger = logging.getLogger('SCRAPER')
 
@@ -15,7 +17,7 @@ class TestScraper(ArxivScraper):
     in the initial paper discovery method.
     """
     
-    def run(self, run_mode: str, run_value: str) -> Dict[str, Paper]:
+    async def run(self, run_mode: str, run_value: str) -> Dict[str, Paper]:
         """
         Main entry point for the test scraper.
         
@@ -36,7 +38,7 @@ class TestScraper(ArxivScraper):
         logger.info(f"Starting test-based scraping from file {run_value}")
         
         # Step 1: Fetch papers by IDs from test file
-        xml_response = self._fetch_papers_from_file(run_value)
+        xml_response = await self._fetch_papers_from_file(run_value)
         
         # Step 2: Extract IDs and check limits
         paper_ids = self._extract_paper_ids(xml_response)
@@ -44,17 +46,17 @@ class TestScraper(ArxivScraper):
         self._check_paper_limit(len(paper_ids))
         
         # Step 3: Load cached papers and build runtime dict
-        runtime_dict = self._load_cached_papers(paper_ids)
+        runtime_dict = await asyncio.to_thread(self._load_cached_papers, paper_ids)
         
         # Step 4: Extract metadata for missing papers
-        complete_dict = self._extract_metadata_for_missing_papers(xml_response, runtime_dict)
+        complete_dict = await asyncio.to_thread(self._extract_metadata_for_missing_papers, xml_response, runtime_dict)
         
         # Step 5: Clean up categories to keep only arXiv format
         complete_dict = self._clean_arxiv_categories(complete_dict)
         
         return complete_dict
     
-    def _fetch_papers_from_file(self, file_path: str) -> str:
+    async def _fetch_papers_from_file(self, file_path: str) -> str:
         """
         Fetch papers by IDs from a test file.
         
@@ -78,22 +80,38 @@ class TestScraper(ArxivScraper):
         # Build query for specific paper IDs
         id_queries = [f"id:{paper_id}" for paper_id in paper_ids]
         search_query = f"({'+OR+'.join(id_queries)})"
-        url = f"http://export.arxiv.org/api/query?search_query={search_query}&max_results={len(paper_ids) + 10}"
+        url = f"{self.config['api_base_url']}?search_query={search_query}&max_results={len(paper_ids) + 10}"
         
         logger.info(f"Fetching {len(paper_ids)} papers from test file")
-        return self._make_api_request(url)
+        return await self._make_api_request(url)
 
 
-def run(run_mode: str, run_value: str) -> Dict[str, Paper]:
+def run(run_mode: str, run_value: str, db: Optional[PaperDatabase] = None) -> Dict[str, Paper]:
     """
     Main entry point for the test scraper module.
     
     Args:
         run_mode: Must be 'test'
         run_value: Path to text file containing arXiv IDs
+        db: Optional shared database handle
         
     Returns:
         Dictionary of paper_id -> Paper objects
     """
-    scraper = TestScraper()
-    return scraper.run(run_mode, run_value)
\ No newline at end of file
+    return asyncio.run(run_async(run_mode, run_value, db))
+
+
+async def run_async(run_mode: str, run_value: str, db: Optional[PaperDatabase] = None) -> Dict[str, Paper]:
+    """
+    Event-loop entry point for the test scraper module, used by the pipeline.
+    
+    Args:
+        run_mode: Must be 'test'
+        run_value: Path to text file containing arXiv IDs
+        db: Optional shared database handle
+        
+    Returns:
+        Dictionary of paper_id -> Paper objects
+    """
+    scraper = TestScraper(db)
+    return await scraper.run(run_mode, run_value)
\ No newline at end of file
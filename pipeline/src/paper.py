@@ -1,7 +1,69 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+import logging
+import threading
+from dataclasses import MISSING, dataclass, field, fields
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 
+# Guards the per-paper dirty-field sets, which are written by stage workers
+# and drained by the database layer from other threads
+_DIRTY_LOCK = threading.Lock()
+
+# Guards creating the per-paper locks that order releasing heavy fields
+# (checkpoint writer thread) against reading them back
+_SPILL_LOCK = threading.Lock()
+
+logger = logging.getLogger('PAPER')
+
+# Large text fields only the stages that produce or read them need. Once a paper
+# has left the stages and is saved, they are released from memory and read back
+# from the database on the next access (see Paper.release_heavy_fields).
+HEAVY_FIELDS = (
+    'abstract', 'introduction_text', 'summary',
+    'agentic_ai_justification', 'proximal_policy_optimization_justification',
+    'reinforcement_learning_justification', 'reasoning_models_justification',
+    'inference_time_scaling_justification',
+    'novelty_justification', 'impact_justification', 'recommendation_justification'
+)
+
+# Fields each processing stage produces, status field first. Resetting a stage
+# returns them to their defaults, so the stage selects the paper again.
+STAGE_FIELDS = {
+    'intro_extractor': (
+        'intro_status', 'introduction_text', 'intro_extraction_method', 'tex_file_name'
+    ),
+    'embedding_similarity': (
+        'embedding_status', 'agentic_ai_score', 'proximal_policy_optimization_score',
+        'reinforcement_learning_score', 'reasoning_models_score', 'inference_time_scaling_score'
+    ),
+    'llm_validation': (
+        'llm_validation_status', 'agentic_ai_relevance', 'proximal_policy_optimization_relevance',
+        'reinforcement_learning_relevance', 'reasoning_models_relevance', 'inference_time_scaling_relevance',
+        'agentic_ai_justification', 'proximal_policy_optimization_justification',
+        'reinforcement_learning_justification', 'reasoning_models_justification',
+        'inference_time_scaling_justification'
+    ),
+    'llm_scoring': (
+        'llm_score_status', 'summary', 'novelty_score', 'novelty_justification', 'impact_score',
+        'impact_justification', 'recommendation_score', 'recommendation_justification'
+    ),
+    'h_index_fetching': (
+        'h_index_status', 'semantic_scholar_url', 'h_index_fetch_method', 'total_authors', 'authors_found',
+        'highest_h_index', 'average_h_index', 'notable_authors_count', 'author_h_indexes'
+    )
+}
+
+# Status a stage leaves a paper in when it fails it
+STAGE_FAILED_STATUS = {
+    'intro_extractor': 'extraction_failed',
+    'embedding_similarity': 'failed',
+    'llm_validation': 'failed',
+    'llm_scoring': 'failed',
+    'h_index_fetching': 'failed'
+}
+
+# Loads the given columns of a paper by ID: (paper_id, field_names) -> {field_name: value}
+HeavyFieldLoader = Callable[[str, Tuple[str, ...]], Dict[str, Any]]
+
 
 @dataclass
 class AuthorHIndex:
@@ -18,6 +80,10 @@ class Paper:
     
     This class serves as the core data structure that flows through the entire pipeline,
     with each module potentially adding or modifying fields as processing progresses.
+    
+    Every assignment to a field is recorded as a dirty field, so the database layer
+    can persist only what changed since the last save. A newly constructed paper is
+    entirely dirty; papers loaded from the database start clean.
     """
     
     # Core arXiv metadata
@@ -91,9 +157,135 @@ class Paper:
     updated_at: datetime = field(default_factory=datetime.now)
     last_generated: Optional[str] = None  # YYYY-MM-DD format for cache cleanup
     
+    def __setattr__(self, name: str, value) -> None:
+        """Set an attribute, recording persisted fields as dirty."""
+        object.__setattr__(self, name, value)
+        if name in PAPER_FIELDS:
+            with _DIRTY_LOCK:
+                self.__dict__.setdefault('_dirty_fields', set()).add(name)
+    
+    def dirty_fields(self) -> Set[str]:
+        """Return the names of fields changed since the last save."""
+        with _DIRTY_LOCK:
+            return set(self.__dict__.get('_dirty_fields', ()))
+    
+    def has_unsaved_changes(self) -> bool:
+        """Check if any field changed since the last save."""
+        with _DIRTY_LOCK:
+            return bool(self.__dict__.get('_dirty_fields'))
+    
+    def take_dirty_fields(self) -> Set[str]:
+        """Return the dirty field names and mark the paper clean in one step."""
+        with _DIRTY_LOCK:
+            return self.__dict__.pop('_dirty_fields', set())
+    
+    def mark_dirty(self, field_names: Iterable[str]) -> None:
+        """Mark fields as changed, e.g. after an in-place mutation or a failed save."""
+        with _DIRTY_LOCK:
+            self.__dict__.setdefault('_dirty_fields', set()).update(field_names)
+    
+    def mark_clean(self) -> None:
+        """Forget all recorded changes (used after loading from the database)."""
+        with _DIRTY_LOCK:
+            self.__dict__.pop('_dirty_fields', None)
+    
+    def release_heavy_fields(self, loader: HeavyFieldLoader) -> int:
+        """
+        Drop saved heavy fields from memory until they are next read.
+        
+        Only fields without unsaved changes are released; reading one of them
+        loads all released fields back through the loader.
+        
+        Args:
+            loader: Reads the released fields back from the database
+            
+        Returns:
+            Number of fields released
+        """
+        with self._spill_lock(), _DIRTY_LOCK:
+            dirty = self.__dict__.get('_dirty_fields', ())
+            released = [name for name in HEAVY_FIELDS if name in self.__dict__ and name not in dirty]
+            if not released:
+                return 0
+            self.__dict__.setdefault('_spilled', set()).update(released)
+            self.__dict__['_loader'] = loader
+            for name in released:
+                del self.__dict__[name]
+        return len(released)
+    
+    def has_released_fields(self) -> bool:
+        """Check if heavy fields are released and would be read from the database on access."""
+        return bool(self.__dict__.get('_spilled'))
+    
+    def restore_heavy_fields(self) -> int:
+        """
+        Read all released heavy fields back from the database.
+        
+        This runs a blocking query, so async code calls it through
+        asyncio.to_thread before handing the paper to a stage. Fields whose
+        row is no longer in the database keep their defaults.
+        
+        Returns:
+            Number of fields restored
+        """
+        with self._spill_lock():
+            spilled = self.__dict__.get('_spilled')
+            if not spilled:
+                return 0
+            values = self.__dict__['_loader'](self.id, tuple(spilled))
+            if not values:
+                logger.warning(f"Paper {self.id} is no longer in the database, "
+                               f"released fields keep their defaults: {', '.join(sorted(spilled))}")
+            # Restored as saved, so they are not dirty
+            for field_name in spilled:
+                if field_name in values:
+                    self.__dict__[field_name] = values[field_name]
+            restored = len(spilled)
+            spilled.clear()
+            return restored
+    
+    def _load_spilled(self, name: str, default: Any) -> Any:
+        """Return a heavy field that is not in memory, reading released fields back first."""
+        self.restore_heavy_fields()
+        return self.__dict__.get(name, default)
+    
+    def _spill_lock(self) -> threading.Lock:
+        """Return the lock ordering this paper's heavy field release, reads and writes."""
+        lock = self.__dict__.get('_heavy_lock')
+        if lock is None:
+            with _SPILL_LOCK:
+                lock = self.__dict__.setdefault('_heavy_lock', threading.Lock())
+        return lock
+    
+    def reset_stages(self, stages: Iterable[str]) -> None:
+        """
+        Return the fields produced by the given stages to their defaults.
+        
+        Args:
+            stages: Stage names (keys of STAGE_FIELDS)
+        """
+        defaults = {f.name: f for f in fields(self)}
+        for stage in stages:
+            for name in STAGE_FIELDS[stage]:
+                default = defaults[name]
+                setattr(self, name, default.default_factory() if default.default is MISSING else default.default)
+        self.updated_at = datetime.now()
+    
+    def fail_stage(self, stage: str, error_message: str) -> None:
+        """
+        Mark a stage failed for this paper and record why.
+        
+        Args:
+            stage: Stage name (key of STAGE_FIELDS)
+            error_message: Error added to the paper's error list
+        """
+        setattr(self, STAGE_FIELDS[stage][0], STAGE_FAILED_STATUS[stage])
+        self.add_error(error_message)
+    
     def add_error(self, error_message: str) -> None:
         """Add an error message to the paper's error list."""
         self.errors.append(error_message)
+        self.mark_dirty(['errors'])
         self.updated_at = datetime.now()
     
     def update_scraper_status(self, new_status: str) -> None:
@@ -159,16 +351,39 @@ class Paper:
     
     def has_highly_relevant_topic(self) -> bool:
         """Check if paper has at least one highly relevant, moderately relevant, or tangentially relevant topic."""
-        relevance_scores = [
+        relevance_scores = self.topic_relevances()
+        return ("Highly Relevant" in relevance_scores or 
+                "Moderately Relevant" in relevance_scores or 
+                "Tangentially Relevant" in relevance_scores)
+    
+    def highest_similarity_score(self) -> Optional[float]:
+        """Return the highest topic similarity score, or None if the paper has no embedding scores."""
+        scores = [
+            self.agentic_ai_score,
+            self.proximal_policy_optimization_score,
+            self.reinforcement_learning_score,
+            self.reasoning_models_score,
+            self.inference_time_scaling_score
+        ]
+        scores = [score for score in scores if score is not None]
+        return max(scores) if scores else None
+    
+    def topic_relevances(self) -> List[str]:
+        """Return the LLM relevance assessments of all topics."""
+        return [
             self.agentic_ai_relevance,
             self.proximal_policy_optimization_relevance,
             self.reinforcement_learning_relevance,
             self.reasoning_models_relevance,
             self.inference_time_scaling_relevance
         ]
-        return ("Highly Relevant" in relevance_scores or 
-                "Moderately Relevant" in relevance_scores or 
-                "Tangentially Relevant" in relevance_scores)
+    
+    def has_only_tangential_relevance(self) -> bool:
+        """Check if the paper's best LLM relevance assessment is Tangentially Relevant."""
+        relevance_scores = self.topic_relevances()
+        return ("Tangentially Relevant" in relevance_scores and
+                "Highly Relevant" not in relevance_scores and
+                "Moderately Relevant" not in relevance_scores)
     
     def update_h_index_status(self, new_status: str) -> None:
         """Update the paper's H-index fetching status."""
@@ -185,4 +400,36 @@ class Paper:
     
     def is_valuable_paper(self) -> bool:
         """Check if paper has Must Read or Should Read recommendation."""
-        return self.recommendation_score in ["Must Read", "Should Read"]
\ No newline at end of file
+        return self.recommendation_score in ["Must Read", "Should Read"]
+
+
+# Names of all persisted Paper fields, used for dirty-field tracking
+PAPER_FIELDS = frozenset(f.name for f in fields(Paper))
+
+
+class _HeavyField:
+    """Data descriptor for a heavy field, reading it back from the database after a release."""
+    
+    def __init__(self, name: str, default: Any):
+        self.name = name
+        self.default = default
+    
+    def __get__(self, paper: Optional[Paper], owner: type) -> Any:
+        if paper is None:
+            return self
+        try:
+            return paper.__dict__[self.name]
+        except KeyError:
+            return paper._load_spilled(self.name, self.default)
+    
+    def __set__(self, paper: Paper, value: Any) -> None:
+        with paper._spill_lock():
+            paper.__dict__[self.name] = value
+            spilled = paper.__dict__.get('_spilled')
+            if spilled:
+                spilled.discard(self.name)
+
+
+for _field in fields(Paper):
+    if _field.name in HEAVY_FIELDS:
+        setattr(Paper, _field.name, _HeavyField(_field.name, None if _field.default is MISSING else _field.default))
@@ -0,0 +1,265 @@
+"""
+Queue Service
+
+This module lets --worker processes on other hosts share the work queue (see
+work_queue.py) without opening the SQLite file. The database runs in WAL mode,
+whose shared-memory index does not work over network filesystems (NFS, SMB),
+so the file is only ever opened on the host that holds it.
+
+On that host, main.py --serve-queue runs a small HTTP service in front of the
+database. A remote worker (main.py --worker --queue-url URL) claims, renews,
+completes and releases its leases through it, loads the papers it claimed and
+writes their changed columns back, and stores its deferred retries, LLM usage
+and run history in the same database, so retry counts and the daily budget are
+shared with every other worker. Workers on the database host keep using the
+file directly.
+
+Lease expiry and retry due times are computed on the service's clock (remote
+workers send delays, not times), so worker clocks need not be in sync. Every
+request must carry the shared token from the WORK_QUEUE_TOKEN environment
+variable; the service refuses to start without one.
+
+Stage caches, JSON run reports and traces stay local to each worker's host.
+"""
+
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from database import DATABASE_READ_BATCH, DATABASE_WRITE_BATCH, PAPER_CODEC, PaperDatabase
+from paper import Paper
+
+logger = logging.getLogger('QUEUE_SERVICE')
+
+# Environment variable holding the token shared by the service and its workers
+TOKEN_ENV_VAR = 'WORK_QUEUE_TOKEN'
+
+
+class ServiceError(Exception):
+    """A queue service request failed or was rejected."""
+
+
+def service_token() -> str:
+    """
+    Return the shared queue service token.
+
+    Raises:
+        ValueError: If WORK_QUEUE_TOKEN is not set
+    """
+    token = os.getenv(TOKEN_ENV_VAR)
+    if not token:
+        raise ValueError(f"{TOKEN_ENV_VAR} environment variable is required for the queue service")
+    return token
+
+
+class QueueServiceClient:
+    """Thread-safe client of a queue service, used by remote workers."""
+
+    def __init__(self, url: str, token: str, timeout: float):
+        """
+        Initialize the client.
+
+        Args:
+            url: Base URL of the service (e.g. http://db-host:8765)
+            token: Shared token (see service_token)
+            timeout: Seconds a request may take
+        """
+        self.url = url.rstrip('/')
+        self._client = httpx.Client(timeout=timeout, headers={'Authorization': f"Bearer {token}"})
+
+    def call(self, operation: str, **params) -> Any:
+        """
+        Run an operation on the service.
+
+        Args:
+            operation: Operation name (see QueueService.operations)
+            **params: JSON-serializable parameters of the operation
+
+        Returns:
+            The operation's JSON-decoded result
+
+        Raises:
+            ServiceError: If the service could not be reached or the operation failed
+        """
+        try:
+            response = self._client.post(f"{self.url}/{operation}", json=params)
+        except httpx.HTTPError as e:
+            raise ServiceError(f"{operation} failed: {e}") from e
+        if response.status_code != 200:
+            raise ServiceError(f"{operation} failed with HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()['result']
+
+    def close(self) -> None:
+        """Close the client's connections."""
+        self._client.close()
+
+
+class RemoteWorkQueue:
+    """The WorkQueue interface used by Worker, backed by a queue service."""
+
+    def __init__(self, client: QueueServiceClient):
+        self.client = client
+
+    def claim(self, stage: str, owner: str, limit: int) -> List[str]:
+        """Lease up to limit papers pending for a stage (see WorkQueue.claim)."""
+        return self.client.call('claim', stage=stage, owner=owner, limit=limit)
+
+    def renew(self, owner: str) -> int:
+        """Extend every lease held by a worker (see WorkQueue.renew)."""
+        return self.client.call('renew', owner=owner)
+
+    def complete(self, stage: str, paper_ids: Sequence[str], owner: str) -> None:
+        """Mark leased papers done for a stage (see WorkQueue.complete)."""
+        self.client.call('complete', stage=stage, paper_ids=list(paper_ids), owner=owner)
+
+    def release(self, stage: str, paper_ids: Sequence[str], owner: str, error: Optional[str] = None,
+                not_before: Optional[float] = None) -> None:
+        """Return leased papers to the queue (see WorkQueue.release)."""
+        # Sent as a delay, so the not-before time holds on the service's clock
+        delay = None if not_before is None else max(0.0, not_before - time.time())
+        self.client.call('release', stage=stage, paper_ids=list(paper_ids), owner=owner, error=error, delay=delay)
+
+    def release_owner(self, owner: str) -> int:
+        """Return every paper leased by a stopping worker to the queue (see WorkQueue.release_owner)."""
+        return self.client.call('release_owner', owner=owner)
+
+
+class RemotePaperStore:
+    """The paper loading and saving of PaperDatabase used by Worker, backed by a queue service."""
+
+    def __init__(self, client: QueueServiceClient):
+        self.client = client
+
+    def load_papers(self, paper_ids: List[str]) -> Dict[str, Paper]:
+        """Load multiple papers through the service, DATABASE_READ_BATCH IDs per request."""
+        papers = {}
+        for start in range(0, len(paper_ids), DATABASE_READ_BATCH):
+            for row in self.client.call('load_rows', paper_ids=paper_ids[start:start + DATABASE_READ_BATCH]):
+                paper = PAPER_CODEC.decode(row)
+                papers[paper.id] = paper
+        logger.info(f"Loaded {len(papers)} papers from the queue service")
+        return papers
+
+    def save_papers(self, papers: Dict[str, Paper]) -> None:
+        """
+        Save the changed fields of multiple papers through the service.
+
+        Each request carries at most DATABASE_WRITE_BATCH papers, which the
+        service writes in a single transaction. Papers not written keep their
+        changes pending for the next save.
+        """
+        changes = [(paper, paper.take_dirty_fields()) for paper in papers.values()]
+        changes = [(paper, changed_fields) for paper, changed_fields in changes if changed_fields]
+        for start in range(0, len(changes), DATABASE_WRITE_BATCH):
+            batch = changes[start:start + DATABASE_WRITE_BATCH]
+            try:
+                # Papers changed by the same stage share their columns, so each group is one executemany()
+                rows: Dict[Tuple[str, ...], List[list]] = {}
+                for paper, changed_fields in batch:
+                    columns = PAPER_CODEC.columns_for(changed_fields)
+                    rows.setdefault(columns, []).append(list(PAPER_CODEC.encode(paper, columns)))
+                self.client.call('write_rows', groups=[{'columns': list(columns), 'rows': values}
+                                                       for columns, values in rows.items()])
+            except Exception:
+                for paper, changed_fields in changes[start:]:
+                    paper.mark_dirty(changed_fields)
+                raise
+        if changes:
+            logger.info(f"Saved changes for {len(changes)}/{len(papers)} papers through the queue service")
+
+
+class QueueService:
+    """The operations a queue service runs on the database for remote workers."""
+
+    def __init__(self, work_queue, db: PaperDatabase):
+        """
+        Initialize the service.
+
+        Args:
+            work_queue: WorkQueue of the database
+            db: Database the papers are read from and written to
+        """
+        from budget import store_usage
+        from retry_queue import retry_queue
+        from run_report import save_run_history
+
+        self.operations: Dict[str, Callable[..., Any]] = {
+            'claim': work_queue.claim,
+            'renew': work_queue.renew,
+            'complete': work_queue.complete,
+            'release': lambda stage, paper_ids, owner, error=None, delay=None: work_queue.release(
+                stage, paper_ids, owner, error, None if delay is None else time.time() + delay),
+            'release_owner': work_queue.release_owner,
+            'load_rows': db.load_rows,
+            'write_rows': lambda groups: db.write_rows(
+                {tuple(group['columns']): [tuple(row) for row in group['rows']] for group in groups}),
+            'retry_store_failure': retry_queue.store_failure,
+            'retry_store_postponement': retry_queue.store_postponement,
+            'retry_store_resolution': retry_queue.store_resolution,
+            'store_usage': lambda rows, day: store_usage(db.db_path, [tuple(row) for row in rows], day),
+            'save_run_history': lambda report, report_path: save_run_history(db.db_path, report, report_path)
+        }
+
+
+def serve(service: QueueService, address: str, port: int, token: str) -> ThreadingHTTPServer:
+    """
+    Serve a queue service over HTTP from a background thread.
+
+    Args:
+        service: Operations to serve
+        address: Address to bind
+        port: Port to listen on
+        token: Token every request must carry
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    expected = f"Bearer {token}".encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so a worker's requests reuse one connection (and one database connection)
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self) -> None:
+            if not hmac.compare_digest(self.headers.get('Authorization', '').encode(), expected):
+                self._reply(401, {'error': 'invalid token'})
+                return
+            operation = service.operations.get(self.path.strip('/'))
+            if operation is None:
+                self._reply(404, {'error': f"unknown operation {self.path}"})
+                return
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                result = operation(**params)
+            except (TypeError, ValueError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            except Exception as e:
+                logger.error(f"{self.path} failed: {e}")
+                self._reply(500, {'error': str(e)})
+                return
+            self._reply(200, {'result': result})
+
+        def _reply(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='queue-service', daemon=True).start()
+    logger.info(f"Serving the work queue on http://{address}:{port}")
+    return server
@@ -0,0 +1,206 @@
+"""
+Rate Limiter
+
+This module paces outbound requests per host with a token bucket shared by
+every module, worker and date shard in the process. Call sites acquire() a slot
+before each request instead of sleeping a fixed delay after it, so the pipeline
+runs at each provider's allowance no matter how many workers a stage has.
+
+The shared HTTP client reports every response back through observe(). A 429
+with Retry-After, or rate-limit headers saying the allowance is used up, pause
+the whole host until the provider's reset time, so every worker backs off at
+once instead of each discovering the limit on its own.
+"""
+
+import email.utils
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+from run_report import async_timed_sleep, SLEEP_RATE_LIMIT
+
+logger = logging.getLogger('RATE_LIMITER')
+
+# Response headers reporting how many requests are left in the current window
+_REMAINING_HEADERS = ('x-ratelimit-remaining-requests', 'x-ratelimit-remaining', 'ratelimit-remaining')
+
+# Response headers reporting when the current window resets
+_RESET_HEADERS = ('x-ratelimit-reset-requests', 'x-ratelimit-reset', 'ratelimit-reset')
+
+# Duration components such as "6m0s" or "250ms" used in reset headers
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse a reset or Retry-After header value into seconds from now."""
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if parts and ''.join(n + u for n, u in parts) == value:
+            return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+        try:
+            return email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    # Numbers are a delay in seconds, or an absolute epoch time in seconds or milliseconds
+    if number > 1e12:
+        return number / 1000 - time.time()
+    if number > 1e9:
+        return number - time.time()
+    return number
+
+
+class TokenBucket:
+    """
+    Token bucket for one host, safe to share between threads and event loops.
+
+    Callers reserve a slot and are told how long to wait for it, so waiting
+    happens outside the lock and the same bucket serves blocking and async code.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Requests per second, or None for no limit (pauses still apply)
+            burst: Requests that may go out back to back after an idle period
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        # Time at which the bucket would be full again if no more requests came in
+        self._full_at = 0.0
+        self._paused_until = 0.0
+
+    def reserve(self) -> float:
+        """Reserve the next request slot and return the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until)
+            if self.rate is None:
+                return start - now
+
+            interval = 1.0 / self.rate
+            send_at = max(start, self._full_at - (self.burst - 1) * interval)
+            self._full_at = max(self._full_at, send_at) + interval
+            return send_at - now
+
+    def pause(self, seconds: float) -> bool:
+        """
+        Hold back every request to the host for the given time.
+
+        Returns:
+            True if this extends the current pause
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until <= self._paused_until:
+                return False
+            self._paused_until = until
+            # A full window after the pause, not a burst on top of the requests already reserved
+            self._full_at = max(self._full_at, until)
+            return True
+
+
+class RateLimiter:
+    """Per-host token buckets configured by the RATE_LIMITS config section."""
+
+    def __init__(self, limits: dict):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: The RATE_LIMITS configuration dictionary. Buckets read it when
+                first used, so it may be adjusted until the first request.
+        """
+        self.limits = limits
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url: str) -> Tuple[str, dict]:
+        """Return the longest configured key matching a URL (default: its host) and its limit."""
+        parts = urlsplit(url)
+        target = f"{parts.netloc}{parts.path}"
+        best = None
+        for key in self.limits['hosts']:
+            if (target == key or target.startswith(key.rstrip('/') + '/')) and (best is None or len(key) > len(best)):
+                best = key
+        if best is None:
+            return parts.netloc, {}
+        return best, self.limits['hosts'][best]
+
+    def bucket(self, url: str) -> Tuple[str, TokenBucket]:
+        """Return the bucket governing requests to a URL, creating it on first use."""
+        key, limit = self._key(url)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(limit.get('rate'), limit.get('burst', 1))
+                self._buckets[key] = bucket
+            return key, bucket
+
+    async def acquire(self, url: str, service: str, paper_ids: Sequence[str] = ()) -> None:
+        """
+        Wait for a request slot on the host of a URL.
+
+        Args:
+            url: URL about to be requested
+            service: Service name the wait is reported under
+            paper_ids: IDs of the papers the wait is charged to
+        """
+        _, bucket = self.bucket(url)
+        delay = bucket.reserve()
+        if delay > 0:
+            await async_timed_sleep(delay, service, SLEEP_RATE_LIMIT, paper_ids)
+
+    def observe(self, response: httpx.Response) -> None:
+        """Pause a host when a response says its allowance is used up."""
+        headers = response.headers
+        delay = None
+        reason = None
+
+        if response.status_code in (429, 503) and 'retry-after' in headers:
+            delay = _parse_duration(headers['retry-after'])
+            reason = f"{response.status_code} with Retry-After"
+        elif response.status_code == 429:
+            delay = self.limits['default_retry_after']
+            reason = "429 without Retry-After"
+        else:
+            remaining = next((headers[name] for name in _REMAINING_HEADERS if name in headers), None)
+            reset = next((headers[name] for name in _RESET_HEADERS if name in headers), None)
+            if remaining is not None and reset is not None and remaining.strip() in ('0', '0.0'):
+                delay = _parse_duration(reset)
+                reason = "rate-limit window exhausted"
+
+        if delay is None or delay <= 0:
+            return
+
+        delay = min(delay, self.limits['max_retry_after'])
+        key, bucket = self.bucket(str(response.request.url))
+        if bucket.pause(delay):
+            logger.warning(f"{key} - pausing requests for {delay:.1f}s ({reason})")
+
+
+# Process-wide limiter shared by every module
+limiter = RateLimiter(config.RATE_LIMITS)
+
+
+async def acquire(url: str, service: str, paper_ids: Sequence[str] = ()) -> None:
+    """Wait for a request slot on the host of a URL using the process-wide limiter."""
+    await limiter.acquire(url, service, paper_ids)
+
+
+def observe(response: httpx.Response) -> None:
+    """Report a response to the process-wide limiter."""
+    limiter.observe(response)
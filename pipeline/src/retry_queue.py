@@ -0,0 +1,367 @@
+"""
+Retry Queue
+
+This module keeps retry backoff out of the stage workers. When a request made
+for a paper fails with a retryable error - a timeout, a connection error, a
+408, 429 or 5xx response - the stage defers the paper instead of sleeping
+through the backoff: the failure and the time the retry is due are recorded in
+the retry_queue table of the main database, the paper keeps its pending status,
+and the worker moves on to its next paper. The executor takes a deferred paper
+out of the graph without running the stages downstream of the one that
+deferred it.
+
+At the end of a run, main.drain_retries() submits the deferred papers again as
+they fall due, together with retries left by earlier runs, for as long as the
+next retry is due within RETRY_QUEUE['drain_wait'] seconds. Retries due later
+stay queued for the next run. A paper whose error is not retryable, or that
+has used up its stage's retries, is marked failed right away as before.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import httpx
+
+import config
+from db_connections import db_connections
+from queue_service import QueueServiceClient, ServiceError
+
+logger = logging.getLogger('RETRY_QUEUE')
+
+# HTTP statuses worth retrying besides 5xx
+RETRYABLE_STATUSES = (408, 429)
+
+
+def is_retryable(error: BaseException, default: bool = False) -> bool:
+    """
+    Classify a failure as worth retrying later or not.
+
+    The error and the errors it was raised from are searched for an httpx
+    error: timeouts, connection errors and 408, 429 and 5xx responses are
+    retryable, other HTTP statuses are not.
+
+    Args:
+        error: The exception a request failed with
+        default: Classification of errors that did not come from httpx (such as
+            a malformed response body)
+
+    Returns:
+        True if the request should be retried later
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status in RETRYABLE_STATUSES or status >= 500
+        if isinstance(error, httpx.TransportError):
+            return True
+        error = error.__cause__ or error.__context__
+    return default
+
+
+class RetryQueue:
+    """Thread-safe persisted queue of deferred (paper, stage) retries."""
+
+    def __init__(self, retry_config: dict):
+        """
+        Initialize the queue.
+
+        Args:
+            retry_config: The RETRY_QUEUE configuration dictionary. The database
+                is opened on first use, so its path may be changed until then.
+        """
+        self.config = retry_config
+        self._lock = threading.Lock()
+        # Database the known queued retries were loaded from
+        self._queued_path: Optional[str] = None
+        # (stage, paper_id) -> due time of papers deferred in this process and not yet taken
+        self._deferred: Dict[Tuple[str, str], float] = {}
+        # (stage, paper_id) of the queued retries known to this process, so that
+        # resolving a paper that was never deferred costs no database write
+        self._queued: Set[Tuple[str, str]] = set()
+        # Queue service the retries are stored through, on hosts without the database
+        self._service: Optional[QueueServiceClient] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the main database, creating the table on first use. Caller holds the lock."""
+        path = config.DATABASE_PATHS['main_database']
+        db_connections.initialize(path, 'retry_queue', self._create_table)
+        conn = db_connections.get(path)
+        if self._queued_path != path:
+            self._queued = {(stage, paper_id) for paper_id, stage in
+                            conn.execute("SELECT paper_id, stage FROM retry_queue")}
+            self._queued_path = path
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a write transaction on this thread's connection to the main database. Caller holds the lock.
+
+        The write lock is taken up front (BEGIN IMMEDIATE), so a queue service and
+        local workers updating the same retry cannot lose each other's attempts.
+        The transaction is committed when the block ends and rolled back if it raises.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def _create_table(conn: sqlite3.Connection) -> None:
+        """Create the retry_queue table if it doesn't exist."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS retry_queue (
+                paper_id TEXT,
+                stage TEXT,
+                attempts INTEGER,  -- Failed attempts so far
+                due_at REAL,  -- Unix time the next attempt is due, or a claimed retry's lease expiry
+                claimed INTEGER DEFAULT 0,  -- 1 while a run is retrying the paper
+                error TEXT,
+                updated_at REAL,  -- Unix time
+                PRIMARY KEY (paper_id, stage)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS retry_queue_due ON retry_queue (due_at)")
+
+    def defer(self, stage: str, paper_id: str, error: BaseException, max_retries: int,
+              backoff: Callable[[int], float], retryable: Optional[bool] = None) -> bool:
+        """
+        Record a failed attempt and schedule a retry if the failure allows one.
+
+        Args:
+            stage: Stage whose request failed
+            paper_id: ID of the paper the request was made for
+            error: The exception the request failed with
+            max_retries: Retries allowed after the first attempt
+            backoff: Seconds to wait before retry n (0 for the first retry)
+            retryable: Classification of the error (None classifies it with is_retryable)
+
+        Returns:
+            True if the paper was deferred, False if it should be marked failed
+        """
+        if retryable is None:
+            retryable = is_retryable(error)
+        if not retryable:
+            self.resolve(stage, paper_id)
+            return False
+
+        delays = [max(0.0, backoff(retry)) for retry in range(max_retries)]
+        try:
+            attempts, delay = self._store('store_failure', stage=stage, paper_id=paper_id, error=str(error),
+                                          delays=delays)
+        except (sqlite3.Error, ServiceError) as e:
+            logger.warning(f"Could not queue a retry of {paper_id} for {stage}: {e}")
+            return False
+        with self._lock:
+            if attempts is None:
+                self._deferred.pop((stage, paper_id), None)
+                return False
+            self._deferred[(stage, paper_id)] = time.time() + delay
+
+        logger.warning(f"{stage} - {paper_id} deferred, retry {attempts}/{max_retries} due in {delay:.1f}s: {error}")
+        return True
+
+    async def adefer(self, stage: str, paper_id: str, error: BaseException, max_retries: int,
+                     backoff: Callable[[int], float], retryable: Optional[bool] = None) -> bool:
+        """Run defer() off the event loop, so a writer holding the database does not stall other papers."""
+        return await asyncio.to_thread(self.defer, stage, paper_id, error, max_retries, backoff, retryable)
+
+    def use_service(self, service: QueueServiceClient) -> None:
+        """
+        Keep the queued retries in the database behind a queue service instead of a local file.
+
+        Used by workers on hosts other than the database's (see queue_service.py).
+        """
+        self._service = service
+
+    def _store(self, operation: str, **params):
+        """Run a storage operation on the local database, or on the queue service's if one is used."""
+        if self._service is not None:
+            return self._service.call(f"retry_{operation}", **params)
+        return getattr(self, operation)(**params)
+
+    def store_failure(self, stage: str, paper_id: str, error: str,
+                      delays: Sequence[float]) -> Tuple[Optional[int], float]:
+        """
+        Count a failed attempt in the database and queue its retry.
+
+        Args:
+            stage: Stage whose request failed
+            paper_id: ID of the paper
+            error: Error message of the failed attempt
+            delays: Seconds before each retry allowed (its length is the number of retries)
+
+        Returns:
+            (retry number, delay), or (None, 0) if the paper is out of retries
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM retry_queue WHERE paper_id = ? AND stage = ?",
+                               (paper_id, stage)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if attempts > len(delays):
+                conn.execute("DELETE FROM retry_queue WHERE paper_id = ? AND stage = ?", (paper_id, stage))
+                self._queued.discard((stage, paper_id))
+                return None, 0.0
+
+            delay = delays[attempts - 1]
+            conn.execute("""
+                INSERT INTO retry_queue (paper_id, stage, attempts, due_at, claimed, error, updated_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?)
+                ON CONFLICT(paper_id, stage) DO UPDATE SET
+                    attempts = excluded.attempts, due_at = excluded.due_at, claimed = 0,
+                    error = excluded.error, updated_at = excluded.updated_at
+            """, (paper_id, stage, attempts, now + delay, error, now))
+            self._queued.add((stage, paper_id))
+        return attempts, delay
+
+    def postpone(self, stage: str, paper_id: str, due_at: float, reason: str) -> bool:
+        """
+        Queue a paper to be run through a stage again later without counting a failed attempt.
+
+        Used for papers a stage chose not to run yet (such as papers refused by
+        the LLM budget), so waiting does not use up the paper's retries.
+
+        Args:
+            stage: Stage that postponed the paper
+            paper_id: ID of the paper
+            due_at: Unix time the paper may be run again
+            reason: Why the paper was postponed, kept as its error
+
+        Returns:
+            True if the paper was queued
+        """
+        try:
+            # Sent as a delay, so the due time holds on the database host's clock
+            self._store('store_postponement', stage=stage, paper_id=paper_id, delay=due_at - time.time(),
+                        reason=reason)
+        except (sqlite3.Error, ServiceError) as e:
+            logger.warning(f"Could not postpone {paper_id} for {stage}: {e}")
+            return False
+        with self._lock:
+            self._deferred[(stage, paper_id)] = due_at
+        return True
+
+    async def apostpone(self, stage: str, paper_id: str, due_at: float, reason: str) -> bool:
+        """Run postpone() off the event loop."""
+        return await asyncio.to_thread(self.postpone, stage, paper_id, due_at, reason)
+
+    def store_postponement(self, stage: str, paper_id: str, delay: float, reason: str) -> None:
+        """Queue a retry due in delay seconds in the database, keeping the paper's attempt count."""
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            conn.execute("""
+                INSERT INTO retry_queue (paper_id, stage, attempts, due_at, claimed, error, updated_at)
+                VALUES (?, ?, 0, ?, 0, ?, ?)
+                ON CONFLICT(paper_id, stage) DO UPDATE SET
+                    due_at = excluded.due_at, claimed = 0, error = excluded.error, updated_at = excluded.updated_at
+            """, (paper_id, stage, now + delay, reason, now))
+            self._queued.add((stage, paper_id))
+
+    def resolve(self, stage: str, paper_id: str) -> None:
+        """
+        Drop a paper's queued retry for a stage once the stage succeeded or gave up on it.
+
+        Failures are logged and never fail the stage itself.
+        """
+        with self._lock:
+            self._deferred.pop((stage, paper_id), None)
+        try:
+            self._store('store_resolution', stage=stage, paper_id=paper_id)
+        except (sqlite3.Error, ServiceError) as e:
+            logger.warning(f"Could not drop the queued retry of {paper_id} for {stage}: {e}")
+
+    def store_resolution(self, stage: str, paper_id: str) -> None:
+        """Delete a paper's queued retry for a stage from the database, if one is known."""
+        with self._lock:
+            self._connection()
+            if (stage, paper_id) not in self._queued:
+                return
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM retry_queue WHERE paper_id = ? AND stage = ?", (paper_id, stage))
+            self._queued.discard((stage, paper_id))
+
+    async def aresolve(self, stage: str, paper_id: str) -> None:
+        """Run resolve() off the event loop."""
+        await asyncio.to_thread(self.resolve, stage, paper_id)
+
+    def take_deferred(self, stage: str, paper_id: str) -> Optional[float]:
+        """
+        Check whether a stage deferred a paper since it was last asked.
+
+        Args:
+            stage: Stage that processed the paper
+            paper_id: ID of the paper
+
+        Returns:
+            Unix time the retry is due, or None if the paper was not deferred
+        """
+        with self._lock:
+            return self._deferred.pop((stage, paper_id), None)
+
+    def next_due(self) -> Optional[float]:
+        """Return the Unix time the earliest unclaimed retry is due, or None if the queue is empty."""
+        with self._lock:
+            row = self._connection().execute("""
+                SELECT MIN(due_at) FROM retry_queue WHERE claimed = 0 OR due_at < ?
+            """, (time.time(),)).fetchone()
+        return row[0]
+
+    def claim_due(self) -> List[str]:
+        """
+        Claim every retry that is due, including retries claimed by a run that died.
+
+        Claimed retries are held for RETRY_QUEUE['claim_seconds'] seconds.
+
+        Returns:
+            IDs of the papers to retry
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            rows = conn.execute("""
+                UPDATE retry_queue SET claimed = 1, due_at = ?, updated_at = ?
+                WHERE due_at <= ?
+                RETURNING paper_id, stage
+            """, (now + self.config['claim_seconds'], now, now)).fetchall()
+            # Retries queued by other processes become known here
+            self._queued.update((stage, paper_id) for paper_id, stage in rows)
+        return sorted({row[0] for row in rows})
+
+    def settle(self, paper_ids: Sequence[str]) -> int:
+        """
+        Drop claimed retries of papers that were neither deferred again nor resolved.
+
+        That happens when no stage selected the paper on its retry (its status
+        changed in the meantime, or it is no longer in the database).
+
+        Args:
+            paper_ids: IDs returned by claim_due()
+
+        Returns:
+            Number of retries dropped
+        """
+        with self._lock, self._transaction() as conn:
+            rows = [row for paper_id in paper_ids for row in conn.execute(
+                "DELETE FROM retry_queue WHERE paper_id = ? AND claimed = 1 RETURNING paper_id, stage", (paper_id,))]
+            self._queued.difference_update((stage, paper_id) for paper_id, stage in rows)
+        return len(rows)
+
+    def pending(self) -> int:
+        """Return the number of queued retries."""
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM retry_queue").fetchone()[0]
+
+
+# Process-wide queue shared by the stages, the executor and main
+retry_queue = RetryQueue(config.RETRY_QUEUE)
@@ -0,0 +1,533 @@
+"""
+Run Report
+
+This module records where the time of a pipeline run goes: wall time and peak
+RSS per stage, the latency of every external call made on behalf of each paper,
+retry counts, the time spent sleeping for rate limits and retry backoff, and
+the raw HTTP requests sent to each host. At the end of a run the figures are written as a
+JSON report and appended to the run history tables (pipeline_runs,
+stage_timings) so regressions can be compared across runs. The same events
+also feed the cumulative Prometheus metrics (see metrics.py) and the per-paper
+trace (see tracing.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import resource
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import metrics
+from db_connections import db_connections
+from tracing import tracer, SPAN_KIND_CLIENT
+
+logger = logging.getLogger('RUN_REPORT')
+
+# Kinds of sleep tracked separately in the report
+SLEEP_RATE_LIMIT = 'rate_limit'
+SLEEP_BACKOFF = 'backoff'
+
+
+def current_rss_mb() -> Optional[float]:
+    """Return the resident set size of this process in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Return the given percentile of a list of values (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class RunRecorder:
+    """
+    Thread-safe collector of timing data for a single pipeline run.
+
+    Stage worker threads, date shards and retry loops all report into the same
+    recorder, so every update happens under one lock.
+    """
+
+    def __init__(self):
+        """Initialize an empty recorder."""
+        self._lock = threading.Lock()
+        # Queue service the run history is saved through, on hosts without the database
+        self._service = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard everything recorded so far."""
+        with self._lock:
+            self.run_id: Optional[str] = None
+            self.run_mode: Optional[str] = None
+            self.run_value: Optional[str] = None
+            self.started_at: Optional[datetime] = None
+            self._start_time: Optional[float] = None
+            self._stages: Dict[str, Dict[str, float]] = {}
+            self._stage_latencies: Dict[str, List[float]] = {}
+            self._stage_rss: Dict[str, float] = {}
+            self._calls: Dict[str, List[float]] = {}
+            self._call_failures: Dict[str, int] = {}
+            self._retries: Dict[str, int] = {}
+            self._sleeps: Dict[str, Dict[str, float]] = {}
+            self._papers: Dict[str, Dict[str, Dict[str, float]]] = {}
+            self._hosts: Dict[str, Dict] = {}
+            self._budget: Optional[dict] = None
+
+    def start_run(self, run_mode: str, run_value: str) -> None:
+        """
+        Begin recording a new run.
+
+        Args:
+            run_mode: 'date', 'date_range' or 'test'
+            run_value: Date, date range or test file path
+        """
+        self.reset()
+        with self._lock:
+            self.run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            self.run_mode = run_mode
+            self.run_value = run_value
+            self.started_at = datetime.now()
+            self._start_time = time.monotonic()
+
+    def record_stage(self, name: str, wall_time: float, **counters: float) -> None:
+        """
+        Add the timing of one stage execution. Repeated executions accumulate.
+
+        Args:
+            name: Stage name
+            wall_time: Seconds between the stage starting and finishing its work
+            **counters: Extra numeric figures (processed, busy_time, ...)
+        """
+        with self._lock:
+            stage = self._stages.setdefault(name, {'wall_time': 0.0, 'executions': 0})
+            stage['wall_time'] += wall_time
+            stage['executions'] += 1
+            for key, value in counters.items():
+                stage[key] = stage.get(key, 0) + value
+
+    def failed_papers(self) -> int:
+        """Return the number of papers stages failed because a whole batch raised."""
+        with self._lock:
+            return int(sum(stage.get('failed', 0) for stage in self._stages.values()))
+
+    def record_paper_stage_latency(self, name: str, seconds: float) -> None:
+        """
+        Record how long one paper spent in a stage (queue wait plus processing).
+
+        Args:
+            name: Stage name
+            seconds: Seconds from the paper entering the stage to the stage finishing it
+        """
+        with self._lock:
+            self._stage_latencies.setdefault(name, []).append(seconds)
+        metrics.STAGE_PAPER_LATENCY.labels(name).observe(seconds)
+
+    def record_stage_rss(self, name: str) -> None:
+        """
+        Sample the process RSS at the end of a stage's batch, keeping the stage's peak.
+
+        Stages overlap in the streaming executor, so a stage's peak is the
+        highest process RSS seen while it was finishing work.
+
+        Args:
+            name: Stage name
+        """
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            if rss > self._stage_rss.get(name, 0.0):
+                self._stage_rss[name] = rss
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager recording the wall time and peak RSS of the wrapped block as a stage."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.monotonic() - started)
+            self.record_stage_rss(name)
+
+    @contextmanager
+    def external_call(self, service: str, paper_ids: Sequence[str] = ()) -> Iterator[None]:
+        """
+        Context manager timing one request to an external service.
+
+        A call made for several papers at once (an embeddings batch) counts
+        its full latency against each of them.
+
+        Args:
+            service: Service name (arxiv_api, arxiv_source, openai_embeddings, ...)
+            paper_ids: IDs of the papers the call is made for
+        """
+        started = time.monotonic()
+        failed = False
+        try:
+            with tracer.span(service, paper_ids, kind=SPAN_KIND_CLIENT, service=service):
+                yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._calls.setdefault(service, []).append(elapsed)
+                if failed:
+                    self._call_failures[service] = self._call_failures.get(service, 0) + 1
+                for paper_id in paper_ids:
+                    entry = self._paper_entry(paper_id, service)
+                    entry['calls'] += 1
+                    entry['call_time'] += elapsed
+                    if failed:
+                        entry['failures'] += 1
+
+    def record_retry(self, service: str, paper_ids: Sequence[str] = ()) -> None:
+        """
+        Count one retry of a request to an external service.
+
+        Args:
+            service: Service name
+            paper_ids: IDs of the papers the retried call is made for
+        """
+        with self._lock:
+            self._retries[service] = self._retries.get(service, 0) + 1
+            for paper_id in paper_ids:
+                self._paper_entry(paper_id, service)['retries'] += 1
+        metrics.RETRIES.labels(service).inc()
+        tracer.add_event('retry', paper_ids, service=service)
+
+    def record_http_request(self, host: str, status: Optional[int], seconds: float,
+                            error: Optional[str] = None, http_version: Optional[str] = None) -> None:
+        """
+        Record one HTTP request as sent by the shared client (every retry and redirect counts).
+
+        Args:
+            host: Host the request was sent to
+            status: Response status code, or None if no response arrived
+            seconds: Seconds until the response headers arrived or the request failed
+            error: Transport error name when no response arrived
+            http_version: Protocol the response was received over (HTTP/1.1, HTTP/2)
+        """
+        with self._lock:
+            entry = self._hosts.setdefault(host, {'latencies': [], 'statuses': {}, 'errors': {}, 'versions': {}})
+            entry['latencies'].append(seconds)
+            if status is not None:
+                entry['statuses'][str(status)] = entry['statuses'].get(str(status), 0) + 1
+            if error is not None:
+                entry['errors'][error] = entry['errors'].get(error, 0) + 1
+            if http_version is not None:
+                entry['versions'][http_version] = entry['versions'].get(http_version, 0) + 1
+        metrics.HTTP_REQUESTS.labels(host, str(status) if status is not None else error).inc()
+        metrics.HTTP_REQUEST_DURATION.labels(host).observe(seconds)
+        tracer.annotate_current(**{'server.address': host, 'http.response.status_code': status,
+                                   'error.type': error, 'network.protocol.version': http_version})
+
+    def record_budget(self, summary: dict) -> None:
+        """
+        Record the LLM budget consumption of the run.
+
+        Args:
+            summary: Budget summary (see budget.BudgetController.summary)
+        """
+        with self._lock:
+            self._budget = summary
+
+    def sleep(self, seconds: float, service: str, kind: str, paper_ids: Sequence[str] = ()) -> None:
+        """
+        Sleep and record the time slept.
+
+        Args:
+            seconds: Seconds to sleep
+            service: Service the sleep is for
+            kind: SLEEP_RATE_LIMIT or SLEEP_BACKOFF
+            paper_ids: IDs of the papers the sleep is charged to
+        """
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+        self._record_sleep(seconds, service, kind, paper_ids)
+
+    async def async_sleep(self, seconds: float, service: str, kind: str, paper_ids: Sequence[str] = ()) -> None:
+        """
+        Sleep without blocking the event loop and record the time slept.
+
+        Args:
+            seconds: Seconds to sleep
+            service: Service the sleep is for
+            kind: SLEEP_RATE_LIMIT or SLEEP_BACKOFF
+            paper_ids: IDs of the papers the sleep is charged to
+        """
+        if seconds <= 0:
+            return
+        await asyncio.sleep(seconds)
+        self._record_sleep(seconds, service, kind, paper_ids)
+
+    def _record_sleep(self, seconds: float, service: str, kind: str, paper_ids: Sequence[str]) -> None:
+        """Add a finished sleep to the service and per-paper totals."""
+        with self._lock:
+            sleeps = self._sleeps.setdefault(service, {SLEEP_RATE_LIMIT: 0.0, SLEEP_BACKOFF: 0.0})
+            sleeps[kind] = sleeps.get(kind, 0.0) + seconds
+            for paper_id in paper_ids:
+                self._paper_entry(paper_id, service)[f"{kind}_sleep"] += seconds
+        metrics.SLEEP_SECONDS.labels(service, kind).inc(seconds)
+        tracer.record_span(f"{kind}_sleep", paper_ids, seconds, service=service)
+
+    def _paper_entry(self, paper_id: str, service: str) -> Dict[str, float]:
+        """Return the per-paper counters for a service. Caller must hold the lock."""
+        services = self._papers.setdefault(paper_id, {})
+        if service not in services:
+            services[service] = {'calls': 0, 'call_time': 0.0, 'failures': 0, 'retries': 0,
+                                 f"{SLEEP_RATE_LIMIT}_sleep": 0.0, f"{SLEEP_BACKOFF}_sleep": 0.0}
+        return services[service]
+
+    def _stage_summary(self, name: str, stage: Dict[str, float]) -> Dict[str, float]:
+        """Return a stage's counters with its per-paper latency percentiles. Caller must hold the lock."""
+        summary = {key: round(value, 3) for key, value in stage.items()}
+        latencies = self._stage_latencies.get(name)
+        if latencies:
+            summary['p50_paper_latency'] = round(_percentile(latencies, 0.50), 3)
+            summary['p95_paper_latency'] = round(_percentile(latencies, 0.95), 3)
+        if name in self._stage_rss:
+            summary['peak_rss_mb'] = round(self._stage_rss[name], 1)
+        return summary
+
+    def build_report(self, status: str, paper_count: int) -> dict:
+        """
+        Assemble the run report.
+
+        Args:
+            status: Final run status ('completed' or 'failed')
+            paper_count: Number of papers handled by the run
+
+        Returns:
+            JSON-serializable report dictionary
+        """
+        with self._lock:
+            wall_time = time.monotonic() - self._start_time if self._start_time is not None else 0.0
+            services = {}
+            for service in sorted(set(self._calls) | set(self._retries) | set(self._sleeps)):
+                latencies = self._calls.get(service, [])
+                sleeps = self._sleeps.get(service, {})
+                services[service] = {
+                    'calls': len(latencies),
+                    'failures': self._call_failures.get(service, 0),
+                    'retries': self._retries.get(service, 0),
+                    'total_call_time': round(sum(latencies), 3),
+                    'p50_latency': round(_percentile(latencies, 0.50), 3),
+                    'p95_latency': round(_percentile(latencies, 0.95), 3),
+                    'max_latency': round(max(latencies), 3) if latencies else 0.0,
+                    'rate_limit_sleep': round(sleeps.get(SLEEP_RATE_LIMIT, 0.0), 3),
+                    'backoff_sleep': round(sleeps.get(SLEEP_BACKOFF, 0.0), 3)
+                }
+
+            hosts = {
+                host: {
+                    'requests': len(entry['latencies']),
+                    'statuses': dict(sorted(entry['statuses'].items())),
+                    'errors': entry['errors'],
+                    'http_versions': entry['versions'],
+                    'p50_latency': round(_percentile(entry['latencies'], 0.50), 3),
+                    'p95_latency': round(_percentile(entry['latencies'], 0.95), 3)
+                }
+                for host, entry in sorted(self._hosts.items())
+            }
+
+            return {
+                'run_id': self.run_id,
+                'run_mode': self.run_mode,
+                'run_value': self.run_value,
+                'status': status,
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': datetime.now().isoformat(),
+                'wall_time': round(wall_time, 3),
+                'paper_count': paper_count,
+                # ru_maxrss is reported in kilobytes on Linux
+                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                'retries': sum(self._retries.values()),
+                'rate_limit_sleep': round(sum(s.get(SLEEP_RATE_LIMIT, 0.0) for s in self._sleeps.values()), 3),
+                'backoff_sleep': round(sum(s.get(SLEEP_BACKOFF, 0.0) for s in self._sleeps.values()), 3),
+                'stages': {name: self._stage_summary(name, stage) for name, stage in self._stages.items()},
+                'services': services,
+                'hosts': hosts,
+                'llm_budget': self._budget,
+                'papers': {paper_id: {service: {key: round(value, 3) for key, value in entry.items()}
+                                      for service, entry in paper_services.items()}
+                           for paper_id, paper_services in self._papers.items()}
+            }
+
+    def use_service(self, service) -> None:
+        """
+        Save the run history in the database behind a queue service instead of a local file.
+
+        Used by workers on hosts other than the database's (see queue_service.py).
+        """
+        self._service = service
+
+    def finish_run(self, status: str, paper_count: int, report_dir: str, db_path: Optional[str]) -> dict:
+        """
+        Write the JSON report and append the run to the history tables.
+
+        Failures here are logged and never fail the run itself.
+
+        Args:
+            status: Final run status ('completed' or 'failed')
+            paper_count: Number of papers handled by the run
+            report_dir: Directory for JSON reports
+            db_path: SQLite database holding the run history tables (None when the
+                history is saved through a queue service, see use_service)
+
+        Returns:
+            The report dictionary
+        """
+        report = self.build_report(status, paper_count)
+        report_path = None
+
+        try:
+            os.makedirs(report_dir, exist_ok=True)
+            report_path = os.path.join(report_dir, f"run-{report['run_id']}.json")
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Run report written to {report_path}")
+        except Exception as e:
+            logger.warning(f"Failed to write run report: {e}")
+
+        try:
+            if self._service is not None:
+                self._service.call('save_run_history', report=report, report_path=report_path)
+            elif db_path:
+                save_run_history(db_path, report, report_path)
+        except Exception as e:
+            logger.warning(f"Failed to save run history: {e}")
+
+        _log_report(report)
+        return report
+
+
+def create_history_tables(conn: sqlite3.Connection) -> None:
+    """Create the run history tables if they don't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            run_id TEXT PRIMARY KEY,
+            run_mode TEXT,
+            run_value TEXT,
+            status TEXT,
+            started_at TEXT,  -- ISO format
+            finished_at TEXT,  -- ISO format
+            wall_time REAL,  -- Seconds
+            paper_count INTEGER,
+            retries INTEGER,
+            rate_limit_sleep REAL,  -- Seconds slept for rate limiting
+            backoff_sleep REAL,  -- Seconds slept in retry backoff
+            services TEXT,  -- JSON object of per-service call statistics
+            report_path TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stage_timings (
+            run_id TEXT,
+            stage TEXT,
+            wall_time REAL,  -- Seconds
+            busy_time REAL,  -- Seconds summed over worker threads
+            processed INTEGER,
+            passed_through INTEGER,
+            p50_paper_latency REAL,  -- Seconds a paper spent in the stage, median
+            p95_paper_latency REAL,  -- Seconds a paper spent in the stage, 95th percentile
+            PRIMARY KEY (run_id, stage)
+        )
+    """)
+
+
+def save_run_history(db_path: str, report: dict, report_path: Optional[str]) -> None:
+    """Append a run report to the pipeline_runs and stage_timings tables."""
+    db_connections.initialize(db_path, 'run_history', create_history_tables)
+    conn = db_connections.get(db_path)
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO pipeline_runs (
+                run_id, run_mode, run_value, status, started_at, finished_at, wall_time, paper_count,
+                retries, rate_limit_sleep, backoff_sleep, services, report_path
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            report['run_id'], report['run_mode'], report['run_value'], report['status'],
+            report['started_at'], report['finished_at'], report['wall_time'], report['paper_count'],
+            report['retries'], report['rate_limit_sleep'], report['backoff_sleep'],
+            json.dumps(report['services']), report_path
+        ))
+        conn.executemany("""
+            INSERT OR REPLACE INTO stage_timings (
+                run_id, stage, wall_time, busy_time, processed, passed_through, p50_paper_latency, p95_paper_latency
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (report['run_id'], name, stage['wall_time'], stage.get('busy_time'), stage.get('processed'),
+             stage.get('passed_through'), stage.get('p50_paper_latency'), stage.get('p95_paper_latency'))
+            for name, stage in report['stages'].items()
+        ])
+
+
+def _log_report(report: dict) -> None:
+    """Log a short timing breakdown of the run."""
+    logger.info(f"Run {report['run_id']}: {report['wall_time']:.1f}s wall time, {report['retries']} retries, "
+                f"{report['rate_limit_sleep']:.1f}s rate-limit sleep, {report['backoff_sleep']:.1f}s backoff sleep, "
+                f"peak RSS {report['peak_rss_mb']:.0f} MB")
+    for name, stage in report['stages'].items():
+        latency = (f", paper latency p50 {stage['p50_paper_latency']:.2f}s / p95 {stage['p95_paper_latency']:.2f}s"
+                   if 'p50_paper_latency' in stage else "")
+        rss = f", peak RSS {stage['peak_rss_mb']:.0f} MB" if 'peak_rss_mb' in stage else ""
+        logger.info(f"  Stage {name}: {stage['wall_time']:.1f}s{latency}{rss}")
+    for service, stats in report['services'].items():
+        logger.info(f"  {service}: {stats['calls']} calls ({stats['failures']} failed, {stats['retries']} retries), "
+                    f"p50 {stats['p50_latency']:.2f}s, p95 {stats['p95_latency']:.2f}s")
+    budget = report.get('llm_budget')
+    if budget and budget['run_tokens']:
+        logger.info(f"  LLM budget: {budget['run_tokens']:,} tokens, ${budget['run_cost']:.2f} this run "
+                    f"({budget['daily_tokens']:,} tokens, ${budget['daily_cost']:.2f} today, "
+                    f"{budget['fraction_used']:.0%} of the tightest cap, {budget['level']})")
+        deferred = sum(budget['deferred'].values())
+        if deferred or budget['skipped_tangential']:
+            logger.info(f"  LLM budget: {deferred} paper stages deferred, "
+                        f"{budget['skipped_tangential']} Tangentially Relevant papers not scored")
+    for host, stats in report.get('hosts', {}).items():
+        errors = sum(stats['errors'].values())
+        throttled = stats['statuses'].get('429', 0)
+        logger.info(f"  {host}: {stats['requests']} requests ({throttled} throttled, {errors} transport errors), "
+                    f"p50 {stats['p50_latency']:.2f}s, p95 {stats['p95_latency']:.2f}s")
+
+
+# Process-wide recorder shared by all modules
+recorder = RunRecorder()
+
+
+def external_call(service: str, paper_ids: Sequence[str] = ()):
+    """Time one request to an external service on the process-wide recorder."""
+    return recorder.external_call(service, paper_ids)
+
+
+def record_retry(service: str, paper_ids: Sequence[str] = ()) -> None:
+    """Count one retry on the process-wide recorder."""
+    recorder.record_retry(service, paper_ids)
+
+
+def timed_sleep(seconds: float, service: str, kind: str, paper_ids: Sequence[str] = ()) -> None:
+    """Sleep and record it on the process-wide recorder."""
+    recorder.sleep(seconds, service, kind, paper_ids)
+
+
+async def async_timed_sleep(seconds: float, service: str, kind: str, paper_ids: Sequence[str] = ()) -> None:
+    """Sleep on the event loop and record it on the process-wide recorder."""
+    await recorder.async_sleep(seconds, service, kind, paper_ids)
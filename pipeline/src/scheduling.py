@@ -0,0 +1,84 @@
+"""
+Scheduling Policies
+
+This module decides which waiting paper a stage processes next. Papers reach
+the LLM stages in the order their embedding batches finish, which says nothing
+about their value; with a value-ordered policy each stage instead takes the
+most promising paper in its queue first. A run that is cut short (a timeout, a
+budget running out, a daemon poll overlapping the next) has then already
+validated, scored and enriched the papers most likely to be "Must Read".
+
+Priority keys sort ascending, so every key negates its value measures.
+"""
+
+import logging
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Tuple
+from executor import Stage
+from paper import Paper
+
+logger = logging.getLogger('SCHEDULING')
+
+# Rank of each LLM relevance assessment; unassessed topics rank 0
+RELEVANCE_RANK = {
+    'Highly Relevant': 3,
+    'Moderately Relevant': 2,
+    'Tangentially Relevant': 1
+}
+
+# Rank of each LLM recommendation; unscored papers rank 0
+RECOMMENDATION_RANK = {
+    'Must Read': 4,
+    'Should Read': 3,
+    'Can Skip': 2,
+    'Ignore': 1
+}
+
+
+def similarity_priority(paper: Paper) -> Tuple:
+    """Order papers by their highest topic similarity score, highest first."""
+    score = paper.highest_similarity_score()
+    return (-(score if score is not None else -1.0),)
+
+
+def relevance_priority(paper: Paper) -> Tuple:
+    """
+    Order papers by their best LLM relevance assessment, breaking ties by
+    recommendation and then by topic similarity, most valuable first.
+    """
+    best_relevance = max((RELEVANCE_RANK.get(relevance, 0) for relevance in paper.topic_relevances()), default=0)
+    return (-best_relevance, -RECOMMENDATION_RANK.get(paper.recommendation_score, 0)) + similarity_priority(paper)
+
+
+# Priority key of each policy name; 'fifo' keeps arrival order
+POLICIES: Dict[str, Optional[Callable[[Paper], Tuple]]] = {
+    'fifo': None,
+    'similarity': similarity_priority,
+    'relevance': relevance_priority
+}
+
+
+def apply_policy(stages: List[Stage], scheduling_config: dict) -> List[Stage]:
+    """
+    Attach the configured priority keys to the processing stages.
+    
+    Args:
+        stages: Stage definitions
+        scheduling_config: The SCHEDULING configuration dictionary
+        
+    Returns:
+        New list of stage definitions; stages without a policy are unchanged
+    """
+    stage_policies = scheduling_config.get('stage_policies', {})
+    for policy in stage_policies.values():
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy} (expected one of {', '.join(POLICIES)})")
+    
+    scheduled = []
+    for stage in stages:
+        priority = POLICIES[stage_policies.get(stage.name, 'fifo')]
+        if priority is not None:
+            stage = replace(stage, priority=priority, lookahead=scheduling_config['lookahead'])
+            logger.debug(f"{stage.name} - scheduling by {stage_policies[stage.name]}")
+        scheduled.append(stage)
+    return scheduled
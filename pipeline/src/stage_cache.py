@@ -0,0 +1,217 @@
+"""
+Stage Cache
+
+This module memoizes the paid work of the embedding and LLM stages across runs.
+Each stage derives a cache key from the exact inputs of its request - the built
+paper text and model for embeddings, the full prompt, model, reasoning effort
+and sampling parameters for LLM validation and scoring - together with the
+stage's version from the
+STAGE_CACHE config section, and stores the result in a local cache database.
+
+Re-running a date, reprocessing papers after a crash or resetting their status
+fields therefore never pays twice for a request it has made before, while any
+change to a prompt or paper text is a cache miss by construction. Bumping one
+stage's version invalidates exactly that stage: its old entries no longer match
+and are dropped the next time the cache is opened.
+
+Only successful results are stored, so failures are always retried. Stores are
+buffered in memory and written by flush() with one executemany and one commit,
+which the stages run off the event loop at the end of each batch, as they do
+lookups (aget, aget_many).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import config
+import metrics
+from db_connections import db_connections
+
+# Keys looked up per query, below SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+logger = logging.getLogger('STAGE_CACHE')
+
+
+class StageCache:
+    """Thread-safe content-addressed store of stage outputs."""
+
+    def __init__(self, cache_config: dict):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_config: The STAGE_CACHE configuration dictionary. The database
+                is opened on first use, so its path may be changed until then.
+        """
+        self.config = cache_config
+        self._lock = threading.Lock()
+        # (stage, cache_key) -> (version, encoded output, created_at) stored but not yet written
+        self._unsaved: Dict[Tuple[str, str], Tuple[int, Any, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether lookups and stores go to the cache database."""
+        return bool(self.config.get('enabled'))
+
+    def version(self, stage: str) -> int:
+        """Return the configured version of a stage."""
+        return self.config['versions'].get(stage, 1)
+
+    def key(self, stage: str, *inputs: str) -> str:
+        """
+        Return the cache key of a stage request.
+
+        Args:
+            stage: Stage name
+            *inputs: Every input that determines the output (model, prompt, text, ...)
+
+        Returns:
+            Hex digest of the stage, its version and the inputs
+        """
+        digest = hashlib.sha256(f"{stage}\0{self.version(stage)}".encode())
+        for value in inputs:
+            # Length-prefixed, so inputs cannot run into each other
+            encoded = value.encode()
+            digest.update(len(encoded).to_bytes(8, 'big'))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the cache database, set up on first use."""
+        path = config.DATABASE_PATHS['stage_cache']
+        db_connections.initialize(path, 'stage_outputs', self._create_table)
+        return db_connections.get(path)
+
+    def _create_table(self, conn: sqlite3.Connection) -> None:
+        """Create the stage_outputs table if it doesn't exist and drop outdated entries."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stage_outputs (
+                stage TEXT,
+                cache_key TEXT,
+                version INTEGER,
+                output BLOB,  -- JSON text, or raw bytes (embedding vectors)
+                created_at REAL,
+                PRIMARY KEY (stage, cache_key)
+            )
+        """)
+
+        # Entries from other versions of a stage can never match again
+        removed = 0
+        for stage, version in self.config['versions'].items():
+            removed += conn.execute("DELETE FROM stage_outputs WHERE stage = ? AND version != ?",
+                                    (stage, version)).rowcount
+        if self.config.get('max_age_days'):
+            removed += conn.execute("DELETE FROM stage_outputs WHERE created_at < ?",
+                                    (time.time() - self.config['max_age_days'] * 86400,)).rowcount
+        if removed:
+            logger.info(f"Dropped {removed} outdated stage cache entries")
+
+    def get(self, stage: str, key: str) -> Any:
+        """
+        Look up a stored output.
+
+        Lookup failures are logged and treated as misses.
+
+        Args:
+            stage: Stage name
+            key: Cache key from key()
+
+        Returns:
+            The stored output (bytes as stored, anything else JSON-decoded), or None on a miss
+        """
+        return self.get_many(stage, [key]).get(key)
+
+    def get_many(self, stage: str, keys: List[str]) -> Dict[str, Any]:
+        """
+        Look up several outputs of a stage.
+
+        Lookup failures are logged and treated as misses.
+
+        Args:
+            stage: Stage name
+            keys: Cache keys from key()
+
+        Returns:
+            Dictionary of key -> stored output, for the keys found
+        """
+        if not self.enabled:
+            return {}
+        rows = {}
+        with self._lock:
+            for key in keys:
+                if (stage, key) in self._unsaved:
+                    rows[key] = self._unsaved[(stage, key)][1]
+        wanted = [key for key in dict.fromkeys(keys) if key not in rows]
+        try:
+            conn = self._connection()
+            for start in range(0, len(wanted), LOOKUP_CHUNK):
+                chunk = wanted[start:start + LOOKUP_CHUNK]
+                rows.update(conn.execute(
+                    f"SELECT cache_key, output FROM stage_outputs WHERE stage = ? "
+                    f"AND cache_key IN ({', '.join('?' * len(chunk))})", (stage, *chunk)
+                ).fetchall())
+        except sqlite3.Error as e:
+            logger.warning(f"Stage cache lookup failed: {e}")
+
+        for key in keys:
+            metrics.STAGE_CACHE_LOOKUPS.labels(stage, 'hit' if key in rows else 'miss').inc()
+        return {key: output if isinstance(output, bytes) else json.loads(output) for key, output in rows.items()}
+
+    async def aget(self, stage: str, key: str) -> Any:
+        """Run get() off the event loop."""
+        return await asyncio.to_thread(self.get, stage, key)
+
+    async def aget_many(self, stage: str, keys: List[str]) -> Dict[str, Any]:
+        """Run get_many() off the event loop."""
+        return await asyncio.to_thread(self.get_many, stage, keys)
+
+    def put(self, stage: str, key: str, output: Any) -> None:
+        """
+        Store an output. It is buffered until the next flush().
+
+        Args:
+            stage: Stage name
+            key: Cache key from key()
+            output: bytes, or any JSON-serializable value
+        """
+        if not self.enabled:
+            return
+        value = output if isinstance(output, bytes) else json.dumps(output)
+        with self._lock:
+            self._unsaved[(stage, key)] = (self.version(stage), value, time.time())
+
+    def flush(self) -> None:
+        """
+        Write every buffered output with one executemany and one commit.
+
+        Failures are logged and never fail the stage itself; the outputs are dropped.
+        """
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+        if not unsaved:
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO stage_outputs (stage, cache_key, version, output, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(stage, key, version, value, created_at)
+                      for (stage, key), (version, value, created_at) in unsaved.items()])
+        except sqlite3.Error as e:
+            logger.warning(f"Stage cache store of {len(unsaved)} outputs failed: {e}")
+
+    async def aflush(self) -> None:
+        """Run flush() off the event loop."""
+        await asyncio.to_thread(self.flush)
+
+
+# Process-wide cache shared by the embedding and LLM stages
+stage_cache = StageCache(config.STAGE_CACHE)
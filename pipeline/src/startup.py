@@ -0,0 +1,160 @@
+"""
+Startup
+
+This module covers what the pipeline pays before its first paper is processed:
+importing its heavy libraries, creating the module singletons, loading the
+tokenizer and building the stages.
+
+The embedding stage counts tokens with tiktoken, which downloads the BPE file
+of an encoding the first time it is loaded. prefetch_tokenizers() loads every
+encoding the stages use, so that the file lands in tiktoken's cache directory
+(TIKTOKEN_CACHE_DIR). The pipeline image runs it at build time; containers then
+start without downloading anything and run offline. tiktoken checks each
+downloaded file against the hash pinned in its own release, so the image holds
+exactly the artifacts of the installed tiktoken version.
+
+profile() measures a cold start and main.py --profile-startup logs it;
+benchmarks/cold_start.py tracks it across changes. Imports are timed in a fresh
+interpreter per module, so every module pays its full cost; the module
+singletons (budget, tracer, stage cache, retry queue, rate limiter, run
+recorder, metrics registry) are created on import, so their initialization is
+part of their module's import time.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import config
+
+logger = logging.getLogger('STARTUP')
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Third-party libraries whose import dominates a cold start
+LIBRARY_IMPORTS = ('numpy', 'openai', 'tiktoken', 'httpx', 'prometheus_client')
+
+# Pipeline modules that create a process-wide singleton on import, and main itself
+PIPELINE_IMPORTS = ('metrics', 'run_report', 'rate_limiter', 'budget', 'tracing', 'stage_cache', 'retry_queue',
+                    'http_client', 'db_connections', 'database', 'main')
+
+
+def tiktoken_cache_dir() -> str:
+    """Return the directory tiktoken caches BPE files in (same lookup as tiktoken itself)."""
+    if 'TIKTOKEN_CACHE_DIR' in os.environ:
+        return os.environ['TIKTOKEN_CACHE_DIR']
+    if 'DATA_GYM_CACHE_DIR' in os.environ:
+        return os.environ['DATA_GYM_CACHE_DIR']
+    return os.path.join(tempfile.gettempdir(), 'data-gym-cache')
+
+
+def _cached_files() -> set:
+    """Return the files currently in the tiktoken cache directory."""
+    cache_dir = tiktoken_cache_dir()
+    return set(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else set()
+
+
+def prefetch_tokenizers() -> List[str]:
+    """
+    Load every tokenizer the stages use, downloading missing BPE files into the cache.
+
+    Returns:
+        Names of the encodings loaded
+    """
+    from modules.embedding_similarity import load_encoding
+
+    before = _cached_files()
+    encodings = [load_encoding(config.EMBEDDING['model']).name]
+    downloaded = len(_cached_files() - before)
+    logger.info(f"Tokenizers ready in {tiktoken_cache_dir()}: {', '.join(encodings)} "
+                f"({downloaded} files downloaded)")
+    return encodings
+
+
+def measure_import(module: str) -> Optional[float]:
+    """
+    Measure the import time of a module in a fresh interpreter.
+
+    Args:
+        module: Module to import (run from the pipeline's src directory)
+
+    Returns:
+        Cumulative import time in seconds, or None if the import failed or the
+        module was already imported at interpreter startup
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.warning(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+        return None
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative = None
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if line.startswith('import time:') and len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1]) / 1e6
+    return cumulative
+
+
+def _timed(step, timings: Dict[str, float], name: str):
+    """Run step(), record its duration under name and return its result."""
+    started = time.perf_counter()
+    result = step()
+    timings[name] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def profile() -> dict:
+    """
+    Measure the cost of a cold start.
+
+    Returns:
+        Dictionary with the import time of each library and pipeline module
+        ('imports'), the time of each initialization step in this process
+        ('init'), and whether the tokenizer had to be downloaded
+    """
+    imports = {}
+    for module in LIBRARY_IMPORTS + PIPELINE_IMPORTS:
+        seconds = measure_import(module)
+        imports[module] = round(seconds, 4) if seconds is not None else None
+
+    # Initialization in this process, in the order a run performs it
+    init = {}
+    import http_client
+    from modules import embedding_similarity
+    import main
+
+    before = _cached_files()
+    _timed(lambda: embedding_similarity.load_encoding(config.EMBEDDING['model']), init, 'tokenizer')
+    tokenizer_downloaded = bool(_cached_files() - before)
+    _timed(http_client.client, init, 'http_client')
+    _timed(main.build_processing_stages, init, 'stages')
+
+    return {
+        'imports': imports,
+        'init': init,
+        'tokenizer_cache_dir': tiktoken_cache_dir(),
+        'tokenizer_downloaded': tokenizer_downloaded
+    }
+
+
+def log_profile(startup_profile: dict) -> None:
+    """Log a startup profile as a table."""
+    logger.info("Startup profile (import times measured in fresh interpreters):")
+    for module, seconds in startup_profile['imports'].items():
+        logger.info(f"  import {module:<20} {'n/a' if seconds is None else f'{seconds * 1000:8.1f} ms':>11}")
+    for step, seconds in startup_profile['init'].items():
+        logger.info(f"  init   {step:<20} {seconds * 1000:8.1f} ms")
+    cache_state = 'downloaded' if startup_profile['tokenizer_downloaded'] else 'cached'
+    logger.info(f"  tokenizer {cache_state} in {startup_profile['tokenizer_cache_dir']}")
+
+
+if __name__ == '__main__':
+    # Run at image build time: python src/startup.py
+    logging.basicConfig(level=logging.INFO, format='[%(name)s] [%(levelname)s] %(message)s')
+    prefetch_tokenizers()
@@ -0,0 +1,180 @@
+"""
+Structured Logging
+
+This module sets up the pipeline's logging. The root logger gets a single
+QueueHandler, and a QueueListener thread does the formatting and writing for
+every destination. A stage coroutine, checkpoint writer or database thread that
+logs therefore only puts the record on a queue. It never formats JSON, and it
+never waits on the log file, the console or a lock shared with other threads.
+
+The log file gets one JSON object per line: timestamp, level, logger, message,
+the structured fields passed with extra= (paper_id, stage, ...) and the
+traceback of a logged exception. The console keeps the human-readable format.
+Both formats are set in the LOGGING config section.
+
+Per-paper success lines used to be most of a run's log. Stages now report a
+success through success_log.paper_succeeded(), which counts every success per
+stage and logs only every LOGGING['success_sample_every']-th one, together
+with the stage's running count. Failures, deferrals and warnings are still
+logged in full.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import config
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+TEXT_FORMAT = '%(asctime)s,%(msecs)03d [%(name)s] [%(levelname)s] %(message)s'
+TEXT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener.
+
+    The stock handler formats each record into its message before queueing it.
+    This one only resolves the message arguments and renders a traceback to
+    text (the exception object cannot be kept once the record leaves the
+    thread), so extra= fields reach the listener's formatters intact.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter(name: str) -> logging.Formatter:
+    """Return the formatter for a format name from the LOGGING config section."""
+    if name == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=TEXT_DATE_FORMAT)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(log_path: str, console: bool = True, logging_config: Optional[dict] = None) -> bool:
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Does nothing if the root logger already has handlers (e.g. set up by a
+    benchmark harness), like logging.basicConfig.
+
+    Args:
+        log_path: File the log is appended to
+        console: Also write to the console (stderr)
+        logging_config: The LOGGING configuration dictionary (default: config.LOGGING)
+
+    Returns:
+        True if logging was configured, False if it was already set up
+    """
+    global _listener
+    logging_config = logging_config or config.LOGGING
+    root = logging.getLogger()
+    if root.handlers:
+        return False
+
+    file_handler = logging.FileHandler(log_path)
+    file_handler.setFormatter(_formatter(logging_config['file_format']))
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(_formatter(logging_config['console_format']))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(stop_logging)
+
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    return True
+
+
+def stop_logging() -> None:
+    """Flush the queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+class SuccessSampler:
+    """Counts per-paper successes per stage and logs a sample of them."""
+
+    def __init__(self, logging_config: dict):
+        """
+        Initialize the sampler.
+
+        Args:
+            logging_config: The LOGGING configuration dictionary
+        """
+        self.config = logging_config
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def paper_succeeded(self, logger: logging.Logger, stage: str, paper_id: str, message: str, **fields) -> None:
+        """
+        Count a paper a stage finished successfully and log it if it is sampled.
+
+        The first success of each stage and every success_sample_every-th one
+        after it are logged at INFO, with the stage's running count.
+
+        Args:
+            logger: Logger of the stage's module
+            stage: Stage name
+            paper_id: ID of the paper
+            message: The success line
+            **fields: Structured fields added to the log record
+        """
+        with self._lock:
+            count = self._counts.get(stage, 0) + 1
+            self._counts[stage] = count
+        every = max(1, self.config['success_sample_every'])
+        if (count - 1) % every == 0:
+            sampled = f" [{count} successes so far, 1 in {every} logged]" if every > 1 else ""
+            logger.info(f"{message}{sampled}",
+                        extra={'paper_id': paper_id, 'stage': stage, 'stage_successes': count, **fields})
+
+
+# Process-wide sampler shared by the stages
+success_log = SuccessSampler(config.LOGGING)
@@ -0,0 +1,308 @@
+"""
+Tracing
+
+This module records a lightweight trace of every paper's way through a run:
+one span per paper per stage, with a child span for each external call, each
+rate-limit or backoff sleep and each CPU-heavy step made for it, and an event
+for each retry. Each paper gets its own trace, rooted in a 'paper' span that
+covers its first to last stage.
+
+Spans carry the numbers that explain their duration: tarball byte counts for
+LaTeX downloads, prompt and completion token counts for LLM calls, input token
+counts for embeddings, batch sizes and queue waits for stages.
+
+At the end of a run the spans are written as OTLP JSON (the OpenTelemetry
+protocol's JSON encoding of an ExportTraceServiceRequest), which trace viewers
+such as Jaeger can load directly or an OpenTelemetry Collector can forward.
+
+The span that work belongs to is tracked per paper in a context variable, so
+it follows the work across awaits, tasks and asyncio.to_thread without being
+passed around; a batch stage has one active span per paper in the batch.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import config
+
+logger = logging.getLogger('TRACING')
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+# Paper ID -> innermost open span for that paper in the current context
+_active_spans: contextvars.ContextVar[Dict[str, 'Span']] = contextvars.ContextVar('active_spans', default={})
+
+
+@dataclass
+class Span:
+    """One timed operation in a paper's trace."""
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    name: str
+    kind: int = SPAN_KIND_INTERNAL
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    """Encode an attribute value as an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in the OTLP JSON encoding
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Encode an attribute dictionary as an OTLP KeyValue list."""
+    return [{'key': key, 'value': _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Tracer:
+    """Thread-safe collector of the spans of a single pipeline run."""
+
+    def __init__(self, tracing_config: dict):
+        """
+        Initialize the tracer.
+
+        Args:
+            tracing_config: The TRACING configuration dictionary
+        """
+        self.config = tracing_config
+        self._lock = threading.Lock()
+        self.start_run(None)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether spans are being recorded."""
+        return bool(self.config.get('enabled'))
+
+    def start_run(self, run_id: Optional[str]) -> None:
+        """
+        Discard the spans recorded so far and start tracing a new run.
+
+        Args:
+            run_id: ID of the run, which every trace ID is derived from
+        """
+        with self._lock:
+            self.run_id = run_id
+            self._spans: List[Span] = []
+            # Paper ID -> the paper's root span, extended as its stages finish
+            self._roots: Dict[str, Span] = {}
+
+    def _trace_id(self, paper_id: str) -> str:
+        """Return the trace ID of a paper in this run."""
+        return hashlib.sha256(f"{self.run_id}:{paper_id}".encode()).hexdigest()[:32]
+
+    def _root(self, paper_id: str, start_ns: int) -> Span:
+        """Return a paper's root span, creating it on the paper's first stage. Caller holds the lock."""
+        root = self._roots.get(paper_id)
+        if root is None:
+            root = Span(self._trace_id(paper_id), os.urandom(8).hex(), None, 'paper',
+                        start_ns=start_ns, attributes={'paper.id': paper_id})
+            self._roots[paper_id] = root
+        return root
+
+    def _child(self, paper_id: str, name: str, kind: int, start_ns: int, attributes: Dict[str, Any]) -> Span:
+        """Create a span under the paper's innermost open span (or its root span)."""
+        parent = _active_spans.get().get(paper_id)
+        if parent is None:
+            with self._lock:
+                parent = self._root(paper_id, start_ns)
+        return Span(parent.trace_id, os.urandom(8).hex(), parent.span_id, name, kind=kind,
+                    start_ns=start_ns, attributes=dict(attributes))
+
+    def _finish(self, spans: Sequence[Span], error: Optional[BaseException]) -> None:
+        """Close spans and keep them for export."""
+        end_ns = time.time_ns()
+        with self._lock:
+            for span in spans:
+                span.end_ns = end_ns
+                if error is not None:
+                    span.error = f"{type(error).__name__}: {error}"
+                self._spans.append(span)
+
+    @contextmanager
+    def stage_spans(self, stage: str, papers: Sequence, **attributes: Any) -> Iterator[None]:
+        """
+        Context manager wrapping one stage's processing of a batch in a span per paper.
+
+        Args:
+            stage: Stage name
+            papers: Papers in the batch
+            **attributes: Span attributes shared by the batch (batch size, ...)
+        """
+        if not self.enabled:
+            yield
+            return
+        start_ns = time.time_ns()
+        spans = {}
+        roots = {}
+        with self._lock:
+            for paper in papers:
+                root = roots[paper.id] = self._root(paper.id, start_ns)
+                spans[paper.id] = Span(root.trace_id, os.urandom(8).hex(), root.span_id, stage,
+                                       start_ns=start_ns, attributes={'stage': stage, **attributes})
+        token = _active_spans.set({**_active_spans.get(), **spans})
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _active_spans.reset(token)
+            self._finish(list(spans.values()), error)
+            with self._lock:
+                # The roots held since the start, as a new run may have been started meanwhile
+                for paper_id, span in spans.items():
+                    root = roots[paper_id]
+                    root.end_ns = max(root.end_ns, span.end_ns)
+
+    @contextmanager
+    def span(self, name: str, paper_ids: Sequence[str], kind: int = SPAN_KIND_INTERNAL,
+             **attributes: Any) -> Iterator[None]:
+        """
+        Context manager recording the wrapped block as a child span for each paper.
+
+        Args:
+            name: Span name (the external service, or the step)
+            paper_ids: IDs of the papers the work is done for
+            kind: SPAN_KIND_CLIENT for external calls, SPAN_KIND_INTERNAL otherwise
+            **attributes: Span attributes
+        """
+        if not self.enabled or not paper_ids:
+            yield
+            return
+        start_ns = time.time_ns()
+        spans = {paper_id: self._child(paper_id, name, kind, start_ns, attributes) for paper_id in paper_ids}
+        token = _active_spans.set({**_active_spans.get(), **spans})
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _active_spans.reset(token)
+            self._finish(list(spans.values()), error)
+
+    def record_span(self, name: str, paper_ids: Sequence[str], seconds: float, **attributes: Any) -> None:
+        """
+        Record a child span for each paper that ended just now (a finished sleep).
+
+        Args:
+            name: Span name
+            paper_ids: IDs of the papers the time is charged to
+            seconds: Duration of the span
+            **attributes: Span attributes
+        """
+        if not self.enabled or not paper_ids:
+            return
+        start_ns = time.time_ns() - int(seconds * 1e9)
+        self._finish([self._child(paper_id, name, SPAN_KIND_INTERNAL, start_ns, attributes)
+                      for paper_id in paper_ids], None)
+
+    def annotate(self, paper_id: str, **attributes: Any) -> None:
+        """Set attributes on a paper's innermost open span."""
+        span = _active_spans.get().get(paper_id)
+        if span is not None:
+            with self._lock:
+                span.attributes.update(attributes)
+
+    def annotate_current(self, **attributes: Any) -> None:
+        """Set attributes on the external call spans open in the current context (the call being made)."""
+        spans = [span for span in _active_spans.get().values() if span.kind == SPAN_KIND_CLIENT]
+        if spans:
+            with self._lock:
+                for span in spans:
+                    span.attributes.update(attributes)
+
+    def add_event(self, name: str, paper_ids: Sequence[str], **attributes: Any) -> None:
+        """Add a timestamped event to the innermost open span of each paper."""
+        spans = _active_spans.get()
+        now_ns = time.time_ns()
+        with self._lock:
+            for paper_id in paper_ids:
+                span = spans.get(paper_id)
+                if span is not None:
+                    span.events.append({'name': name, 'time_ns': now_ns, 'attributes': attributes})
+
+    def _span_json(self, span: Span) -> Dict[str, Any]:
+        """Encode a span as an OTLP JSON span."""
+        encoded = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': span.kind,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns or span.start_ns),
+            'attributes': _attributes(span.attributes),
+            'events': [{'timeUnixNano': str(event['time_ns']), 'name': event['name'],
+                        'attributes': _attributes(event['attributes'])} for event in span.events],
+            'status': {'code': STATUS_CODE_ERROR, 'message': span.error} if span.error else {}
+        }
+        if span.parent_span_id:
+            encoded['parentSpanId'] = span.parent_span_id
+        return encoded
+
+    def export(self, trace_dir: Optional[str]) -> Optional[str]:
+        """
+        Write the run's spans as an OTLP JSON file.
+
+        Failures are logged and never fail the run itself.
+
+        Args:
+            trace_dir: Directory for the trace files (None to skip)
+
+        Returns:
+            Path of the written file, or None
+        """
+        if not self.enabled or not trace_dir:
+            return None
+        with self._lock:
+            spans = list(self._roots.values()) + self._spans
+            payload = {
+                'resourceSpans': [{
+                    'resource': {'attributes': _attributes({
+                        'service.name': self.config['service_name'],
+                        'pipeline.run_id': self.run_id
+                    })},
+                    'scopeSpans': [{
+                        'scope': {'name': 'researchfeed.pipeline'},
+                        'spans': [self._span_json(span) for span in spans]
+                    }]
+                }]
+            }
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            path = os.path.join(trace_dir, f"trace-{self.run_id}.json")
+            with open(path, 'w') as f:
+                json.dump(payload, f)
+            logger.info(f"Trace of {len(self._roots)} papers ({len(spans)} spans) written to {path}")
+            return path
+        except OSError as e:
+            logger.warning(f"Failed to write trace: {e}")
+            return None
+
+
+# Process-wide tracer shared by all modules
+tracer = Tracer(config.TRACING)
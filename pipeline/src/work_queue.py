@@ -0,0 +1,295 @@
+"""
+Work Queue
+
+This module lets several pipeline processes on one host share the processing
+stages through a work table in the main database. Each row is one
+paper waiting for one stage. Workers (main.py --worker) claim rows for the
+stages they run, process the papers, write the results to the papers table and
+complete the rows, which queues the papers for the stages that depend on them.
+
+A claim is a lease: the row is assigned to the claiming worker until
+lease_expires_at, and a live worker renews the leases it holds periodically.
+Rows leased by a worker that crashed or lost its connection expire and are
+claimed again by the next worker that asks, so no paper is lost. A paper that
+keeps failing (or keeps taking its worker down) is marked failed after
+max_attempts claims instead of being retried forever, in the work table and
+in the stage's status column of the papers table. A paper a stage deferred
+to the retry queue (see retry_queue.py) is released with a not-before time
+instead: it stays pending, is not claimed again until its retry is due, and
+the deferral does not count as a claim.
+
+A run started with --distribute scrapes as usual, queues its papers for the
+first stage under a batch name and waits until none of them has work left.
+The SQLite file stays the system of record and is only opened on the host
+that holds it: the database runs in WAL mode, whose shared-memory index does
+not work over network filesystems (NFS, SMB). Workers on that host use this
+class directly; workers on other hosts reach the same table through the queue
+service (see queue_service.py), which runs these methods for them on the
+database host.
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from db_connections import db_connections
+from paper import STAGE_FAILED_STATUS, STAGE_FIELDS
+
+logger = logging.getLogger('WORK_QUEUE')
+
+# Row states
+STATE_PENDING = 'pending'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+
+def worker_id() -> str:
+    """Return an ID for this worker process that is unique across hosts."""
+    return f"{socket.gethostname()}:{os.getpid()}:{os.urandom(3).hex()}"
+
+
+class WorkQueue:
+    """Lease-based queue of (paper, stage) work items in the main database."""
+
+    def __init__(self, db_path: str, queue_config: dict, depends_on: Dict[str, Sequence[str]]):
+        """
+        Initialize the queue and create the work table if needed.
+
+        Args:
+            db_path: Main database holding the papers and work_items tables
+            queue_config: The WORK_QUEUE configuration dictionary
+            depends_on: Stage name -> names of the stages it depends on (the full stage graph)
+        """
+        self.db_path = db_path
+        self.config = queue_config
+        self.depends_on = {stage: tuple(deps) for stage, deps in depends_on.items()}
+        self.downstream = {stage: [name for name, deps in self.depends_on.items() if stage in deps]
+                           for stage in self.depends_on}
+        self.roots = [stage for stage, deps in self.depends_on.items() if not deps]
+        db_connections.initialize(db_path, 'work_items', self._create_table)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a write transaction on this thread's shared connection to the main database.
+
+        The write lock is taken up front (BEGIN IMMEDIATE), which keeps two
+        workers from claiming the same rows. The transaction is committed when
+        the block ends and rolled back if it raises.
+        """
+        conn = db_connections.get(self.db_path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def _create_table(conn: sqlite3.Connection) -> None:
+        """Create the work_items table if it doesn't exist."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                paper_id TEXT,
+                stage TEXT,
+                batch TEXT,  -- Run and shard that queued the paper
+                state TEXT,  -- pending, leased, done or failed
+                owner TEXT,  -- Worker holding the lease
+                lease_expires_at REAL,  -- Unix time (for a pending item, when it may be claimed)
+                attempts INTEGER DEFAULT 0,  -- Claims so far
+                error TEXT,
+                updated_at REAL,  -- Unix time
+                PRIMARY KEY (paper_id, stage)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS work_items_claim ON work_items (stage, state, updated_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS work_items_batch ON work_items (batch, state)")
+
+    @staticmethod
+    def _queue_items(conn: sqlite3.Connection, paper_ids: Sequence[str], stage: str, batch: str, now: float) -> None:
+        """Queue papers for a stage, re-queueing items finished in earlier runs. Caller holds a transaction."""
+        conn.executemany("""
+            INSERT INTO work_items (paper_id, stage, batch, state, attempts, updated_at)
+            VALUES (?, ?, ?, 'pending', 0, ?)
+            ON CONFLICT(paper_id, stage) DO UPDATE SET
+                batch = excluded.batch,
+                state = CASE WHEN state IN ('done', 'failed') THEN 'pending' ELSE state END,
+                attempts = CASE WHEN state IN ('done', 'failed') THEN 0 ELSE attempts END,
+                error = CASE WHEN state IN ('done', 'failed') THEN NULL ELSE error END,
+                updated_at = excluded.updated_at
+        """, [(paper_id, stage, batch, now) for paper_id in paper_ids])
+
+    def enqueue(self, paper_ids: Sequence[str], batch: str) -> None:
+        """
+        Queue papers for the first stages of the graph.
+
+        Args:
+            paper_ids: IDs of papers already saved to the papers table
+            batch: Name the papers are tracked under until they are finished
+        """
+        with self._transaction() as conn:
+            for stage in self.roots:
+                self._queue_items(conn, paper_ids, stage, batch, time.time())
+        logger.info(f"Queued {len(paper_ids)} papers for {', '.join(self.roots)} (batch {batch})")
+
+    def claim(self, stage: str, owner: str, limit: int) -> List[str]:
+        """
+        Lease up to limit papers waiting for a stage, including papers whose lease expired.
+
+        Args:
+            stage: Stage to claim work for
+            owner: ID of the claiming worker
+            limit: Maximum number of papers claimed
+
+        Returns:
+            IDs of the claimed papers, oldest first
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            exhausted = conn.execute("""
+                UPDATE work_items SET state = 'failed', owner = NULL, updated_at = ?,
+                    error = COALESCE(error, 'lease expired')
+                WHERE stage = ? AND attempts >= ?
+                  AND (state = 'pending' OR (state = 'leased' AND lease_expires_at < ?))
+                RETURNING paper_id, error
+            """, (now, stage, self.config['max_attempts'], now)).fetchall()
+            self._fail_papers(conn, stage, exhausted)
+            rows = conn.execute("""
+                SELECT paper_id, state FROM work_items
+                WHERE stage = ? AND ((state = 'pending' AND COALESCE(lease_expires_at, 0) <= ?)
+                                     OR (state = 'leased' AND lease_expires_at < ?))
+                ORDER BY updated_at LIMIT ?
+            """, (stage, now, now, limit)).fetchall()
+            paper_ids = [row[0] for row in rows]
+            conn.executemany("""
+                UPDATE work_items SET state = 'leased', owner = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE paper_id = ? AND stage = ?
+            """, [(owner, now + self.config['lease_seconds'], now, paper_id, stage) for paper_id in paper_ids])
+
+        if exhausted:
+            logger.warning(f"{stage} - {len(exhausted)} papers failed after {self.config['max_attempts']} attempts")
+        reclaimed = sum(1 for _, state in rows if state == STATE_LEASED)
+        if reclaimed:
+            logger.info(f"{stage} - reclaimed {reclaimed} papers from expired leases")
+        return paper_ids
+
+    def _fail_papers(self, conn: sqlite3.Connection, stage: str, exhausted: List[tuple]) -> None:
+        """
+        Mark a stage failed in the papers table for papers out of attempts. Caller holds a transaction.
+
+        Args:
+            conn: Connection holding the transaction
+            stage: Stage the papers ran out of attempts for
+            exhausted: (paper_id, error) of each paper
+        """
+        if not exhausted or stage not in STAGE_FIELDS:
+            return
+        updated_at = datetime.now().isoformat()
+        conn.executemany(f"""
+            UPDATE papers SET {STAGE_FIELDS[stage][0]} = ?,
+                errors = json_insert(COALESCE(errors, '[]'), '$[#]', ?), updated_at = ?
+            WHERE id = ?
+        """, [(STAGE_FAILED_STATUS[stage], f"{stage} failed after {self.config['max_attempts']} attempts: {error}",
+               updated_at, paper_id) for paper_id, error in exhausted])
+
+    def renew(self, owner: str) -> int:
+        """
+        Extend every lease held by a worker.
+
+        Args:
+            owner: ID of the worker
+
+        Returns:
+            Number of leases renewed
+        """
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET lease_expires_at = ? WHERE owner = ? AND state = 'leased'",
+                (time.time() + self.config['lease_seconds'], owner)
+            ).rowcount
+
+    def complete(self, stage: str, paper_ids: Sequence[str], owner: str) -> None:
+        """
+        Mark papers done with a stage and queue them for the stages that depend on it.
+
+        A downstream stage is queued once every stage it depends on is done with
+        the paper. Papers whose lease was meanwhile claimed by another worker are
+        left to that worker.
+
+        Args:
+            stage: Stage that finished the papers
+            paper_ids: IDs of the finished papers
+            owner: ID of the worker that held the leases
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            for paper_id in paper_ids:
+                row = conn.execute("""
+                    UPDATE work_items SET state = 'done', owner = NULL, lease_expires_at = NULL, updated_at = ?
+                    WHERE paper_id = ? AND stage = ? AND owner = ? AND state = 'leased'
+                    RETURNING batch
+                """, (now, paper_id, stage, owner)).fetchone()
+                if row is None:
+                    continue
+                for downstream in self.downstream[stage]:
+                    dependencies = self.depends_on[downstream]
+                    done = conn.execute(f"""
+                        SELECT COUNT(*) FROM work_items
+                        WHERE paper_id = ? AND state = 'done' AND stage IN ({', '.join('?' for _ in dependencies)})
+                    """, (paper_id, *dependencies)).fetchone()[0]
+                    if done == len(dependencies):
+                        self._queue_items(conn, [paper_id], downstream, row[0], now)
+
+    def release(self, stage: str, paper_ids: Sequence[str], owner: str, error: Optional[str] = None,
+                not_before: Optional[float] = None) -> None:
+        """
+        Return leased papers to the queue so that any worker can retry them.
+
+        Args:
+            stage: Stage the papers were claimed for
+            paper_ids: IDs of the papers
+            owner: ID of the worker that held the leases
+            error: Why the papers are released, if they failed
+            not_before: Unix time before which the papers are not claimed again,
+                for papers deferred to the retry queue. Such a release gives back
+                its claim, so deferrals do not count towards max_attempts.
+        """
+        refund = 1 if not_before is not None else 0
+        with self._transaction() as conn:
+            conn.executemany("""
+                UPDATE work_items SET state = 'pending', owner = NULL, lease_expires_at = ?,
+                    attempts = attempts - ?, error = COALESCE(?, error), updated_at = ?
+                WHERE paper_id = ? AND stage = ? AND owner = ? AND state = 'leased'
+            """, [(not_before, refund, error, time.time(), paper_id, stage, owner) for paper_id in paper_ids])
+
+    def release_owner(self, owner: str) -> int:
+        """Return every paper leased by a stopping worker to the queue. Returns the number released."""
+        with self._transaction() as conn:
+            return conn.execute("""
+                UPDATE work_items SET state = 'pending', owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE owner = ? AND state = 'leased'
+            """, (time.time(), owner)).rowcount
+
+    def remaining(self, batch: str) -> Dict[str, int]:
+        """
+        Count the unfinished work of a batch.
+
+        Args:
+            batch: Batch name passed to enqueue()
+
+        Returns:
+            Dictionary of stage -> number of papers pending or leased for it
+        """
+        rows = db_connections.get(self.db_path).execute("""
+            SELECT stage, COUNT(*) FROM work_items
+            WHERE batch = ? AND state IN ('pending', 'leased') GROUP BY stage
+        """, (batch,)).fetchall()
+        return dict(rows)
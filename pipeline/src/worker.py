@@ -0,0 +1,160 @@
+"""
+Worker
+
+This module runs processing stages as one worker of the shared work queue
+(see work_queue.py), for main.py --worker. For each stage it runs, the worker
+claims as many papers as it has free slots (max_workers batches of batch_size
+papers), loads them from the database, processes them with the stage's own
+process() and select(), writes their changed fields back and completes the
+work items, which queues the papers for the next stages - on this worker or
+any other.
+
+A background task renews the worker's leases while it runs. Papers whose
+processing raises are released for another attempt, and papers the stage
+deferred to the retry queue are released to be claimed again once their retry
+is due; on shutdown every paper still leased is released right away instead of
+waiting for its lease to expire.
+"""
+
+import asyncio
+import logging
+from typing import List, Set, Union
+
+import metrics
+from database import PaperDatabase
+from executor import Stage, prepare_stages
+from queue_service import RemotePaperStore, RemoteWorkQueue
+from retry_queue import retry_queue
+from tracing import tracer
+from work_queue import WorkQueue
+
+logger = logging.getLogger('WORKER')
+
+
+class Worker:
+    """Claims papers from the work queue and runs them through a set of stages."""
+
+    def __init__(self, stages: List[Stage], work_queue: Union[WorkQueue, RemoteWorkQueue],
+                 db: Union[PaperDatabase, RemotePaperStore], owner: str, queue_config: dict):
+        """
+        Initialize the worker.
+
+        Args:
+            stages: Stages this worker runs
+            work_queue: Shared work queue (remote on hosts other than the database's)
+            db: Database the papers are read from and written to (remote on hosts
+                other than the database's)
+            owner: Worker ID the leases are held under (see work_queue.worker_id)
+            queue_config: The WORK_QUEUE configuration dictionary
+        """
+        self.stages = stages
+        self.queue = work_queue
+        self.db = db
+        self.owner = owner
+        self.config = queue_config
+        self.completed = 0
+
+    async def run(self, stop: asyncio.Event) -> int:
+        """
+        Process work until stop is set.
+
+        Args:
+            stop: Event that ends the worker
+
+        Returns:
+            Number of (paper, stage) work items completed
+        """
+        await prepare_stages(self.stages)
+        logger.info(f"Worker {self.owner} running stages: "
+                    f"{', '.join(f'{s.name} ({s.max_workers} slots)' for s in self.stages)}")
+        renewer = asyncio.create_task(self._renew_leases(stop), name='lease-renewer')
+        loops = [asyncio.create_task(self._run_stage(stage, stop), name=f"worker-{stage.name}")
+                 for stage in self.stages]
+        try:
+            await asyncio.gather(*loops)
+        finally:
+            for task in loops + [renewer]:
+                task.cancel()
+            await asyncio.gather(*loops, renewer, return_exceptions=True)
+            released = await asyncio.to_thread(self.queue.release_owner, self.owner)
+            if released:
+                logger.info(f"Released {released} unfinished papers back to the queue")
+        return self.completed
+
+    async def _renew_leases(self, stop: asyncio.Event) -> None:
+        """Extend this worker's leases every renew_interval seconds."""
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.config['renew_interval'])
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.queue.renew, self.owner)
+            except Exception as e:
+                logger.warning(f"Lease renewal failed: {e}")
+
+    async def _run_stage(self, stage: Stage, stop: asyncio.Event) -> None:
+        """Keep a stage's slots busy with claimed papers until stop is set."""
+        running: Set[asyncio.Task] = set()
+        stopped = asyncio.create_task(stop.wait())
+        try:
+            while not stop.is_set():
+                free = stage.max_workers - len(running)
+                wanted = free * stage.batch_size
+                claimed = []
+                if free > 0:
+                    try:
+                        claimed = await asyncio.to_thread(self.queue.claim, stage.name, self.owner, wanted)
+                    except Exception as e:
+                        logger.error(f"{stage.name} - claiming work failed: {e}")
+                    for start in range(0, len(claimed), stage.batch_size):
+                        running.add(asyncio.create_task(self._process(stage, claimed[start:start + stage.batch_size])))
+
+                # Claim again as soon as a slot frees up; poll while the queue is empty
+                queue_drained = free > 0 and len(claimed) < wanted
+                done, _ = await asyncio.wait(running | {stopped}, return_when=asyncio.FIRST_COMPLETED,
+                                             timeout=self.config['poll_interval'] if queue_drained else None)
+                running -= done
+        finally:
+            stopped.cancel()
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _process(self, stage: Stage, paper_ids: List[str]) -> None:
+        """Process one claimed batch and complete its work items, or release them on failure."""
+        try:
+            papers = await asyncio.to_thread(self.db.load_papers, paper_ids)
+            batch = []
+            for paper in papers.values():
+                try:
+                    if stage.select(paper):
+                        batch.append(paper)
+                except Exception as e:
+                    logger.error(f"{stage.name} - error selecting paper {paper.id}: {e}")
+
+            if batch:
+                with tracer.stage_spans(stage.name, batch, batch_size=len(batch)):
+                    await stage.process(batch)
+                metrics.STAGE_BATCH_SIZE.labels(stage.name).observe(len(batch))
+                for paper in batch:
+                    metrics.record_stage_paper(stage.name, paper)
+
+            # Papers not selected may still have changed (select marks skipped papers)
+            await asyncio.to_thread(self.db.save_papers, papers)
+        except Exception as e:
+            logger.error(f"{stage.name} - batch of {len(paper_ids)} papers failed, releasing for retry: {e}")
+            await asyncio.to_thread(self.queue.release, stage.name, paper_ids, self.owner, str(e))
+            return
+
+        # Deferred papers go back to the queue until their retry is due
+        finished = []
+        for paper_id in paper_ids:
+            due = retry_queue.take_deferred(stage.name, paper_id)
+            if due is None:
+                finished.append(paper_id)
+            else:
+                await asyncio.to_thread(self.queue.release, stage.name, [paper_id], self.owner, None, due)
+
+        await asyncio.to_thread(self.queue.complete, stage.name, finished, self.owner)
+        self.completed += len(finished)
@@ -9,7 +9,9 @@ class Database {
   connect() {
     return new Promise((resolve, reject) => {
       const dbPath = '/data/database.sqlite';
-      this.db = new sqlite3.Database(dbPath, (err) => {
+      // Read-only: the pipeline publishes to this file in place (WAL mode), and
+      // every query sees the latest committed papers without a reconnect
+      this.db = new sqlite3.Database(dbPath, sqlite3.OPEN_READONLY, (err) => {
         if (err) {
           console.error('Error connecting to database:', err.message);
           reject(err);
@@ -18,6 +20,8 @@ class Database {
           resolve();
         }
       });
+      // Wait out the pipeline's brief checkpoints instead of failing with SQLITE_BUSY
+      this.db.configure('busyTimeout', 5000);
     });
   }
 